@@ -3,50 +3,143 @@ import torch.nn.functional as F
 from langchain.embeddings import HuggingFaceEmbeddings
 from transformers import AutoModel, AutoTokenizer
 from proqa_ai.server.config import settings
+from proqa_ai.utilities.embedding_batcher import EmbeddingBatcher
+from proqa_ai.utilities.model_registry import LoadedModel, ModelRegistry, estimate_size
 
-def _generate_embedding_hugging_face(text: str, passage: bool, model_name: str = "all-MiniLM-L6-v2") -> list:
+registry = ModelRegistry(
+    memory_budget=settings.embedding_memory_budget_mb * 1024 ** 2
+    if settings.embedding_memory_budget_mb is not None else None
+)
+
+
+def _load_hugging_face(model_name: str) -> LoadedModel:
     """
-    Generate embedding from the HuggingFaceEmbeddings library.
-    Only supports sentence-transformers models.
+    Load a sentence-transformers model through the HuggingFaceEmbeddings library.
 
     Args:
-        text (str): Text to generate embedding.
-        passage (bool): If given text is a passage or not.
+        model_name (str): Name of the model.
     Returns:
-        list: Embedding.
+        LoadedModel: Loaded model.
     """
-    transformer = HuggingFaceEmbeddings(model_name=model_name, cache_folder=settings.model_path)
-    embeddings = transformer.embed_query(text)
-    return embeddings
+    transformer = HuggingFaceEmbeddings(
+        model_name=model_name,
+        cache_folder=settings.model_path,
+        encode_kwargs={"batch_size": settings.embedding_batch_size}
+    )
+    return LoadedModel(model=transformer, size=estimate_size(transformer.client))
 
 
-def _generate_embedding_transformers(text: str, passage: bool, model_name: str = "intfloat/e5-large-v2") -> list:
-    def average_pool(last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
-        last_hidden = last_hidden_states.masked_fill(~attention_mask[..., None].bool(), 0.0)
-        return last_hidden.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
-    
-    input_text = [f"{'passage' if passage else 'query'}: {text}"]
+def _load_transformers(model_name: str) -> LoadedModel:
+    """
+    Load a model and its tokenizer through the transformers library.
+
+    Args:
+        model_name (str): Name of the model.
+    Returns:
+        LoadedModel: Loaded model.
+    """
     tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=settings.model_path)
     model = AutoModel.from_pretrained(model_name, cache_dir=settings.model_path)
+    model.eval()
+    return LoadedModel(model=model, tokenizer=tokenizer, size=estimate_size(model))
 
-    batch_dict = tokenizer(input_text, max_length=512, padding=True, truncation=True, return_tensors="pt")
-    outputs = model(**batch_dict)
-    embeddings = average_pool(outputs.last_hidden_state, batch_dict["attention_mask"])
-    return F.normalize(embeddings, p=2, dim=1).tolist()[0]
 
+def _average_pool(last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    last_hidden = last_hidden_states.masked_fill(~attention_mask[..., None].bool(), 0.0)
+    return last_hidden.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
 
-def generate_embedding(text: str, passage: bool, model_name: str = "all-MiniLM-L6-v2") -> list:
+
+def _generate_embeddings_hugging_face(texts: list, passage: bool,
+                                      model_name: str = "all-MiniLM-L6-v2") -> list:
     """
-    Generate embedding.
+    Generate embeddings from the HuggingFaceEmbeddings library.
+    Only supports sentence-transformers models.
 
     Args:
-        text (str): Text to generate embedding.
+        texts (list): Texts to generate embeddings.
+        passage (bool): If given texts are passages or not.
     Returns:
-        list: Embedding.
-    """    
+        list: Embeddings in the order of the texts.
+    """
+    transformer = registry.get(model_name, _load_hugging_face).model
+    return transformer.embed_documents(texts)
+
+
+def _embed_batch(loaded_model: LoadedModel, texts: list) -> list:
+    """
+    Generate normalised embeddings for a batch of texts padded to the longest one.
+
+    Args:
+        loaded_model (LoadedModel): Model and tokenizer loaded through the transformers library.
+        texts (list): Texts to generate embeddings.
+    Returns:
+        list: Embeddings in the order of the texts.
+    """
+    batch_dict = loaded_model.tokenizer(texts, max_length=512, padding=True, truncation=True,
+                                        return_tensors="pt")
+    with torch.inference_mode():
+        outputs = loaded_model.model(**batch_dict)
+    embeddings = _average_pool(outputs.last_hidden_state, batch_dict["attention_mask"])
+    return F.normalize(embeddings, p=2, dim=1).tolist()
+
+
+def _generate_embeddings_transformers(texts: list, passage: bool,
+                                      model_name: str = "intfloat/e5-large-v2") -> list:
+    """
+    Generate embeddings from the transformers library in padded batches.
+
+    Args:
+        texts (list): Texts to generate embeddings.
+        passage (bool): If given texts are passages or not.
+    Returns:
+        list: Embeddings in the order of the texts.
+    """
+    input_texts = [f"{'passage' if passage else 'query'}: {text}" for text in texts]
+    loaded_model = registry.get(model_name, _load_transformers)
+
+    # Batch texts of similar length together to minimise padding
+    order = sorted(range(len(input_texts)), key=lambda i: len(input_texts[i]))
+    embeddings = [None] * len(input_texts)
+    for start in range(0, len(order), settings.embedding_batch_size):
+        indices = order[start:start + settings.embedding_batch_size]
+        batch_embeddings = _embed_batch(loaded_model, [input_texts[i] for i in indices])
+        for i, embedding in zip(indices, batch_embeddings):
+            embeddings[i] = embedding
+    return embeddings
+
+
+def generate_embeddings(texts: list, passage: bool, model_name: str = "all-MiniLM-L6-v2") -> list:
+    """
+    Generate embeddings for a batch of texts.
+
+    Args:
+        texts (list): Texts to generate embeddings.
+        passage (bool): If given texts are passages or not.
+    Returns:
+        list: Embeddings in the order of the texts.
+    """
     if model_name == "all-MiniLM-L6-v2":
-        return _generate_embedding_hugging_face(text, passage, model_name=model_name)
+        return _generate_embeddings_hugging_face(texts, passage, model_name=model_name)
     elif model_name == "intfloat/e5-large-v2":
-        return _generate_embedding_transformers(text, passage, model_name=model_name)
+        return _generate_embeddings_transformers(texts, passage, model_name=model_name)
     else:
         raise ValueError("Invalid model name.")
+
+
+batcher = EmbeddingBatcher(
+    generate_embeddings,
+    max_batch_size=settings.embedding_batch_size,
+    window=settings.embedding_batch_window_ms / 1000
+)
+
+
+def generate_embedding(text: str, passage: bool, model_name: str = "all-MiniLM-L6-v2") -> list:
+    """
+    Generate embedding. Concurrent calls are batched together into one forward pass.
+
+    Args:
+        text (str): Text to generate embedding.
+    Returns:
+        list: Embedding.
+    """
+    return batcher.submit(text, passage, model_name).result()
@@ -1,19 +1,72 @@
 import logging
+import os
 import time
-from queue import Queue
+from typing import Optional
 
 import requests
 
+from proqa_ai.schemas.text import TextRequest
 from proqa_ai.server.config import settings
+from proqa_ai.utilities.callback import GenerationCancelledError
+from proqa_ai.utilities.generation_queue import GenerationQueue
 from proqa_ai.utilities.model_manager import ModelManager, StreamingCallbackHandler
+from proqa_ai.utilities.state_cache import StateCache
 
 logger = logging.getLogger("proqa_ai")
-model_manager = ModelManager()
-buffer = Queue()
 
-def generate_text_worker():
+
+def _threads_per_worker() -> Optional[int]:
+    """
+    Partition the LLM threads among the text generation workers so they do not oversubscribe
+    the cores.
+
+    Returns:
+        Optional[int]: Number of threads per worker, None to let llama.cpp decide.
+    """
+    if settings.text_generation_workers == 1:
+        return settings.thread_count
+    thread_count = settings.thread_count or os.cpu_count()
+    return max(1, thread_count // settings.text_generation_workers)
+
+
+# Prefix states can be loaded into any context of the same model, so workers share the cache
+prefix_cache = StateCache(settings.prefix_cache_mb * 1024 ** 2) \
+    if settings.prefix_cache_mb > 0 else None
+
+# Follow-up questions of a session can be handled by any worker, so workers share the cache
+session_cache = StateCache(
+    settings.session_cache_mb * 1024 ** 2,
+    ttl=settings.session_cache_ttl,
+    spill_path=settings.session_cache_path,
+    spill_capacity_bytes=settings.session_cache_disk_mb * 1024 ** 2
+    if settings.session_cache_disk_mb is not None else None
+) if settings.session_cache_mb > 0 else None
+
+# Each worker has its own model manager, so each has its own model context.
+# The weights are memory-mapped, so workers using the same model share them.
+model_managers = [
+    ModelManager(
+        memory_budget=settings.llm_memory_budget_mb * 1024 ** 2
+        if settings.llm_memory_budget_mb is not None else 0,
+        n_threads=_threads_per_worker(),
+        prefix_cache=prefix_cache,
+        session_cache=session_cache
+    )
+    for _ in range(settings.text_generation_workers)
+]
+buffer = GenerationQueue(
+    max_depth=settings.text_generation_queue_size,
+    workers=settings.text_generation_workers,
+    timeout=settings.text_generation_timeout,
+    aging_interval=settings.text_generation_queue_aging
+)
+
+def generate_text_worker(model_manager: ModelManager):
     """
     The worker that generates text from the prompt.
+
+    Args:
+        model_manager (ModelManager): Model manager owning the models of this worker.
     """
     logger.info("Starting text generation worker.")
     while True:
@@ -22,50 +75,121 @@ def generate_text_worker():
             break
 
         request, rcv_time = item
-        if time.time() - rcv_time > settings.text_generation_timeout:
-            logger.warning("Text generation timed out for message %s", request.message_id)
+        try:
+            _handle_request(model_manager, request, rcv_time)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Keep the worker alive, the queue still hands it requests
+            logger.exception("Text generation failed for message %s", request.message_id)
+            if request.stream:
+                _end_stream(
+                    request.streaming_settings.channel,
+                    request.streaming_settings.session_id,
+                    request.message_id,
+                    reason="[ERROR]"
+                )
+        finally:
+            buffer.done(request.message_id)
+
+    logger.info("Stopping text generation worker.")
+
+
+def _handle_request(model_manager: ModelManager, request: TextRequest, rcv_time: float):
+    """
+    Generate the text of a request and post it to the backend.
+
+    Args:
+        model_manager (ModelManager): Model manager owning the models of this worker.
+        request (TextRequest): Text request.
+        rcv_time (float): Time the request was received.
+    """
+    if time.time() - rcv_time > settings.text_generation_timeout:
+        logger.warning("Text generation timed out for message %s", request.message_id)
+        if request.stream:
             _end_stream(
                 request.streaming_settings.channel,
                 request.streaming_settings.session_id,
                 request.message_id
             )
-            continue
+        return
 
-        logger.info("Generating text for message %s", request.message_id)
+    logger.info("Generating text for message %s", request.message_id)
+    start_time = time.time()
+    try:
         generated_text = model_manager.generate_text(
-            request.prompt, request.message_id, request.model_settings, request.streaming_settings
+            request.prompt, request.message_id, request.model_settings,
+            request.streaming_settings, prefix=request.prefix,
+            is_cancelled=lambda: buffer.is_cancelled(request.message_id),
+            stream=request.stream
         )
-        _post_text(generated_text, request.streaming_settings.session_id)
-        logger.info("Posted text for message %s", request.message_id)
+    except GenerationCancelledError:
+        logger.info("Text generation cancelled for message %s", request.message_id)
+        _end_stream(
+            request.streaming_settings.channel,
+            request.streaming_settings.session_id,
+            request.message_id,
+            reason="[CANCELLED]"
+        )
+        return
+    buffer.observe_service_time(time.time() - start_time)
+    _post_text(generated_text, request.streaming_settings.session_id, request.message_id,
+               request.callback)
+    logger.info("Posted text for message %s", request.message_id)
 
-    logger.info("Stopping text generation worker.")
+
+def cancel_text(message_id: str) -> Optional[str]:
+    """
+    Cancel the generation of an answer. A queued request is removed and its stream is ended,
+    a request being generated stops at the next token.
+
+    Args:
+        message_id (str): ID of the answer.
+    Returns:
+        Optional[str]: "queued" or "generating" depending on the state of the cancelled
+        request, None if there is no request for the answer.
+    """
+    request = buffer.remove(message_id)
+    if request is not None:
+        logger.info("Removed queued text generation for message %s", message_id)
+        if request.stream:
+            _end_stream(
+                request.streaming_settings.channel,
+                request.streaming_settings.session_id,
+                request.message_id,
+                reason="[CANCELLED]"
+            )
+        return "queued"
+    if buffer.cancel(message_id):
+        return "generating"
+    return None
 
 
-def _post_text(text: str, session_id: str):
+def _post_text(text: str, session_id: str, message_id: str, callback: str = "answer"):
     """
     Post the generated text to the backend.
 
     Args:
         text (str): Generated text.
         session_id (str): ID of the session to stream to
+        message_id (str): ID of the message the text was generated for.
+        callback (str): Backend endpoint to post to, relative to /api/.
     """
     requests.post(
-        f'{settings.backend_http_url}/api/answer/',
-        json={'answer': text, 'session_id': session_id},
+        f'{settings.backend_http_url}/api/{callback}/',
+        json={'answer': text, 'session_id': session_id, 'message_id': message_id},
         timeout=30
     )
 
-def _end_stream(channel: str, session_id: str, message_id: str):
+def _end_stream(channel: str, session_id: str, message_id: str, reason: str = "[TIMEOUT]"):
     """
-    End the stream in case of timeout.
+    End the stream in case of timeout, cancellation or failure.
 
     Args:
         channel (str): Channel to stream to.
         session_id (str): ID of the session to stream to.
         message_id (str): ID of the answer.
+        reason (str): Token sent before ending the stream.
     """
     streaming_handler = StreamingCallbackHandler(
         channel, session_id, message_id
     )
-    streaming_handler.on_llm_new_token("[TIMEOUT]")
-    streaming_handler.on_llm_end()
+    streaming_handler.on_llm_abort(reason)
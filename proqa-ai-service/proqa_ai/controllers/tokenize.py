@@ -1,9 +1,13 @@
+from functools import lru_cache
+
 from sentencepiece import SentencePieceProcessor
 from proqa_ai.server.config import settings
 
+
+@lru_cache(maxsize=None)
 def _create_tokenizer_model(model_file: str) -> SentencePieceProcessor:
     """
-    Create tokenizer model.
+    Create tokenizer model. The model is created once per file and reused afterwards.
 
     Args:
         model_file (str): Model file.
@@ -13,6 +17,16 @@ def _create_tokenizer_model(model_file: str) -> SentencePieceProcessor:
     return SentencePieceProcessor(model_file=model_file)
 
 
+def _get_tokenizer() -> SentencePieceProcessor:
+    """
+    Get the tokenizer model of the configured model path.
+
+    Returns:
+        SentencePieceProcessor: Tokenizer model.
+    """
+    return _create_tokenizer_model(model_file=f"{settings.model_path}/llama.model")
+
+
 def generate_tokens(text: str) -> list:
     """
     Generate tokens.
@@ -22,5 +36,16 @@ def generate_tokens(text: str) -> list:
     Returns:
         list: Tokens.
     """
-    tokenizer = _create_tokenizer_model(model_file=f"{settings.model_path}/llama.model")
-    return tokenizer.encode(text)
+    return _get_tokenizer().encode(text)
+
+
+def generate_tokens_batch(texts: list) -> list:
+    """
+    Generate tokens for a batch of texts.
+
+    Args:
+        texts (list): Texts to generate tokens.
+    Returns:
+        list: Tokens of each text in the order of the texts.
+    """
+    return _get_tokenizer().encode(texts)
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
-from proqa_ai.controllers.embedding import generate_embedding
-from proqa_ai.schemas.embedding import EmbeddingRequest, EmbeddingResponse
+from proqa_ai.controllers.embedding import (batcher, generate_embedding, generate_embeddings,
+                                            registry)
+from proqa_ai.schemas.embedding import (EmbeddingBatchRequest, EmbeddingBatchResponse,
+                                        EmbeddingRequest, EmbeddingResponse)
 
 router = APIRouter()
 
@@ -18,3 +20,29 @@ def embedding(request: EmbeddingRequest):
     """
     generated_embedding = generate_embedding(request.text, request.passage)
     return EmbeddingResponse(text=request.text, embedding=generated_embedding)
+
+
+@router.post("/embedding/batch", response_model=EmbeddingBatchResponse)
+def embedding_batch(request: EmbeddingBatchRequest):
+    """
+    Generate embeddings from a batch of texts.
+
+    Args:
+        request (EmbeddingBatchRequest): Request body.
+    Returns:
+        EmbeddingBatchResponse: Response body with embeddings in the order of the texts.
+    """
+    generated_embeddings = generate_embeddings(request.texts, request.passage)
+    return EmbeddingBatchResponse(texts=request.texts, embeddings=generated_embeddings)
+
+
+@router.get("/embedding/stats")
+def embedding_stats():
+    """
+    Get the resident embedding models, their load/evict counts and the batch size and queue
+    wait histograms of the embedding batcher.
+
+    Returns:
+        dict: Embedding statistics.
+    """
+    return {**registry.stats(), "batching": batcher.stats()}
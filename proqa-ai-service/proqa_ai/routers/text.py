@@ -1,10 +1,13 @@
 import logging
+import math
 import time
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 
-from proqa_ai.controllers.text import buffer
-from proqa_ai.schemas.text import TextRequest, TextResponse
+from proqa_ai.controllers.text import buffer, cancel_text, model_managers
+from proqa_ai.utilities.callback import publisher
+from proqa_ai.utilities.generation_queue import QueueFullError
+from proqa_ai.schemas.text import CancelResponse, TextRequest, TextResponse
 
 router = APIRouter()
 logger = logging.getLogger("proqa_ai")
@@ -20,10 +23,20 @@ async def text(request: TextRequest):
         background_tasks (BackgroundTasks): Background tasks to be run.
     Returns:
         TextResponse: Text response.
+    Raises:
+        HTTPException: 503 with a Retry-After header if the queue is full.
     """
 
     rcv_time = time.time()
-    buffer.put((request, rcv_time))
+    try:
+        buffer.put(request, rcv_time, priority=request.priority, size=len(request.prompt),
+                   key=request.message_id)
+    except QueueFullError as exception:
+        logger.warning("Rejected text generation for message %s", request.message_id)
+        raise HTTPException(
+            status_code=503, detail=str(exception),
+            headers={"Retry-After": str(math.ceil(exception.estimated_wait))}
+        ) from exception
     logger.info("Queued text generation for message %s", request.message_id)
 
     return TextResponse(
@@ -32,3 +45,38 @@ async def text(request: TextRequest):
         model_settings=request.model_settings,
         streaming_settings=request.streaming_settings,
     )
+
+
+@router.delete("/text/{message_id}", response_model=CancelResponse)
+def cancel(message_id: str):
+    """
+    Cancel the generation of an answer, the stream of the answer ends with [CANCELLED].
+
+    Args:
+        message_id (str): ID of the answer.
+    Returns:
+        CancelResponse: Cancel response.
+    Raises:
+        HTTPException: 404 if there is no queued or generating request for the answer.
+    """
+    status = cancel_text(message_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No text generation for the message.")
+    logger.info("Cancelled text generation for message %s", message_id)
+    return CancelResponse(message_id=message_id, status=status)
+
+
+@router.get("/text/stats")
+def text_stats():
+    """
+    Get the resident LLMs of each text generation worker with their estimated footprint and
+    load/evict counts, and the statistics of the queue and the token publisher.
+
+    Returns:
+        dict: LLM pool statistics per worker, queue and publisher statistics.
+    """
+    return {
+        "queue": buffer.stats(),
+        "workers": [model_manager.stats() for model_manager in model_managers],
+        "publisher": publisher.stats(),
+    }
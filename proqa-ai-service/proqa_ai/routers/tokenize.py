@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 
-from proqa_ai.controllers.tokenize import generate_tokens
-from proqa_ai.schemas.tokenize import TokenizeRequest, TokenizeResponse
+from proqa_ai.controllers.tokenize import generate_tokens, generate_tokens_batch
+from proqa_ai.schemas.tokenize import (TokenizeBatchRequest, TokenizeBatchResponse,
+                                       TokenizeRequest, TokenizeResponse)
 
 router = APIRouter()
 
@@ -23,4 +24,25 @@ def tokenize(request: TokenizeRequest):
         text=request.text,
         tokens=tokens,
         num_tokens=len(tokens)
-    )
\ No newline at end of file
+    )
+
+
+@router.post("/tokenize/batch", response_model=TokenizeBatchResponse)
+def tokenize_batch(request: TokenizeBatchRequest):
+    """
+    Generate tokens from a batch of texts.
+
+    Args:
+        request (TokenizeBatchRequest): Tokenize batch request.
+    Returns:
+        TokenizeBatchResponse: Tokenize batch response, without the tokens if only the counts
+        were requested.
+    """
+
+    tokens = generate_tokens_batch(request.texts)
+
+    return TokenizeBatchResponse(
+        texts=request.texts,
+        num_tokens=[len(text_tokens) for text_tokens in tokens],
+        tokens=None if request.count_only else tokens
+    )
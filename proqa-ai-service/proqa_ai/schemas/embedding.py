@@ -19,3 +19,23 @@ class EmbeddingResponse:
 
     text: str
     embedding: list
+
+
+@dataclass(frozen=True)
+class EmbeddingBatchRequest:
+    """
+    Schema for generate batch of embeddings request.
+    """
+
+    texts: list
+    passage: bool = True
+
+
+@dataclass(frozen=True)
+class EmbeddingBatchResponse:
+    """
+    Schema for generate batch of embeddings response.
+    """
+
+    texts: list
+    embeddings: list
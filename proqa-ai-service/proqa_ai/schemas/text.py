@@ -1,17 +1,52 @@
 from dataclasses import dataclass
+from typing import List, Optional
 
-from pydantic import BaseSettings
+from pydantic import BaseSettings, validator
 
 
 class ModelSettings(BaseSettings):
     """
     Class defining the settings of the LLM.
+    Load-time settings require the model to be loaded again when changed,
+    sampling settings can differ per request.
     """
+    # Load-time settings
     model_name: str
     n_ctx: int = 2048
     n_batch: int = 1024
     n_gpu_layers: int = 0
+
+    # Sampling settings
     temperature: float = 0.2
+    top_p: float = 0.95
+    max_tokens: int = 256
+    stop: List[str] = []
+
+    @validator("stop")
+    def drop_empty_stop(cls, stop: List[str]) -> List[str]:  # pylint: disable=no-self-argument
+        """
+        Drop empty stop strings, llama.cpp would stop generating right away on them.
+        """
+        return [sequence for sequence in stop if sequence]
+
+    def load_settings(self) -> tuple:
+        """
+        Returns:
+            tuple: Settings that determine how the model is loaded.
+        """
+        return (self.model_name, self.n_ctx, self.n_batch, self.n_gpu_layers)
+
+    def sampling_settings(self) -> dict:
+        """
+        Returns:
+            dict: Settings that determine how tokens are sampled from a loaded model.
+        """
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+            "stop": self.stop,
+        }
 
 
 class StreamingSettings(BaseSettings):
@@ -23,7 +58,7 @@ class StreamingSettings(BaseSettings):
 
 
 @dataclass(frozen=True)
-class TextRequest:
+class TextRequest:  # pylint: disable=too-many-instance-attributes
     """
     Schema for generate text request.
     """
@@ -32,6 +67,13 @@ class TextRequest:
     message_id: str
     model_settings: ModelSettings
     streaming_settings: StreamingSettings
+    prefix: Optional[str] = None
+    # Priority class, lower values are generated first, e.g. 0 for chat and 1 for batch jobs
+    priority: int = 0
+    # Whether tokens are streamed to the channel, background jobs only need the whole text
+    stream: bool = True
+    # Backend endpoint the generated text is posted to, relative to /api/
+    callback: str = "answer"
 
 
 @dataclass(frozen=True)
@@ -44,3 +86,13 @@ class TextResponse:
     message_id: str
     streaming_settings: StreamingSettings
     model_settings: ModelSettings
+
+
+@dataclass(frozen=True)
+class CancelResponse:
+    """
+    Schema for cancel text response.
+    """
+
+    message_id: str
+    status: str
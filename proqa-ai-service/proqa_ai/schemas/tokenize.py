@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass(frozen=True)
@@ -19,3 +20,25 @@ class TokenizeResponse:
     text: str
     tokens: list
     num_tokens: int
+
+
+@dataclass(frozen=True)
+class TokenizeBatchRequest:
+    """
+    Schema for generate tokens for a batch of texts request.
+    """
+
+    texts: list
+    count_only: bool = False
+
+
+@dataclass(frozen=True)
+class TokenizeBatchResponse:
+    """
+    Schema for generate tokens for a batch of texts response.
+    Tokens are omitted if only the counts were requested.
+    """
+
+    texts: list
+    num_tokens: list
+    tokens: Optional[list] = None
@@ -16,16 +16,69 @@ class Settings(BaseSettings):
     # Pushpin related settings
     pushpin_http_url: str = "http://pushpin:5561"
 
+    # Time in milliseconds to collect streamed tokens into one publish
+    publish_window_ms: float = 20
+
+    # Maximum number of streamed tokens in one publish
+    publish_max_tokens: int = 16
+
+    # Number of keep-alive connections to pushpin, each with its own publishing thread
+    publish_connections: int = 4
+
+    # Maximum number of tokens waiting to be published per connection
+    publish_queue_size: int = 10000
+
+    # Timeout in seconds of a publish
+    publish_timeout: float = 1
+
     # Backend related settings
     backend_http_url: str = "http://django:8000"
 
     # Model related settings
     model_path: str = "./proqa_ai/weights"
 
-    # Number of threads to use in LLM
+    # Number of threads to use in LLM, divided among the text generation workers
     thread_count: Optional[int] = None
 
+    # Number of text generation workers, each with its own model context
+    text_generation_workers: int = 1
+
+    # Memory in megabytes for model states after evaluating prompt prefixes, disabled if 0
+    prefix_cache_mb: int = 0
+
+    # Memory in megabytes for model states after the last answer of a chat session,
+    # disabled if 0
+    session_cache_mb: int = 0
+
+    # Time in seconds after which the state of an inactive chat session is dropped
+    session_cache_ttl: int = 3600
+
+    # Directory to spill session states evicted from memory to, disabled if None
+    session_cache_path: Optional[str] = None
+
+    # Disk space in megabytes for spilled session states, unlimited if None
+    session_cache_disk_mb: Optional[int] = None
+
+    # Maximum number of queued text generation requests, further requests are rejected
+    text_generation_queue_size: int = 64
+
+    # Time in seconds a queued text generation request waits before it is promoted a priority
+    # class, so long prompts are not starved by short ones, never promoted if None
+    text_generation_queue_aging: Optional[float] = 60
+
     # Text generation timeout
     text_generation_timeout: int = 900
 
+    # Memory budget in megabytes for resident LLMs, only the last used LLM is kept if None
+    llm_memory_budget_mb: Optional[int] = None
+
+    # Memory budget in megabytes for resident embedding models, unlimited if None
+    embedding_memory_budget_mb: Optional[int] = None
+
+    # Maximum number of texts per forward pass of an embedding model
+    embedding_batch_size: int = 32
+
+    # Time in milliseconds to collect concurrent embedding requests into one batch
+    embedding_batch_window_ms: float = 5
+
 settings = Settings()
@@ -5,11 +5,13 @@ from threading import Thread
 import uvicorn
 from fastapi import FastAPI
 
-from proqa_ai.controllers.text import buffer, generate_text_worker
+from proqa_ai.controllers.embedding import batcher
+from proqa_ai.controllers.text import buffer, generate_text_worker, model_managers
 from proqa_ai.routers.embedding import router as embedding_router
 from proqa_ai.routers.text import router as text_router
 from proqa_ai.routers.tokenize import router as tokenize_router
 from proqa_ai.server.config import settings
+from proqa_ai.utilities.callback import publisher
 
 __version__ = "1.0.0"
 
@@ -20,12 +22,21 @@ def create_app():
     """
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        thread = Thread(target=generate_text_worker)
-        thread.start()
+        threads = [
+            Thread(target=generate_text_worker, args=(model_manager,))
+            for model_manager in model_managers
+        ]
+        for thread in threads:
+            thread.start()
+        batcher.start()
+        publisher.start()
         yield
-        # Stop the worker
-        buffer.put(None)
-        thread.join()
+        # Stop the workers
+        buffer.close()
+        for thread in threads:
+            thread.join()
+        batcher.stop()
+        publisher.stop()
 
     app = FastAPI(title="proqa-ai-service", version=__version__, lifespan=lifespan)
     logging.basicConfig(
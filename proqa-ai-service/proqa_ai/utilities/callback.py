@@ -1,35 +1,58 @@
-import json
-import urllib.parse
-import requests
+from typing import Callable, Optional
+
 from langchain.callbacks.base import BaseCallbackHandler
 
 from proqa_ai.server.config import settings
+from proqa_ai.utilities.publisher import PushpinPublisher
+
+publisher = PushpinPublisher(
+    f"{settings.pushpin_http_url}/publish",
+    window=settings.publish_window_ms / 1000,
+    max_tokens=settings.publish_max_tokens,
+    connections=settings.publish_connections,
+    queue_size=settings.publish_queue_size,
+    timeout=settings.publish_timeout
+)
+
+
+class GenerationCancelledError(Exception):
+    """
+    Raised from the callback handler to abort the generation of a cancelled answer.
+    """
 
 
 class StreamingCallbackHandler(BaseCallbackHandler):
     """
     Callback handler for streaming LLM responses to pushpin.
+    Tokens are published in the background, so generation does not wait for pushpin.
     """
+    # Let GenerationCancelledError propagate to abort the generation
+    raise_error = True
 
-    def __init__(self, channel: str, session_id: str, message_id: str):
+    def __init__(self, channel: str, session_id: str, message_id: str,
+                 token_publisher: Optional[PushpinPublisher] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None):
         """
         Args:
             channel (str): Channel name.
             session_id (str): Identifier of the current chat session of the question.
             message_id (str): Identifier of the current answer being generated.
+            token_publisher (Optional[PushpinPublisher]): Publisher to send the tokens with,
+            the shared publisher if None.
+            is_cancelled (Optional[Callable[[], bool]]): Returns True if the answer was
+            cancelled, checked on every token.
         """
         self.channel = channel
         self.session_id = session_id
         self.message_id = message_id
-        self.url = f"{settings.pushpin_http_url}/publish"
-        self._id = 0
+        self.publisher = token_publisher or publisher
+        self.is_cancelled = is_cancelled
 
     def on_llm_start(self, *args, **kwargs):
         """
         Pushes a [START] token to indicate start of stream.
         """
-        payload = self._create_payload("[START]")
-        self._send_event(payload)
+        self._send_event("[START]", mergeable=False)
 
     def on_llm_new_token(self, token: str, **kwargs):
         """
@@ -37,49 +60,37 @@ class StreamingCallbackHandler(BaseCallbackHandler):
 
             Args:
                 token (str): token used in the payload.
+            Raises:
+                GenerationCancelledError: If the answer was cancelled.
         """
-        payload = self._create_payload(token)
-        self._send_event(payload)
+        if self.is_cancelled is not None and self.is_cancelled():
+            raise GenerationCancelledError(self.message_id)
+        self._send_event(token)
 
     def on_llm_end(self, *args, **kwargs):
         """
         Pushes a [END] token to indicate end of stream.
         """
-        payload = self._create_payload("[END]")
-        self._send_event(payload)
+        self._send_event("[END]", mergeable=False, last=True)
+
+    def on_llm_abort(self, reason: str):
+        """
+        Pushes a reason token, e.g. [CANCELLED], as a message of its own and ends the stream.
+
+            Args:
+                reason (str): Token indicating why the stream ended early.
+        """
+        self._send_event(reason, mergeable=False)
+        self.on_llm_end()
 
-    def _create_payload(self, token: str) -> str:
+    def _send_event(self, token: str, mergeable: bool = True, last: bool = False):
         """
-        Creates the payload to send on each new token.
+        Queues a token for publishing.
 
             Args:
-                token (str): token to create payload with.
-            Returns:
-                str: generated payload in json format.
+                token (str): token to publish.
+                mergeable (bool): If the token can be merged with adjacent tokens.
+                last (bool): If the token ends the stream.
         """
-        token = urllib.parse.quote(token)
-        payload = {
-            "token": token,
-            "messageID": self.message_id,
-            "sessionID": self.session_id,
-        }
-
-        data = {
-            "channel": self.channel,
-            "id": f'{self.message_id}-{self._id}',
-            "formats": {
-                "http-stream": {
-                    "content": f"event:message\ndata:{payload}\n\n",
-                }
-            }
-        }
-        if self._id > 0:
-            data["prev_id"] = f'{self.message_id}-{self._id-1}'
-        self._id += 1
-
-        json_data = json.dumps({"items": [data]})
-        return json_data
-
-    def _send_event(self, payload: str):
-        headers = {"Content-Type": "application/json"}
-        requests.post(self.url, data=payload, headers=headers, timeout=1)
+        self.publisher.publish(self.channel, self.session_id, self.message_id, token,
+                               mergeable=mergeable, last=last)
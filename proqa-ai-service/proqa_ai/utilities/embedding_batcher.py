@@ -0,0 +1,151 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Callable
+
+from proqa_ai.utilities.metrics import Histogram
+
+logger = logging.getLogger("proqa_ai")
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+QUEUE_WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent single-text embedding requests and runs them through the model as
+    one batch. A batch is closed when it reaches the maximum size or when the window after
+    its first request has elapsed.
+    """
+
+    def __init__(self, generate: Callable[[list, bool, str], list], max_batch_size: int,
+                 window: float):
+        """
+        Args:
+            generate (Callable[[list, bool, str], list]): Generates embeddings given texts,
+            passage flag and model name.
+            max_batch_size (int): Maximum number of texts in a batch.
+            window (float): Time in seconds to wait for more requests after the first one.
+        """
+        self.generate = generate
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.batch_size_histogram = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_histogram = Histogram(QUEUE_WAIT_BUCKETS)
+        self._queue = Queue()
+        self._thread = None
+        self._lock = Lock()
+
+    def submit(self, text: str, passage: bool, model_name: str) -> Future:
+        """
+        Queue a text for embedding, starting the worker if it is not running.
+
+        Args:
+            text (str): Text to generate embedding.
+            passage (bool): If given text is a passage or not.
+            model_name (str): Name of the embedding model.
+        Returns:
+            Future: Resolves to the embedding of the text.
+        """
+        self.start()
+        future = Future()
+        self._queue.put((text, passage, model_name, future, time.monotonic()))
+        return future
+
+    def start(self):
+        """
+        Start the worker thread if it is not running.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._worker, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread after the queued requests are processed.
+        """
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def stats(self) -> dict:
+        """
+        Get the batch size and queue wait histograms.
+
+        Returns:
+            dict: Histogram snapshots.
+        """
+        return {
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait": self.queue_wait_histogram.snapshot(),
+        }
+
+    def _collect(self) -> tuple:
+        """
+        Block until a request arrives and collect requests until the batch is closed.
+
+        Returns:
+            tuple: Collected requests and whether the worker should stop.
+        """
+        item = self._queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self):
+        """
+        The worker that generates embeddings for batches of requests.
+        """
+        logger.info("Starting embedding batching worker.")
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._run(batch)
+        logger.info("Stopping embedding batching worker.")
+
+    def _run(self, batch: list):
+        """
+        Generate embeddings for a batch and resolve the futures of its requests.
+
+        Args:
+            batch (list): Requests of the form (text, passage, model_name, future, rcv_time).
+        """
+        start_time = time.monotonic()
+        self.batch_size_histogram.observe(len(batch))
+
+        # A forward pass uses a single prefix and model, so group the requests accordingly
+        groups = defaultdict(list)
+        for text, passage, model_name, future, rcv_time in batch:
+            self.queue_wait_histogram.observe(start_time - rcv_time)
+            groups[(passage, model_name)].append((text, future))
+
+        for (passage, model_name), requests in groups.items():
+            try:
+                embeddings = self.generate([text for text, _ in requests], passage, model_name)
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                for _, future in requests:
+                    future.set_exception(exception)
+                continue
+            for (_, future), embedding in zip(requests, embeddings):
+                future.set_result(embedding)
@@ -0,0 +1,233 @@
+import heapq
+import itertools
+import time
+from collections import Counter
+from threading import Condition
+from typing import Any, Hashable, Optional
+
+from proqa_ai.utilities.metrics import Histogram
+
+QUEUE_WAIT_BUCKETS = [0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 900]
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a request is rejected because the queue is full or the request would not be
+    handled in time.
+    """
+
+    def __init__(self, estimated_wait: float):
+        """
+        Args:
+            estimated_wait (float): Estimated time in seconds until the request would be handled.
+        """
+        super().__init__(f"Text generation queue is full, estimated wait {estimated_wait:.0f}s.")
+        self.estimated_wait = estimated_wait
+
+
+class GenerationQueue:
+    """
+    Bounded queue of text generation requests. Requests are ordered by priority class, lower
+    values first, and by prompt length within a class, so short prompts are not stuck behind
+    long ones. Requests that wait longer than the aging interval are promoted a class for every
+    interval waited, so a stream of short prompts cannot starve a long one. Requests are
+    rejected up front when the queue is full or when the estimated wait exceeds the timeout.
+    """
+
+    def __init__(self, max_depth: int, workers: int, timeout: float,
+                 initial_service_time: float = 10.0, smoothing: float = 0.2,
+                 aging_interval: Optional[float] = None):
+        """
+        Args:
+            max_depth (int): Maximum number of queued requests.
+            workers (int): Number of workers draining the queue.
+            timeout (float): Time in seconds after which a queued request is dropped.
+            initial_service_time (float): Estimated time in seconds to handle a request before
+            any request was handled.
+            smoothing (float): Weight of the latest handled request in the moving average of the
+            service time.
+            aging_interval (Optional[float]): Time in seconds a request waits before it is
+            promoted a priority class, never promoted if None.
+        """
+        self.max_depth = max_depth
+        self.workers = workers
+        self.timeout = timeout
+        self.service_time = initial_service_time
+        self.smoothing = smoothing
+        self.aging_interval = aging_interval
+        self.rejected_count = 0
+        self.wait_histogram = Histogram(QUEUE_WAIT_BUCKETS)
+        self._heap = []
+        # Keys of the requests being handled, mapped to whether they are cancelled
+        self._active = {}
+        self._sequence = itertools.count()
+        self._closed = False
+        self._condition = Condition()
+
+    def put(self, request: Any, rcv_time: float, priority: int = 0, size: int = 0,
+            key: Optional[Hashable] = None):
+        """
+        Queue a request.
+
+        Args:
+            request (Any): Request to queue.
+            rcv_time (float): Time the request was received.
+            priority (int): Priority class, lower values are handled first.
+            size (int): Size of the request, smaller requests are handled first within a class.
+            key (Optional[Hashable]): Key to cancel the request with.
+        Raises:
+            QueueFullError: If the queue is full or the request would time out while queued.
+        """
+        with self._condition:
+            # Only requests of a higher priority class or smaller in the same class go first
+            ahead = sum(1 for entry in self._heap if entry[:2] <= (priority, size))
+            estimated_wait = self._estimate_wait(ahead)
+            if len(self._heap) >= self.max_depth or estimated_wait > self.timeout:
+                self.rejected_count += 1
+                raise QueueFullError(estimated_wait)
+            heapq.heappush(
+                self._heap, (priority, size, next(self._sequence), key, request, rcv_time,
+                             priority, time.monotonic())
+            )
+            self._condition.notify()
+
+    def get(self) -> Optional[tuple]:
+        """
+        Block until a request is queued and take the first one. A request with a key is
+        marked as being handled until done() is called.
+
+        Returns:
+            Optional[tuple]: The request and the time it was received, None if the queue is
+            closed and empty.
+        """
+        with self._condition:
+            while not self._heap and not self._closed:
+                self._condition.wait()
+            if not self._heap:
+                return None
+            self._promote()
+            _, _, _, key, request, rcv_time, _, _ = heapq.heappop(self._heap)
+            if key is not None:
+                self._active[key] = False
+        self.wait_histogram.observe(time.time() - rcv_time)
+        return request, rcv_time
+
+    def done(self, key: Hashable):
+        """
+        Mark a request as handled.
+
+        Args:
+            key (Hashable): Key of the request.
+        """
+        with self._condition:
+            self._active.pop(key, None)
+
+    def remove(self, key: Hashable) -> Optional[Any]:
+        """
+        Remove a queued request.
+
+        Args:
+            key (Hashable): Key of the request.
+        Returns:
+            Optional[Any]: The removed request, None if it is not queued.
+        """
+        with self._condition:
+            for index, entry in enumerate(self._heap):
+                if entry[3] == key:
+                    self._heap[index] = self._heap[-1]
+                    self._heap.pop()
+                    heapq.heapify(self._heap)
+                    return entry[4]
+            return None
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel a request that is being handled. The worker handling it checks is_cancelled().
+
+        Args:
+            key (Hashable): Key of the request.
+        Returns:
+            bool: True if the request is being handled, False otherwise.
+        """
+        with self._condition:
+            if key not in self._active:
+                return False
+            self._active[key] = True
+            return True
+
+    def is_cancelled(self, key: Hashable) -> bool:
+        """
+        Args:
+            key (Hashable): Key of the request.
+        Returns:
+            bool: True if the request being handled was cancelled.
+        """
+        return self._active.get(key, False)
+
+    def close(self):
+        """
+        Close the queue, the workers stop once the queued requests are handled.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def observe_service_time(self, duration: float):
+        """
+        Update the moving average of the time to handle a request.
+
+        Args:
+            duration (float): Time in seconds it took to handle a request.
+        """
+        with self._condition:
+            self.service_time += self.smoothing * (duration - self.service_time)
+
+    def stats(self) -> dict:
+        """
+        Get the queue depth per requested priority class, the rejected count and the wait
+        histogram.
+
+        Returns:
+            dict: Queue statistics.
+        """
+        with self._condition:
+            depth_per_priority = Counter(entry[6] for entry in self._heap)
+            return {
+                "depth": len(self._heap),
+                "active": len(self._active),
+                "max_depth": self.max_depth,
+                "depth_per_priority": {
+                    str(priority): depth for priority, depth in sorted(depth_per_priority.items())
+                },
+                "estimated_wait": self._estimate_wait(len(self._heap)),
+                "rejected_count": self.rejected_count,
+                "wait": self.wait_histogram.snapshot(),
+            }
+
+    def _promote(self):
+        """
+        Promote the queued requests a priority class for every aging interval they waited.
+        Must be called with the lock held.
+        """
+        if self.aging_interval is None:
+            return
+        now = time.monotonic()
+        promoted = False
+        for index, entry in enumerate(self._heap):
+            priority = entry[6] - int((now - entry[7]) // self.aging_interval)
+            if priority < entry[0]:
+                self._heap[index] = (priority,) + entry[1:]
+                promoted = True
+        if promoted:
+            heapq.heapify(self._heap)
+
+    def _estimate_wait(self, ahead: int) -> float:
+        """
+        Estimate the time until handling a request starts. Must be called with the lock held.
+
+        Args:
+            ahead (int): Number of queued requests handled before the request.
+        Returns:
+            float: Estimated wait in seconds.
+        """
+        return ahead * self.service_time / self.workers
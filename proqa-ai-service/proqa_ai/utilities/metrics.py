@@ -0,0 +1,46 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+class Histogram:
+    """
+    Thread-safe histogram counting observations into fixed buckets.
+    """
+
+    def __init__(self, buckets: list):
+        """
+        Args:
+            buckets (list): Upper bounds of the buckets. Larger values are counted in "+Inf".
+        """
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        """
+        Count an observation.
+
+        Args:
+            value (float): Observed value.
+        """
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self) -> dict:
+        """
+        Get the current state of the histogram.
+
+        Returns:
+            dict: Count per bucket, total count and sum of the observations.
+        """
+        with self._lock:
+            labels = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+            return {
+                "buckets": dict(zip(labels, self._counts)),
+                "count": self._count,
+                "sum": self._sum,
+            }
@@ -1,45 +1,145 @@
+import os
+from typing import Any, Callable, Optional, Sequence
+
 from langchain.llms import LlamaCpp
 
 from proqa_ai.schemas.text import ModelSettings, StreamingSettings
 from proqa_ai.server.config import settings
 from proqa_ai.utilities.callback import StreamingCallbackHandler
+from proqa_ai.utilities.model_registry import LoadedModel, ModelRegistry
+from proqa_ai.utilities.state_cache import StateCache
 
 
 class ModelManager:
     """
-    Responsible for loading the model and performing inference.
+    Responsible for loading the models and performing inference.
+    Models are kept resident until the memory budget is exceeded, in which case the least
+    recently used model is evicted.
     """
-    def __init__(self, model_settings: ModelSettings = None):
-        self.model_settings = model_settings
-        self.model = None
+    def __init__(self, memory_budget: int = 0, n_threads: Optional[int] = None,
+                 prefix_cache: Optional[StateCache] = None,
+                 session_cache: Optional[StateCache] = None):
+        """
+        Args:
+            memory_budget (int): Maximum estimated size of the resident models in bytes.
+            The last used model is always kept, so a budget of 0 keeps a single model.
+            n_threads (Optional[int]): Number of threads used by the models.
+            prefix_cache (Optional[StateCache]): Cache of model states after evaluating a
+            prompt prefix, disabled if None.
+            session_cache (Optional[StateCache]): Cache of model states after the last
+            generation of a chat session, disabled if None.
+        """
+        self.models = ModelRegistry(memory_budget=memory_budget)
+        self.n_threads = n_threads
+        self.prefix_cache = prefix_cache
+        self.session_cache = session_cache
 
-    def _factory(self, model_settings: ModelSettings) -> LlamaCpp:
+    def _load(self, model_settings: ModelSettings) -> LoadedModel:
         """
-        Factory method for loading the model.
+        Load the model memory-mapped, so its pages are shared and can be reclaimed by the OS.
 
         Args:
             model_settings (ModelSettings): Model settings.
         Returns:
-            LlamaCpp: Loaded model.
+            LoadedModel: Loaded model with the size of its weights file as estimated footprint.
         """
-        if self.model is not None and self.model_settings == model_settings:
-            return self.model
-
-        self.model_settings = model_settings
-        self.model = LlamaCpp(
-            model_path=f"{settings.model_path}/{model_settings.model_name}.bin",
+        model_path = f"{settings.model_path}/{model_settings.model_name}.bin"
+        model = LlamaCpp(
+            model_path=model_path,
             n_ctx=model_settings.n_ctx,
             n_batch=model_settings.n_batch,
-            n_threads=settings.thread_count,
+            n_threads=self.n_threads,
             n_gpu_layers=model_settings.n_gpu_layers,
-            temperature=model_settings.temperature,
+            use_mmap=True,
             streaming=True
         )
-        return self.model
+        return LoadedModel(model=model, size=os.path.getsize(model_path))
+
+    def _factory(self, model_settings: ModelSettings) -> LlamaCpp:
+        """
+        Factory method for loading the model. A model is only loaded if no resident model has
+        the same load-time settings, sampling settings are applied to a view sharing the loaded
+        weights.
+
+        Args:
+            model_settings (ModelSettings): Model settings.
+        Returns:
+            LlamaCpp: Loaded model with the sampling settings of the request.
+        """
+        loaded_model = self.models.get(
+            model_settings.load_settings(), lambda _: self._load(model_settings)
+        )
+
+        # Copying does not run the validators, so the loaded client is shared
+        return loaded_model.model.copy(update=model_settings.sampling_settings())
+
+    def _prefix_state(self, llm: LlamaCpp, load_settings: tuple, prefix: str) -> Any:
+        """
+        Get the model state at the end of the evaluated prefix from the prefix cache, or
+        compute and cache it on a miss. States of other prefixes of the same model are
+        invalidated, as the prefix only changes with the prompt template.
+
+        Args:
+            llm (LlamaCpp): Model to evaluate the prefix with.
+            load_settings (tuple): Load-time settings of the model.
+            prefix (str): Prefix shared by the prompts of the template.
+        Returns:
+            Any: State after evaluating the prefix.
+        """
+        client = llm.client
+        key = (load_settings, prefix)
+        state = self.prefix_cache.get(key)
+        if state is None:
+            self.prefix_cache.remove_if(lambda cached: cached[0] == load_settings)
+            # llama.cpp prepends a space to the prompt when tokenizing
+            client.reset()
+            client.eval(client.tokenize(b" " + prefix.encode("utf-8")))
+            state = client.save_state()
+            self.prefix_cache.put(key, state)
+        return state
+
+    @staticmethod
+    def _restore(llm: LlamaCpp, states: list, prompt: str):
+        """
+        Bring the model to the cached state sharing the longest start with the prompt, so
+        llama.cpp only evaluates the rest of the prompt. Nothing is restored if the current
+        state already shares at least as much of the prompt.
+
+        Args:
+            llm (LlamaCpp): Model to prepare.
+            states (list): Candidate states.
+            prompt (str): Prompt to generate from.
+        """
+        client = llm.client
+        prompt_tokens = client.tokenize(b" " + prompt.encode("utf-8"))
+        best_length = _common_prefix_length(client.eval_tokens, prompt_tokens)
+        best_state = None
+        for state in states:
+            length = _common_prefix_length(state.eval_tokens, prompt_tokens)
+            if length > best_length:
+                best_length, best_state = length, state
+        if best_state is not None:
+            client.load_state(best_state)
+
+    def stats(self) -> dict:
+        """
+        Get the resident models.
+
+        Returns:
+            dict: Resident models with their estimated footprint, load/evict counts and
+            state cache statistics.
+        """
+        stats = self.models.stats()
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        if self.session_cache is not None:
+            stats["session_cache"] = self.session_cache.stats()
+        return stats
 
     def generate_text(
         self, prompt: str, message_id: str, model_settings: ModelSettings,
-        streaming_settings: StreamingSettings
+        streaming_settings: StreamingSettings, prefix: Optional[str] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None, stream: bool = True
     ) -> str:
         """
         Generate text from prompt.
@@ -49,13 +149,58 @@ class ModelManager:
             message_id (str): ID of the answer
             model_settings (ModelSettings): Model settings.
             streaming_settings (StreamingSettings): Streaming settings.
+            prefix (Optional[str]): Start of the prompt that is shared by all prompts of the
+            template.
+            is_cancelled (Optional[Callable[[], bool]]): Returns True if the answer was
+            cancelled, in which case generation stops at the next token.
+            stream (bool): Whether to stream the tokens. Text that is not streamed is not part
+            of the conversation, so it does not use or replace the state of the session, and it
+            cannot be cancelled once generation started.
         Returns:
             str: Generated text.
+        Raises:
+            GenerationCancelledError: If the answer was cancelled.
         """
         llm = self._factory(model_settings)
+        load_settings = model_settings.load_settings()
+        session_key = (load_settings, streaming_settings.session_id)
+        states = []
+        if self.prefix_cache is not None and prefix and prompt.startswith(prefix):
+            states.append(self._prefix_state(llm, load_settings, prefix))
+        if self.session_cache is not None and stream:
+            # A follow-up prompt extends the previous prompt and answer of the session
+            session_state = self.session_cache.get(session_key)
+            if session_state is not None:
+                states.append(session_state)
+        if states:
+            self._restore(llm, states, prompt)
+
+        if not stream:
+            return llm(prompt, callbacks=[])
+
         streaming_handler = StreamingCallbackHandler(
-            streaming_settings.channel, streaming_settings.session_id, message_id
+            streaming_settings.channel, streaming_settings.session_id, message_id,
+            is_cancelled=is_cancelled
         )
         generated_text = llm(prompt, callbacks=[streaming_handler])
 
+        if self.session_cache is not None:
+            self.session_cache.put(session_key, llm.client.save_state())
+
         return generated_text
+
+
+def _common_prefix_length(tokens_a: Sequence[int], tokens_b: Sequence[int]) -> int:
+    """
+    Args:
+        tokens_a (Sequence[int]): Tokens.
+        tokens_b (Sequence[int]): Tokens.
+    Returns:
+        int: Number of leading tokens the sequences have in common.
+    """
+    length = 0
+    for token_a, token_b in zip(tokens_a, tokens_b):
+        if token_a != token_b:
+            break
+        length += 1
+    return length
@@ -0,0 +1,125 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional
+
+from torch import nn
+
+logger = logging.getLogger("proqa_ai")
+
+
+@dataclass
+class LoadedModel:
+    """
+    A model that is resident in memory.
+    """
+    model: Any
+    tokenizer: Any = None
+    size: int = 0
+
+
+def estimate_size(module: nn.Module) -> int:
+    """
+    Estimate the memory footprint of a torch module.
+
+    Args:
+        module (nn.Module): Module to estimate.
+    Returns:
+        int: Size of the parameters and buffers in bytes.
+    """
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelRegistry:
+    """
+    Keeps models resident in memory so they are loaded once per process.
+    When a memory budget is set, the least recently used models are evicted to stay within it.
+    """
+
+    def __init__(self, memory_budget: Optional[int] = None):
+        """
+        Args:
+            memory_budget (Optional[int]): Maximum size of the resident models in bytes.
+            No models are evicted if it is None.
+        """
+        self.memory_budget = memory_budget
+        self.load_count = 0
+        self.evict_count = 0
+        self._models = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, model_name: Hashable, loader: Callable[[Hashable], LoadedModel]) -> LoadedModel:
+        """
+        Get a resident model, loading it if it is not in memory.
+
+        Args:
+            model_name (Hashable): Name of the model, or any key identifying a loaded model.
+            loader (Callable[[Hashable], LoadedModel]): Loads the model given its name.
+        Returns:
+            LoadedModel: The resident model.
+        """
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                return self._models[model_name]
+
+            logger.info("Loading model %s", model_name)
+            loaded_model = loader(model_name)
+            self._models[model_name] = loaded_model
+            self.load_count += 1
+            self._evict()
+            return loaded_model
+
+    def evict(self, model_name: Hashable) -> bool:
+        """
+        Remove a model from memory.
+
+        Args:
+            model_name (Hashable): Name of the model.
+        Returns:
+            bool: True if the model was resident, False if not.
+        """
+        with self._lock:
+            if model_name not in self._models:
+                return False
+            del self._models[model_name]
+            self.evict_count += 1
+            return True
+
+    def stats(self) -> dict:
+        """
+        Get the state of the registry.
+
+        Returns:
+            dict: Resident models with their sizes, memory usage and load/evict counts.
+        """
+        with self._lock:
+            return {
+                "models": {str(name): model.size for name, model in self._models.items()},
+                "memory_usage": self._memory_usage(),
+                "memory_budget": self.memory_budget,
+                "load_count": self.load_count,
+                "evict_count": self.evict_count,
+            }
+
+    def _memory_usage(self) -> int:
+        """
+        Returns:
+            int: Total size of the resident models in bytes.
+        """
+        return sum(model.size for model in self._models.values())
+
+    def _evict(self):
+        """
+        Evict least recently used models until the budget is met.
+        The most recently used model is always kept.
+        """
+        if self.memory_budget is None:
+            return
+
+        while len(self._models) > 1 and self._memory_usage() > self.memory_budget:
+            model_name, _ = self._models.popitem(last=False)
+            self.evict_count += 1
+            logger.info("Evicted model %s", model_name)
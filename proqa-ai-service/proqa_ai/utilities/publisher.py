@@ -0,0 +1,244 @@
+import json
+import logging
+import time
+import urllib.parse
+import zlib
+from collections import OrderedDict
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from proqa_ai.utilities.metrics import Histogram
+
+logger = logging.getLogger("proqa_ai")
+
+PUBLISH_LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+
+class PushpinPublisher:
+    """
+    Publishes streamed tokens to pushpin in the background, so generation is not blocked on
+    the network. Tokens arriving within a window after the first one, up to a maximum number,
+    are sent in one publish, with consecutive tokens of the same message merged into one item.
+    Each message is handled by the same thread, which keeps its items in order and chained
+    by id and prev_id.
+    """
+
+    def __init__(self, url: str, window: float, max_tokens: int, connections: int,
+                 queue_size: int, timeout: float):
+        """
+        Args:
+            url (str): Publish endpoint of pushpin.
+            window (float): Time in seconds to wait for more tokens after the first one.
+            max_tokens (int): Maximum number of tokens in one publish.
+            connections (int): Number of publishing threads, each with its own keep-alive
+            connection.
+            queue_size (int): Maximum number of waiting tokens per thread, tokens are dropped
+            when it is full.
+            timeout (float): Timeout in seconds of a publish.
+        """
+        self.url = url
+        self.window = window
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.published_count = 0
+        self.merged_count = 0
+        self.dropped_count = 0
+        self.latency_histogram = Histogram(PUBLISH_LATENCY_BUCKETS)
+        self._queues = [Queue(maxsize=queue_size) for _ in range(connections)]
+        # Next id of each message per queue, only accessed by the thread of the queue
+        self._next_ids = [{} for _ in range(connections)]
+        self._threads = []
+        self._session = requests.Session()
+        self._session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=connections))
+        self._lock = Lock()
+
+    def publish(self, channel: str, session_id: str, message_id: str, token: str,
+                mergeable: bool = True, last: bool = False):
+        """
+        Queue a token for publishing, starting the threads if they are not running.
+
+        Args:
+            channel (str): Channel name.
+            session_id (str): Identifier of the chat session of the message.
+            message_id (str): Identifier of the message.
+            token (str): Token to publish.
+            mergeable (bool): If the token can be merged with adjacent tokens of the message.
+            last (bool): If the token ends the stream of the message.
+        """
+        self.start()
+        queue = self._queues[zlib.crc32(message_id.encode("utf-8")) % len(self._queues)]
+        try:
+            queue.put_nowait((channel, session_id, message_id, token, mergeable, last))
+        except Full:
+            logger.warning("Publish queue is full, dropping token of message %s", message_id)
+            with self._lock:
+                self.dropped_count += 1
+
+    def start(self):
+        """
+        Start the publishing threads if they are not running.
+        """
+        with self._lock:
+            if not self._threads:
+                self._threads = [Thread(target=self._worker, args=(index,), daemon=True)
+                                 for index in range(len(self._queues))]
+                for thread in self._threads:
+                    thread.start()
+
+    def stop(self):
+        """
+        Stop the publishing threads after the queued tokens are published.
+        """
+        # The threads take the lock to update the counts, so join them without holding it
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for queue in self._queues[:len(threads)]:
+            queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def stats(self) -> dict:
+        """
+        Get the publish latency histogram and the published, merged and dropped token counts.
+
+        Returns:
+            dict: Publisher statistics.
+        """
+        with self._lock:
+            return {
+                "latency": self.latency_histogram.snapshot(),
+                "published_count": self.published_count,
+                "merged_count": self.merged_count,
+                "dropped_count": self.dropped_count,
+            }
+
+    def _collect(self, queue: Queue) -> tuple:
+        """
+        Block until a token arrives and collect tokens until the window has elapsed or the
+        maximum number of tokens is reached.
+
+        Args:
+            queue (Queue): Queue of the thread.
+        Returns:
+            tuple: Collected tokens and whether the thread should stop.
+        """
+        item = queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_tokens:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, index: int):
+        """
+        The thread that publishes the tokens of its queue.
+
+        Args:
+            index (int): Index of the queue of the thread.
+        """
+        stop = False
+        while not stop:
+            batch, stop = self._collect(self._queues[index])
+            if batch:
+                self._send(batch, self._next_ids[index])
+
+    def _send(self, batch: list, next_ids: dict):
+        """
+        Merge the tokens of a batch and publish them as one request. The ids of the messages
+        are only advanced when the publish succeeds, so the chain has no gaps.
+
+        Args:
+            batch (list): Tokens of the form (channel, session_id, message_id, token,
+            mergeable, last).
+            next_ids (dict): Next id of each message.
+        """
+        messages = OrderedDict()
+        for channel, session_id, message_id, token, mergeable, last in batch:
+            parts = messages.setdefault(message_id, [])
+            if mergeable and parts and parts[-1]["mergeable"]:
+                parts[-1]["token"] += token
+                continue
+            parts.append({"channel": channel, "session_id": session_id, "token": token,
+                          "mergeable": mergeable, "last": last})
+
+        items = []
+        new_ids = {}
+        for message_id, parts in messages.items():
+            message_next_id = next_ids.get(message_id, 0)
+            for part in parts:
+                items.append(_create_item(part["channel"], part["session_id"], message_id,
+                                          part["token"], message_next_id))
+                message_next_id += 1
+            new_ids[message_id] = message_next_id
+
+        start_time = time.monotonic()
+        try:
+            response = self._session.post(
+                self.url, data=json.dumps({"items": items}),
+                headers={"Content-Type": "application/json"}, timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            logger.warning("Failed to publish %d tokens to pushpin", len(batch), exc_info=True)
+            with self._lock:
+                self.dropped_count += len(batch)
+            return
+        self.latency_histogram.observe(time.monotonic() - start_time)
+
+        with self._lock:
+            self.published_count += len(batch)
+            self.merged_count += len(batch) - len(items)
+        for message_id, parts in messages.items():
+            if parts[-1]["last"]:
+                next_ids.pop(message_id, None)
+            else:
+                next_ids[message_id] = new_ids[message_id]
+
+
+def _create_item(channel: str, session_id: str, message_id: str, token: str,
+                 item_id: int) -> dict:
+    """
+    Creates the pushpin item of a token.
+
+    Args:
+        channel (str): Channel name.
+        session_id (str): Identifier of the chat session of the message.
+        message_id (str): Identifier of the message.
+        token (str): Token to create the item with.
+        item_id (int): Position of the item in the stream of the message.
+    Returns:
+        dict: Pushpin item.
+    """
+    payload = {
+        "token": urllib.parse.quote(token),
+        "messageID": message_id,
+        "sessionID": session_id,
+    }
+
+    item = {
+        "channel": channel,
+        "id": f'{message_id}-{item_id}',
+        "formats": {
+            "http-stream": {
+                "content": f"event:message\ndata:{payload}\n\n",
+            }
+        }
+    }
+    if item_id > 0:
+        item["prev_id"] = f'{message_id}-{item_id-1}'
+    return item
@@ -0,0 +1,285 @@
+import ctypes
+import hashlib
+import logging
+import os
+import pickle
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional
+
+logger = logging.getLogger("proqa_ai")
+
+# Spilled states are named after the hash of their key
+SPILL_FILE_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class StateCache:
+    """
+    Bounded cache of saved llama.cpp states. The least recently used states are evicted when
+    the total size of the states exceeds the capacity. Evicted states can be spilled to a
+    local directory, from which they are loaded back on access. States older than the time to
+    live are dropped from memory and disk.
+    """
+
+    def __init__(self, capacity_bytes: int, ttl: Optional[float] = None,
+                 spill_path: Optional[str] = None, spill_capacity_bytes: Optional[int] = None):
+        """
+        Args:
+            capacity_bytes (int): Maximum total size of the cached states in memory in bytes.
+            ttl (Optional[float]): Time in seconds after which a state is dropped, never if
+            None.
+            spill_path (Optional[str]): Directory to spill evicted states to, disabled if None.
+            spill_capacity_bytes (Optional[int]): Maximum total size of the spilled states in
+            bytes, unlimited if None.
+        """
+        self.capacity_bytes = capacity_bytes
+        self.ttl = ttl
+        self.spill_path = spill_path
+        self.spill_capacity_bytes = spill_capacity_bytes
+        self.hit_count = 0
+        self.miss_count = 0
+        self.spill_count = 0
+        self._states = OrderedDict()
+        self._spilled = OrderedDict()
+        self._lock = Lock()
+        if spill_path is not None:
+            os.makedirs(spill_path, exist_ok=True)
+            self._remove_stale_spills()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached state, loading it back into memory if it was spilled.
+
+        Args:
+            key (Hashable): Key of the state.
+        Returns:
+            Optional[Any]: The state, None if it is not cached.
+        """
+        with self._lock:
+            self._expire()
+            if key in self._states:
+                self._states.move_to_end(key)
+                self.hit_count += 1
+                return self._states[key][0]
+            if key not in self._spilled:
+                self.miss_count += 1
+                return None
+            path, _, stored_at = self._spilled.pop(key)
+
+        state = self._load(path)
+        with self._lock:
+            if state is None:
+                self.miss_count += 1
+                return None
+            self.hit_count += 1
+            evicted = self._insert(key, state, stored_at)
+        self._spill(evicted)
+        return state
+
+    def put(self, key: Hashable, state: Any):
+        """
+        Cache a state, evicting the least recently used states if over capacity.
+
+        Args:
+            key (Hashable): Key of the state.
+            state (Any): State with a llama_state_size attribute.
+        """
+        with self._lock:
+            self._expire()
+            self._discard_spilled(key)
+            evicted = self._insert(key, state, time.monotonic())
+        self._spill(evicted)
+
+    def remove_if(self, predicate: Callable[[Hashable], bool]):
+        """
+        Remove the states whose key matches the predicate.
+
+        Args:
+            predicate (Callable[[Hashable], bool]): Returns True for keys to remove.
+        """
+        with self._lock:
+            for key in [key for key in self._states if predicate(key)]:
+                del self._states[key]
+            for key in [key for key in self._spilled if predicate(key)]:
+                self._discard_spilled(key)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Number of cached states, their size and the hit/miss counts.
+        """
+        with self._lock:
+            self._expire()
+            return {
+                "states": len(self._states),
+                "size": self._size(),
+                "capacity": self.capacity_bytes,
+                "spilled_states": len(self._spilled),
+                "spilled_size": self._spilled_size(),
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+                "spill_count": self.spill_count,
+            }
+
+    def _insert(self, key: Hashable, state: Any, stored_at: float) -> list:
+        """
+        Insert a state in memory and evict the least recently used states if over capacity.
+        Must be called with the lock held.
+
+        Args:
+            key (Hashable): Key of the state.
+            state (Any): State with a llama_state_size attribute.
+            stored_at (float): Time the state was stored.
+        Returns:
+            list: Evicted entries of the form (key, state, stored_at).
+        """
+        self._states.pop(key, None)
+        self._states[key] = (state, stored_at)
+        evicted = []
+        while len(self._states) > 1 and self._size() > self.capacity_bytes:
+            evicted_key, (evicted_state, evicted_at) = self._states.popitem(last=False)
+            evicted.append((evicted_key, evicted_state, evicted_at))
+        return evicted
+
+    def _spill(self, evicted: list):
+        """
+        Write evicted states to the spill directory. Writing happens without the lock held, so
+        other workers are not blocked by the disk.
+
+        Args:
+            evicted (list): Evicted entries of the form (key, state, stored_at).
+        """
+        if self.spill_path is None:
+            return
+        for key, state, stored_at in evicted:
+            path = os.path.join(
+                self.spill_path, hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+            )
+            try:
+                with open(path, "wb") as file:
+                    pickle.dump(_serialize(state), file, protocol=pickle.HIGHEST_PROTOCOL)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError):
+                logger.exception("Failed to spill state to %s", path)
+                _remove_file(path)
+                continue
+            with self._lock:
+                self._discard_spilled(key)
+                self._spilled[key] = (path, state.llama_state_size, stored_at)
+                self.spill_count += 1
+                while self.spill_capacity_bytes is not None and len(self._spilled) > 1 \
+                        and self._spilled_size() > self.spill_capacity_bytes:
+                    self._discard_spilled(next(iter(self._spilled)))
+
+    def _load(self, path: str) -> Optional[Any]:
+        """
+        Load a spilled state and remove its file.
+
+        Args:
+            path (str): Path of the spilled state.
+        Returns:
+            Optional[Any]: The state, None if it could not be read.
+        """
+        try:
+            with open(path, "rb") as file:
+                return _deserialize(pickle.load(file))
+        except (OSError, pickle.UnpicklingError, EOFError, TypeError, ValueError):
+            logger.exception("Failed to load spilled state from %s", path)
+            return None
+        finally:
+            _remove_file(path)
+
+    def _remove_stale_spills(self):
+        """
+        Remove the states spilled by an earlier process. Their keys are not known anymore, so
+        they could not be loaded and would not count towards the spill capacity.
+        """
+        for name in os.listdir(self.spill_path):
+            if SPILL_FILE_PATTERN.fullmatch(name):
+                _remove_file(os.path.join(self.spill_path, name))
+
+    def _discard_spilled(self, key: Hashable):
+        """
+        Remove a spilled state and its file. Must be called with the lock held.
+
+        Args:
+            key (Hashable): Key of the state.
+        """
+        entry = self._spilled.pop(key, None)
+        if entry is not None:
+            _remove_file(entry[0])
+
+    def _expire(self):
+        """
+        Drop the states older than the time to live. Must be called with the lock held.
+        """
+        if self.ttl is None:
+            return
+        deadline = time.monotonic() - self.ttl
+        for key in [key for key, (_, stored_at) in self._states.items() if stored_at < deadline]:
+            del self._states[key]
+        for key in [key for key, (_, _, stored_at) in self._spilled.items()
+                    if stored_at < deadline]:
+            self._discard_spilled(key)
+
+    def _size(self) -> int:
+        """
+        Returns:
+            int: Total size of the cached states in memory in bytes.
+        """
+        return sum(state.llama_state_size for state, _ in self._states.values())
+
+    def _spilled_size(self) -> int:
+        """
+        Returns:
+            int: Total size of the spilled states in bytes.
+        """
+        return sum(size for _, size, _ in self._spilled.values())
+
+
+def _serialize(state: Any) -> tuple:
+    """
+    Convert a state to a picklable form. The llama.cpp state data is a ctypes array of a type
+    created at runtime, which cannot be pickled, so it is stored as bytes.
+
+    Args:
+        state (Any): State with a llama_state_size attribute.
+    Returns:
+        tuple: Class of the state and its attributes.
+    """
+    attributes = dict(vars(state))
+    if isinstance(attributes.get("llama_state"), ctypes.Array):
+        attributes["llama_state"] = bytes(attributes["llama_state"])
+    return type(state), attributes
+
+
+def _deserialize(serialized: tuple) -> Any:
+    """
+    Rebuild a state converted by _serialize.
+
+    Args:
+        serialized (tuple): Class of the state and its attributes.
+    Returns:
+        Any: The state, with its llama.cpp state data as a ctypes array.
+    """
+    state_class, attributes = serialized
+    if isinstance(attributes.get("llama_state"), bytes):
+        data = attributes["llama_state"]
+        attributes["llama_state"] = (ctypes.c_uint8 * len(data)).from_buffer_copy(data)
+    state = state_class.__new__(state_class)
+    state.__dict__.update(attributes)
+    return state
+
+
+def _remove_file(path: str):
+    """
+    Remove a file if it exists.
+
+    Args:
+        path (str): Path of the file.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
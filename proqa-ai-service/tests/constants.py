@@ -8,3 +8,6 @@ GENERATED_TEXT = "generated_text"
 TEXT = "text"
 GENERATED_EMBEDDING = [0.0, 0.0, 0.0]
 GENERATED_TOKENS = [0, 0, 0]
+MODEL_SIZE = 1024
+TEXTS = ["text_a", "text_b"]
+GENERATED_EMBEDDINGS = [[0.0, 0.0, 0.0], [1.0, 1.0, 1.0]]
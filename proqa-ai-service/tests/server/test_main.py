@@ -1,8 +1,13 @@
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from pytest_mock import MockerFixture
 
 from proqa_ai.server import create_app
+from proqa_ai.controllers.text import buffer, generate_text_worker
+from proqa_ai.schemas.text import ModelSettings, StreamingSettings, TextRequest
+from proqa_ai.utilities.generation_queue import GenerationQueue
 from tests import constants
 
 
@@ -63,6 +68,22 @@ def test_embedding_endpoint(mocker: MockerFixture, app: TestClient):
     assert response_json["embedding"] == constants.GENERATED_EMBEDDING
 
 
+def test_embedding_batch_endpoint(mocker: MockerFixture, app: TestClient):
+    """
+    Test embedding batch endpoint.
+    """
+    mocker.patch(
+        "proqa_ai.routers.embedding.generate_embeddings",
+        return_value=constants.GENERATED_EMBEDDINGS,
+    )
+
+    response = app.post("/embedding/batch", json={"texts": constants.TEXTS, "passage": False})
+    response_json = response.json()
+    assert response.status_code == 200
+    assert response_json["texts"] == constants.TEXTS
+    assert response_json["embeddings"] == constants.GENERATED_EMBEDDINGS
+
+
 def test_tokenize_endpoint(mocker: MockerFixture, app: TestClient):
     """
     Test tokenize endpoint.
@@ -78,3 +99,140 @@ def test_tokenize_endpoint(mocker: MockerFixture, app: TestClient):
     assert response_json["text"] == constants.TEXT
     assert response_json["tokens"] == constants.GENERATED_TOKENS
     assert response_json["num_tokens"] == len(constants.GENERATED_TOKENS)
+
+
+def test_tokenize_batch_endpoint(mocker: MockerFixture, app: TestClient):
+    """
+    Test tokenize batch endpoint.
+    """
+    mocker.patch(
+        "proqa_ai.routers.tokenize.generate_tokens_batch",
+        return_value=[constants.GENERATED_TOKENS] * len(constants.TEXTS),
+    )
+
+    response = app.post("/tokenize/batch", json={"texts": constants.TEXTS})
+    response_json = response.json()
+    assert response.status_code == 200
+    assert response_json["texts"] == constants.TEXTS
+    assert response_json["tokens"] == [constants.GENERATED_TOKENS] * len(constants.TEXTS)
+    assert response_json["num_tokens"] == [len(constants.GENERATED_TOKENS)] * len(constants.TEXTS)
+
+
+def test_tokenize_batch_endpoint_given_count_only_then_no_tokens(
+    mocker: MockerFixture, app: TestClient
+):
+    """
+    Test tokenize batch endpoint in count-only mode.
+    """
+    mocker.patch(
+        "proqa_ai.routers.tokenize.generate_tokens_batch",
+        return_value=[constants.GENERATED_TOKENS] * len(constants.TEXTS),
+    )
+
+    response = app.post("/tokenize/batch", json={"texts": constants.TEXTS, "count_only": True})
+    response_json = response.json()
+    assert response.status_code == 200
+    assert response_json["tokens"] is None
+    assert response_json["num_tokens"] == [len(constants.GENERATED_TOKENS)] * len(constants.TEXTS)
+
+
+def test_embedding_stats_endpoint(app: TestClient):
+    """
+    Test embedding stats endpoint.
+    """
+    response = app.get("/embedding/stats")
+    response_json = response.json()
+    assert response.status_code == 200
+    assert "models" in response_json
+    assert "load_count" in response_json
+    assert "evict_count" in response_json
+
+
+def test_text_endpoint_given_full_queue_then_503(app: TestClient, mocker: MockerFixture):
+    """
+    Test text endpoint rejects requests when the queue is full.
+    """
+    mocker.patch.object(buffer, "max_depth", 0)
+    response = app.post(
+        "/text",
+        json={
+            "prompt": constants.PROMPT,
+            "model_settings": {"model_name": constants.MODEL_NAME},
+            "message_id": constants.MESSAGE_ID,
+            "streaming_settings": {
+                "session_id": constants.SESSION_ID,
+                "channel": constants.CHANNEL,
+            }
+        },
+    )
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_cancel_endpoint_given_queued_message_then_remove(app: TestClient,
+                                                          mocker: MockerFixture):
+    """
+    Test cancel endpoint removes a queued request and ends its stream.
+    """
+    end_stream = mocker.patch("proqa_ai.controllers.text._end_stream")
+    message_id = "cancelled-message"
+    app.post(
+        "/text",
+        json={
+            "prompt": constants.PROMPT,
+            "model_settings": {"model_name": constants.MODEL_NAME},
+            "message_id": message_id,
+            "streaming_settings": {
+                "session_id": constants.SESSION_ID,
+                "channel": constants.CHANNEL,
+            }
+        },
+    )
+
+    response = app.delete(f"/text/{message_id}")
+    assert response.status_code == 200
+    assert response.json() == {"message_id": message_id, "status": "queued"}
+    assert end_stream.call_args.kwargs["reason"] == "[CANCELLED]"
+    assert app.delete(f"/text/{message_id}").status_code == 404
+
+
+def test_text_stats_endpoint(app: TestClient):
+    """
+    Test text stats endpoint.
+    """
+    response = app.get("/text/stats")
+    response_json = response.json()
+    assert response.status_code == 200
+    assert len(response_json["workers"]) == 1
+    assert "models" in response_json["workers"][0]
+    assert "memory_usage" in response_json["workers"][0]
+    assert "dropped_count" in response_json["publisher"]
+    assert "depth" in response_json["queue"]
+
+
+def test_generate_text_worker_given_failure_then_continue(mocker: MockerFixture):
+    """
+    Test that a failed request ends its stream with an error and the worker handles the next
+    request.
+    """
+    queue = GenerationQueue(max_depth=2, workers=1, timeout=60)
+    mocker.patch("proqa_ai.controllers.text.buffer", queue)
+    handle_request = mocker.patch("proqa_ai.controllers.text._handle_request",
+                                  side_effect=[RuntimeError("failed"), None])
+    end_stream = mocker.patch("proqa_ai.controllers.text._end_stream")
+    for message_id in ["failed-message", "next-message"]:
+        request = TextRequest(
+            prompt=constants.PROMPT,
+            model_settings=ModelSettings(model_name=constants.MODEL_NAME),
+            message_id=message_id,
+            streaming_settings=StreamingSettings(session_id=constants.SESSION_ID,
+                                                 channel=constants.CHANNEL)
+        )
+        queue.put(request, time.time(), key=message_id)
+    queue.close()
+
+    generate_text_worker(mocker.MagicMock())
+    assert handle_request.call_count == 2
+    assert end_stream.call_args.args[2] == "failed-message"
+    assert end_stream.call_args.kwargs["reason"] == "[ERROR]"
+    assert queue.stats()["active"] == 0
@@ -0,0 +1,39 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from proqa_ai.utilities.callback import GenerationCancelledError, StreamingCallbackHandler
+from tests import constants
+
+
+def test_on_llm_new_token_given_cancelled_then_raise(mocker: MockerFixture):
+    """
+    Test that a token of a cancelled answer aborts the generation instead of being published.
+    """
+    publisher = mocker.MagicMock()
+    cancelled = False
+    handler = StreamingCallbackHandler(constants.CHANNEL, constants.SESSION_ID,
+                                       constants.MESSAGE_ID, token_publisher=publisher,
+                                       is_cancelled=lambda: cancelled)
+    handler.on_llm_new_token("a")
+    cancelled = True
+
+    with pytest.raises(GenerationCancelledError):
+        handler.on_llm_new_token("b")
+    assert publisher.publish.call_count == 1
+
+
+def test_on_llm_abort_then_publish_reason_unmerged(mocker: MockerFixture):
+    """
+    Test that the reason of an aborted stream is published as a message of its own before
+    the end of the stream.
+    """
+    publisher = mocker.MagicMock()
+    handler = StreamingCallbackHandler(constants.CHANNEL, constants.SESSION_ID,
+                                       constants.MESSAGE_ID, token_publisher=publisher)
+    handler.on_llm_abort("[CANCELLED]")
+
+    reason_call, end_call = publisher.publish.call_args_list
+    assert reason_call.args[3] == "[CANCELLED]"
+    assert reason_call.kwargs == {"mergeable": False, "last": False}
+    assert end_call.args[3] == "[END]"
+    assert end_call.kwargs == {"mergeable": False, "last": True}
@@ -0,0 +1,52 @@
+import pytest
+
+from proqa_ai.utilities.embedding_batcher import EmbeddingBatcher
+from tests import constants
+
+
+def _generate(texts: list, passage: bool, model_name: str) -> list:
+    return [[len(text), passage] for text in texts]
+
+
+def test_submit_given_concurrent_requests_then_one_batch():
+    """
+    Test that requests arriving within the window are embedded in one batch.
+    """
+    batcher = EmbeddingBatcher(_generate, max_batch_size=8, window=0.5)
+    futures = [batcher.submit(text, True, constants.MODEL_NAME) for text in constants.TEXTS]
+    assert [future.result(timeout=5) for future in futures] == [
+        [len(text), True] for text in constants.TEXTS
+    ]
+    batcher.stop()
+
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == 1
+    assert stats["batch_size"]["sum"] == len(constants.TEXTS)
+    assert stats["queue_wait"]["count"] == len(constants.TEXTS)
+
+
+def test_submit_given_max_batch_size_then_split_batches():
+    """
+    Test that a batch is closed when it reaches the maximum size.
+    """
+    batcher = EmbeddingBatcher(_generate, max_batch_size=1, window=0.5)
+    futures = [batcher.submit(text, False, constants.MODEL_NAME) for text in constants.TEXTS]
+    for future in futures:
+        future.result(timeout=5)
+    batcher.stop()
+
+    assert batcher.stats()["batch_size"]["count"] == len(constants.TEXTS)
+
+
+def test_submit_given_generation_error_then_raise():
+    """
+    Test that a failing batch propagates the error to its callers.
+    """
+    def generate(texts: list, passage: bool, model_name: str) -> list:
+        raise ValueError("Invalid model name.")
+
+    batcher = EmbeddingBatcher(generate, max_batch_size=8, window=0.0)
+    future = batcher.submit(constants.TEXT, True, constants.MODEL_NAME)
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
+    batcher.stop()
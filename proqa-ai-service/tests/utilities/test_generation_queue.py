@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from proqa_ai.utilities.generation_queue import GenerationQueue, QueueFullError
+
+
+def test_get_given_priorities_then_order_by_priority_and_size():
+    """
+    Test that requests are ordered by priority class and by size within a class.
+    """
+    queue = GenerationQueue(max_depth=10, workers=1, timeout=900)
+    queue.put("batch", 0, priority=1, size=1)
+    queue.put("long", 0, priority=0, size=100)
+    queue.put("short", 0, priority=0, size=10)
+    queue.close()
+
+    assert [queue.get()[0] for _ in range(3)] == ["short", "long", "batch"]
+    assert queue.get() is None
+
+
+def test_put_given_full_queue_then_reject():
+    """
+    Test that requests are rejected with an estimated wait when the queue is full.
+    """
+    queue = GenerationQueue(max_depth=2, workers=2, timeout=900, initial_service_time=10)
+    queue.put("a", 0)
+    queue.put("b", 0)
+
+    with pytest.raises(QueueFullError) as exception:
+        queue.put("c", 0)
+    assert exception.value.estimated_wait == 10
+    assert queue.stats()["rejected_count"] == 1
+    assert queue.stats()["depth"] == 2
+
+
+def test_put_given_wait_over_timeout_then_reject():
+    """
+    Test that requests which would time out while queued are rejected, unless a higher
+    priority class lets them skip the queue.
+    """
+    queue = GenerationQueue(max_depth=10, workers=1, timeout=10, initial_service_time=10)
+    queue.put("a", 0, priority=1)
+    queue.observe_service_time(20)
+    assert queue.service_time == 12
+
+    with pytest.raises(QueueFullError):
+        queue.put("b", 0, priority=1)
+    queue.put("c", 0, priority=0)
+    assert queue.stats()["depth_per_priority"] == {"0": 1, "1": 1}
+
+
+def test_remove_given_queued_key_then_remove_request():
+    """
+    Test that a queued request is removed by its key and the order of the others is kept.
+    """
+    queue = GenerationQueue(max_depth=10, workers=1, timeout=900)
+    for size, key in enumerate(["a", "b", "c"]):
+        queue.put(key, 0, size=size, key=key)
+
+    assert queue.remove("b") == "b"
+    assert queue.remove("b") is None
+    assert [queue.get()[0] for _ in range(2)] == ["a", "c"]
+
+
+def test_cancel_given_active_key_then_cancelled_until_done():
+    """
+    Test that only requests being handled can be cancelled.
+    """
+    queue = GenerationQueue(max_depth=10, workers=1, timeout=900)
+    queue.put("a", 0, key="a")
+    assert not queue.cancel("a")
+
+    queue.get()
+    assert queue.cancel("a")
+    assert queue.is_cancelled("a")
+    queue.done("a")
+    assert not queue.is_cancelled("a")
+    assert not queue.cancel("a")
+
+
+def test_get_given_long_wait_then_promote_request():
+    """
+    Test that a request waiting longer than the aging interval goes before requests of its
+    class that arrived later, and after another interval before those of a higher class.
+    """
+    queue = GenerationQueue(max_depth=10, workers=1, timeout=900, aging_interval=0.1)
+    queue.put("long", 0, priority=1, size=100)
+    time.sleep(0.25)
+    queue.put("short", 0, priority=1, size=10)
+    queue.put("answer", 0, priority=0, size=10)
+
+    assert queue.get()[0] == "long"
+    assert queue.get()[0] == "answer"
+    assert queue.stats()["depth_per_priority"] == {"1": 1}
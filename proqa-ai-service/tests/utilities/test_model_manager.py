@@ -0,0 +1,191 @@
+from types import SimpleNamespace
+
+from pytest_mock import MockerFixture
+
+from proqa_ai.schemas.text import ModelSettings, StreamingSettings
+from proqa_ai.utilities.model_manager import ModelManager
+from proqa_ai.utilities.state_cache import StateCache
+from tests import constants
+
+
+class FakeLlama:
+    """
+    Stand-in for a llama.cpp client tokenizing by characters.
+    """
+
+    def __init__(self):
+        self.eval_tokens = []
+        self.eval_count = 0
+        self.load_count = 0
+
+    def tokenize(self, text: bytes) -> list:
+        return list(text)
+
+    def reset(self):
+        self.eval_tokens = []
+
+    def eval(self, tokens: list):
+        self.eval_tokens = self.eval_tokens + list(tokens)
+        self.eval_count += 1
+
+    def save_state(self) -> SimpleNamespace:
+        return SimpleNamespace(eval_tokens=list(self.eval_tokens),
+                               llama_state_size=len(self.eval_tokens))
+
+    def load_state(self, state: SimpleNamespace):
+        self.eval_tokens = list(state.eval_tokens)
+        self.load_count += 1
+
+
+def test_factory_given_sampling_change_then_no_reload(mocker: MockerFixture):
+    """
+    Test that changing sampling settings reuses the loaded model.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    model_manager = ModelManager()
+
+    model_manager._factory(ModelSettings(model_name=constants.MODEL_NAME, temperature=0.2))
+    llm = model_manager._factory(ModelSettings(model_name=constants.MODEL_NAME, temperature=0.8))
+
+    assert llama_cpp.call_count == 1
+    assert llm is llama_cpp.return_value.copy.return_value
+    assert llama_cpp.return_value.copy.call_args.kwargs["update"]["temperature"] == 0.8
+
+
+def test_factory_given_load_change_then_reload(mocker: MockerFixture):
+    """
+    Test that changing load-time settings loads the model again.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    model_manager = ModelManager()
+
+    model_manager._factory(ModelSettings(model_name=constants.MODEL_NAME, n_ctx=2048))
+    model_manager._factory(ModelSettings(model_name=constants.MODEL_NAME, n_ctx=4096))
+
+    assert llama_cpp.call_count == 2
+    assert len(model_manager.stats()["models"]) == 1
+
+
+def test_factory_given_budget_then_keep_several_models(mocker: MockerFixture):
+    """
+    Test that models within the budget stay resident and the least recently used is evicted.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    model_manager = ModelManager(memory_budget=2 * constants.MODEL_SIZE)
+
+    for model_name in ["a", "b", "a", "c"]:
+        model_manager._factory(ModelSettings(model_name=model_name))
+
+    stats = model_manager.stats()
+    assert llama_cpp.call_count == 3
+    assert stats["memory_usage"] == 2 * constants.MODEL_SIZE
+    assert stats["evict_count"] == 1
+
+
+def test_generate_text_given_prefix_then_restore_cached_state(mocker: MockerFixture):
+    """
+    Test that the prefix is evaluated once and its state is restored for later prompts.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    mocker.patch("proqa_ai.utilities.model_manager.StreamingCallbackHandler")
+    client = FakeLlama()
+    llama_cpp.return_value.copy.return_value.client = client
+    model_manager = ModelManager(prefix_cache=StateCache(constants.MODEL_SIZE))
+    model_settings = ModelSettings(model_name=constants.MODEL_NAME)
+    streaming_settings = StreamingSettings(channel=constants.CHANNEL,
+                                           session_id=constants.SESSION_ID)
+
+    prefix = "instruction\n\n"
+    model_manager.generate_text(prefix + "first", constants.MESSAGE_ID, model_settings,
+                                streaming_settings, prefix=prefix)
+    assert client.eval_count == 1
+
+    # Another prompt was evaluated since, so the prefix state is restored from the cache
+    client.eval_tokens = client.tokenize(b" other")
+    model_manager.generate_text(prefix + "second", constants.MESSAGE_ID, model_settings,
+                                streaming_settings, prefix=prefix)
+    assert client.eval_count == 1
+    assert client.load_count == 1
+    assert model_manager.stats()["prefix_cache"]["hit_count"] == 1
+
+
+def test_generate_text_given_session_then_restore_session_state(mocker: MockerFixture):
+    """
+    Test that a follow-up prompt of a session restores the state after the previous answer.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    mocker.patch("proqa_ai.utilities.model_manager.StreamingCallbackHandler")
+    client = FakeLlama()
+    llm = llama_cpp.return_value.copy.return_value
+    llm.client = client
+    llm.side_effect = lambda prompt, callbacks: client.eval(
+        client.tokenize(b" " + prompt.encode("utf-8") + b"answer")
+    )
+    model_manager = ModelManager(session_cache=StateCache(10 * constants.MODEL_SIZE))
+    model_settings = ModelSettings(model_name=constants.MODEL_NAME)
+    streaming_settings = StreamingSettings(channel=constants.CHANNEL,
+                                           session_id=constants.SESSION_ID)
+
+    model_manager.generate_text("first", constants.MESSAGE_ID, model_settings,
+                                streaming_settings)
+    assert client.load_count == 0
+
+    # Another session was handled since, so the state of this session is restored
+    client.eval_tokens = client.tokenize(b" other")
+    model_manager.generate_text("first answer second", constants.MESSAGE_ID, model_settings,
+                                streaming_settings)
+    assert client.load_count == 1
+    assert model_manager.stats()["session_cache"]["hit_count"] == 1
+
+
+def test_generate_text_given_no_stream_then_skip_session(mocker: MockerFixture):
+    """
+    Test that text that is not streamed does not publish tokens or replace the session state.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    handler = mocker.patch("proqa_ai.utilities.model_manager.StreamingCallbackHandler")
+    llm = llama_cpp.return_value.copy.return_value
+    llm.client = FakeLlama()
+    llm.return_value = "summary"
+    session_cache = StateCache(10 * constants.MODEL_SIZE)
+    model_manager = ModelManager(session_cache=session_cache)
+    model_settings = ModelSettings(model_name=constants.MODEL_NAME)
+    streaming_settings = StreamingSettings(channel=constants.CHANNEL,
+                                           session_id=constants.SESSION_ID)
+
+    generated_text = model_manager.generate_text("conversation", constants.MESSAGE_ID,
+                                                 model_settings, streaming_settings,
+                                                 stream=False)
+    assert generated_text == "summary"
+    llm.assert_called_once_with("conversation", callbacks=[])
+    handler.assert_not_called()
+    assert session_cache.stats()["states"] == 0
+
+
+def test_factory_given_stop_then_apply_to_model(mocker: MockerFixture):
+    """
+    Test that the maximum number of tokens and non-empty stop strings reach the model.
+    """
+    llama_cpp = mocker.patch("proqa_ai.utilities.model_manager.LlamaCpp")
+    mocker.patch("proqa_ai.utilities.model_manager.os.path.getsize",
+                 return_value=constants.MODEL_SIZE)
+    model_manager = ModelManager()
+
+    model_manager._factory(ModelSettings(model_name=constants.MODEL_NAME, max_tokens=64,
+                                         stop=["### Human:", ""]))
+
+    update = llama_cpp.return_value.copy.call_args.kwargs["update"]
+    assert update["max_tokens"] == 64
+    assert update["stop"] == ["### Human:"]
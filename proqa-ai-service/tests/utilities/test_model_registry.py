@@ -0,0 +1,46 @@
+from proqa_ai.utilities.model_registry import ModelRegistry, LoadedModel
+from tests import constants
+
+
+def _loader(model_name: str) -> LoadedModel:
+    return LoadedModel(model=model_name, size=constants.MODEL_SIZE)
+
+
+def test_get_given_resident_model_then_no_reload():
+    """
+    Test that a model is only loaded once.
+    """
+    registry = ModelRegistry()
+    first = registry.get(constants.MODEL_NAME, _loader)
+    second = registry.get(constants.MODEL_NAME, _loader)
+    assert first is second
+    assert registry.load_count == 1
+    assert registry.evict_count == 0
+
+
+def test_get_given_budget_exceeded_then_evict_least_recently_used():
+    """
+    Test that the least recently used model is evicted when over budget.
+    """
+    registry = ModelRegistry(memory_budget=2 * constants.MODEL_SIZE)
+    registry.get("a", _loader)
+    registry.get("b", _loader)
+    registry.get("a", _loader)
+    registry.get("c", _loader)
+
+    stats = registry.stats()
+    assert set(stats["models"]) == {"a", "c"}
+    assert stats["memory_usage"] == 2 * constants.MODEL_SIZE
+    assert stats["load_count"] == 3
+    assert stats["evict_count"] == 1
+
+
+def test_evict():
+    """
+    Test that evicting a model removes it from memory.
+    """
+    registry = ModelRegistry()
+    registry.get(constants.MODEL_NAME, _loader)
+    assert registry.evict(constants.MODEL_NAME)
+    assert not registry.evict(constants.MODEL_NAME)
+    assert registry.stats()["models"] == {}
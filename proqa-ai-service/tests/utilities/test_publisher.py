@@ -0,0 +1,73 @@
+import json
+
+import requests
+from pytest_mock import MockerFixture
+
+from proqa_ai.utilities.publisher import PushpinPublisher
+from tests import constants
+
+
+def _publisher() -> PushpinPublisher:
+    return PushpinPublisher("http://pushpin/publish", window=1, max_tokens=4, connections=1,
+                            queue_size=100, timeout=1)
+
+
+def _published_items(post) -> list:
+    return [json.loads(call.kwargs["data"])["items"] for call in post.call_args_list]
+
+
+def test_publish_given_tokens_then_merge_into_one_publish(mocker: MockerFixture):
+    """
+    Test that consecutive tokens are merged into one item and control tokens are kept apart.
+    """
+    publisher = _publisher()
+    post = mocker.patch.object(publisher._session, "post")
+    for token, mergeable in [("[START]", False), ("Hello", True), (" world", True)]:
+        publisher.publish(constants.CHANNEL, constants.SESSION_ID, constants.MESSAGE_ID, token,
+                          mergeable=mergeable)
+    publisher.stop()
+
+    items = _published_items(post)
+    assert len(items) == 1
+    assert [item["id"] for item in items[0]] == [f"{constants.MESSAGE_ID}-0",
+                                                 f"{constants.MESSAGE_ID}-1"]
+    assert items[0][1]["prev_id"] == f"{constants.MESSAGE_ID}-0"
+    assert "Hello%20world" in items[0][1]["formats"]["http-stream"]["content"]
+    assert publisher.stats()["merged_count"] == 1
+
+
+def test_publish_given_max_tokens_then_chain_across_publishes(mocker: MockerFixture):
+    """
+    Test that a publish is closed at the maximum number of tokens and the next continues the
+    id chain.
+    """
+    publisher = _publisher()
+    post = mocker.patch.object(publisher._session, "post")
+    for token in ["[START]", "a", "b", "c", "d", "[END]"]:
+        publisher.publish(constants.CHANNEL, constants.SESSION_ID, constants.MESSAGE_ID, token,
+                          mergeable=token not in ("[START]", "[END]"), last=token == "[END]")
+    publisher.stop()
+
+    items = _published_items(post)
+    assert len(items) == 2
+    assert items[1][0]["id"] == f"{constants.MESSAGE_ID}-2"
+    assert items[1][0]["prev_id"] == f"{constants.MESSAGE_ID}-1"
+    assert publisher.stats()["published_count"] == 6
+
+
+def test_publish_given_failure_then_count_dropped(mocker: MockerFixture):
+    """
+    Test that tokens of a failed publish are counted as dropped and the id chain continues
+    from the last published item.
+    """
+    publisher = _publisher()
+    post = mocker.patch.object(publisher._session, "post",
+                               side_effect=[requests.ConnectionError(), mocker.MagicMock()])
+    publisher.publish(constants.CHANNEL, constants.SESSION_ID, constants.MESSAGE_ID, "a")
+    publisher.stop()
+    publisher.publish(constants.CHANNEL, constants.SESSION_ID, constants.MESSAGE_ID, "b")
+    publisher.stop()
+
+    items = _published_items(post)
+    assert items[1][0]["id"] == f"{constants.MESSAGE_ID}-0"
+    assert publisher.stats()["dropped_count"] == 1
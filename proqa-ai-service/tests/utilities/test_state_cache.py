@@ -0,0 +1,167 @@
+import ctypes
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+from pytest_mock import MockerFixture
+
+from proqa_ai.utilities.state_cache import StateCache
+from tests import constants
+
+
+def _state() -> SimpleNamespace:
+    return SimpleNamespace(llama_state_size=constants.MODEL_SIZE)
+
+
+def test_get_given_missing_key_then_none():
+    """
+    Test that a missing state is counted as a miss.
+    """
+    cache = StateCache(constants.MODEL_SIZE)
+    assert cache.get(constants.PROMPT) is None
+    assert cache.stats()["miss_count"] == 1
+
+
+def test_put_given_capacity_exceeded_then_evict_least_recently_used():
+    """
+    Test that the least recently used state is evicted when over capacity.
+    """
+    cache = StateCache(2 * constants.MODEL_SIZE)
+    cache.put("a", _state())
+    cache.put("b", _state())
+    cache.get("a")
+    cache.put("c", _state())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["size"] == 2 * constants.MODEL_SIZE
+
+
+def test_remove_if():
+    """
+    Test that states matching the predicate are removed.
+    """
+    cache = StateCache(2 * constants.MODEL_SIZE)
+    cache.put(("model", "a"), _state())
+    cache.put(("other", "a"), _state())
+    cache.remove_if(lambda key: key[0] == "model")
+
+    assert cache.get(("model", "a")) is None
+    assert cache.get(("other", "a")) is not None
+
+
+def test_get_given_ttl_elapsed_then_none(mocker: MockerFixture):
+    """
+    Test that states older than the time to live are dropped.
+    """
+    monotonic = mocker.patch("proqa_ai.utilities.state_cache.time.monotonic", return_value=0)
+    cache = StateCache(constants.MODEL_SIZE, ttl=10)
+    cache.put("a", _state())
+
+    monotonic.return_value = 11
+    assert cache.get("a") is None
+    assert cache.stats()["states"] == 0
+
+
+def test_get_given_spilled_state_then_load_from_disk(tmp_path):
+    """
+    Test that evicted states are spilled to disk and loaded back on access.
+    """
+    cache = StateCache(constants.MODEL_SIZE, spill_path=str(tmp_path))
+    cache.put("a", _state())
+    cache.put("b", _state())
+    assert cache.stats()["spilled_states"] == 1
+
+    state = cache.get("a")
+    assert state.llama_state_size == constants.MODEL_SIZE
+    # Loading "a" back into memory spilled "b" in its place
+    stats = cache.stats()
+    assert stats["spilled_states"] == 1
+    assert stats["spill_count"] == 2
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_put_given_spill_capacity_exceeded_then_drop_oldest(tmp_path):
+    """
+    Test that the least recently spilled states are dropped when over the disk capacity.
+    """
+    cache = StateCache(constants.MODEL_SIZE, spill_path=str(tmp_path),
+                       spill_capacity_bytes=constants.MODEL_SIZE)
+    for key in ["a", "b", "c"]:
+        cache.put(key, _state())
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+
+def _llama_state() -> SimpleNamespace:
+    # llama.cpp state data is a ctypes array of a type created at runtime
+    data = (ctypes.c_uint8 * 4)(1, 2, 3, 4)
+    return SimpleNamespace(eval_tokens=[1, 2], llama_state=data, llama_state_size=4)
+
+
+def test_get_given_spilled_ctypes_state_then_rebuild_state_data(tmp_path):
+    """
+    Test that states with ctypes state data are spilled and rebuilt.
+    """
+    cache = StateCache(4, spill_path=str(tmp_path))
+    cache.put("a", _llama_state())
+    cache.put("b", _llama_state())
+
+    state = cache.get("a")
+    assert state.eval_tokens == [1, 2]
+    assert isinstance(state.llama_state, ctypes.Array)
+    assert bytes(state.llama_state) == bytes([1, 2, 3, 4])
+
+
+def test_get_given_spilled_llama_state_then_load_from_disk(tmp_path):
+    """
+    Test that a real llama.cpp state is spilled and loaded back.
+    """
+    llama_cpp = pytest.importorskip("llama_cpp")
+    np = pytest.importorskip("numpy")
+    original = llama_cpp.LlamaState(
+        eval_tokens=deque([1, 2]),
+        eval_logits=deque([[0.5]]),
+        input_ids=np.array([1, 2], dtype=np.intc),
+        scores=np.zeros((2, 1), dtype=np.single),
+        llama_state=(llama_cpp.c_uint8 * 4)(1, 2, 3, 4),
+        llama_state_size=4
+    )
+    cache = StateCache(4, spill_path=str(tmp_path))
+    cache.put("a", original)
+    cache.put("b", _llama_state())
+
+    state = cache.get("a")
+    assert isinstance(state, llama_cpp.LlamaState)
+    assert list(state.eval_tokens) == [1, 2]
+    assert bytes(state.llama_state) == bytes([1, 2, 3, 4])
+    assert state.llama_state_size == 4
+
+
+def test_put_given_unpicklable_state_then_drop_without_file(tmp_path):
+    """
+    Test that a state that cannot be spilled is dropped and leaves no file behind.
+    """
+    cache = StateCache(constants.MODEL_SIZE, spill_path=str(tmp_path))
+    cache.put("a", SimpleNamespace(callback=lambda: None, llama_state_size=constants.MODEL_SIZE))
+    cache.put("b", _state())
+
+    assert cache.get("a") is None
+    assert cache.stats()["spilled_states"] == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_init_given_spilled_states_of_earlier_process_then_remove(tmp_path):
+    """
+    Test that states spilled by an earlier process are removed on startup.
+    """
+    stale = tmp_path / ("0" * 64)
+    stale.write_bytes(b"state")
+    other = tmp_path / "other"
+    other.write_bytes(b"other")
+
+    StateCache(constants.MODEL_SIZE, spill_path=str(tmp_path))
+    assert not stale.exists()
+    assert other.exists()
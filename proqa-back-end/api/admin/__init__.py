@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import ModelAdmin
 
-from api.admin.chat import QuestionAdmin, AnswerAdmin, SessionAdmin
+from api.admin.chat import QuestionAdmin, AnswerAdmin, SessionAdmin, CachedAnswerAdmin
 from api.admin.collection import CollectionAdmin, SourceAdmin, ChunkAdmin
 from api.admin.model import PromptTemplateAdmin, LLMAdmin
 from api.models import (
@@ -13,13 +13,15 @@ from api.models import (
     Chunk,
     PromptTemplate,
     LLM,
-    FAQEntry
+    FAQEntry,
+    CachedAnswer
 )
 
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(Answer, AnswerAdmin)
 admin.site.register(ChatSession, SessionAdmin)
 admin.site.register(FAQEntry, ModelAdmin)
+admin.site.register(CachedAnswer, CachedAnswerAdmin)
 
 admin.site.register(Collection, CollectionAdmin)
 admin.site.register(Source, SourceAdmin)
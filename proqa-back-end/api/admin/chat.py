@@ -13,15 +13,24 @@ class QAInline(TabularInline):
 
 class SessionAdmin(ModelAdmin):
     """Model admin for chat session model."""
-    readonly_fields = ["title", "author", "hidden", "upvotes", "downvotes"]
+    readonly_fields = ["title", "author", "hidden", "upvotes", "downvotes", "query_embedding",
+                       "query_weight"]
     inlines = [QAInline]
 
 
 class AnswerAdmin(ModelAdmin):
     """Model admin for answer model."""
-    readonly_fields = ["question", "session", "context", "model", "template", "content", "rating"]
+    readonly_fields = ["question", "session", "context", "model", "template", "content", "rating",
+                       "token_size", "chunks"]
 
 
 class QuestionAdmin(ModelAdmin):
     """Model admin for question model."""
-    readonly_fields = ["summary", "session", "content"]
+    readonly_fields = ["summary", "session", "content", "embedding", "token_size"]
+
+
+class CachedAnswerAdmin(ModelAdmin):
+    """Model admin for cached answer model."""
+    list_display = ["question", "model", "template", "hits", "last_used_at"]
+    readonly_fields = ["question", "embedding", "content", "answer", "model", "template", "chunks",
+                       "context_key", "hits", "last_used_at"]
@@ -17,6 +17,7 @@ class CollectionAdmin(ModelAdmin):
     """Model admin for collection model."""
     inlines = [SourceInline]
     readonly_fields = ["sources_last_updated_at", "updating"]
+    exclude = ["centroids"]
     actions = ["update_sources"]
     list_display = ["name", "active", "updating"]
 
@@ -45,7 +46,7 @@ class ChunkAdmin(ModelAdmin):
     """
     Model admin for chunk model.
     """
-    readonly_fields = ["times_referenced"]
+    readonly_fields = ["times_referenced", "token_size"]
 
 
 class SourceAdmin(ModelAdmin):
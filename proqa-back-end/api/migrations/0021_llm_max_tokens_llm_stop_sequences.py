@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2023-07-20 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_alter_faqentry_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='llm',
+            name='max_tokens',
+            field=models.PositiveIntegerField(default=256, help_text='Maximum number of tokens in an answer.'),
+        ),
+        migrations.AddField(
+            model_name='llm',
+            name='stop_sequences',
+            field=models.TextField(blank=True, default='', help_text='Strings, one per line, that end an answer in addition to the turn markers of the active prompt template.'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.2 on 2023-07-20 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_llm_max_tokens_llm_stop_sequences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('embedding', models.JSONField()),
+                ('content', models.TextField(null=True)),
+                ('context_key', models.CharField(db_index=True, max_length=64)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+                ('answer', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.answer')),
+                ('chunks', models.ManyToManyField(to='api.chunk')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.llm')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.prompttemplate')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2023-07-21 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_cachedanswer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='query_embedding',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='query_weight',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='embedding',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2023-07-21 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_question_embedding_chatsession_query_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='token_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='token_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='token_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
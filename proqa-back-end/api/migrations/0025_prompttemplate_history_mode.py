@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2023-07-24 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_answer_token_size_chunk_token_size_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='history_mode',
+            field=models.CharField(choices=[('full', 'Past turns with their contexts'), ('distinct', 'Past turns with only the contexts not used by a later turn'), ('none', 'Past turns without contexts')], default='full', max_length=16),
+        ),
+    ]
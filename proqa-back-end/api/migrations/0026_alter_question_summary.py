@@ -0,0 +1,27 @@
+# Generated by Django 4.2.2 on 2023-07-25 11:48
+
+from django.db import migrations, models
+
+
+def clear_placeholder_summaries(apps, schema_editor):
+    """
+    Questions used to be saved with the placeholder summary "summary".
+    """
+    Question = apps.get_model('api', 'Question')
+    Question.objects.filter(summary="summary").update(summary=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_prompttemplate_history_mode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(clear_placeholder_summaries, migrations.RunPython.noop),
+    ]
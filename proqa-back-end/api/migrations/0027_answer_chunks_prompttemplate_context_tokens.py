@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2023-07-26 15:21
+
+from django.db import migrations, models
+
+
+def add_context_to_chunks(apps, schema_editor):
+    """
+    Answers used to have only their best matching chunk as context.
+    """
+    Answer = apps.get_model('api', 'Answer')
+    for answer in Answer.objects.filter(context__isnull=False):
+        answer.chunks.add(answer.context_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_alter_question_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='chunks',
+            field=models.ManyToManyField(blank=True, related_name='referencing_answers', to='api.chunk'),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='context_tokens',
+            field=models.PositiveIntegerField(default=512),
+        ),
+        migrations.RunPython(add_context_to_chunks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2023-07-27 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_answer_chunks_prompttemplate_context_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='centroids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2023-07-27 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_collection_centroids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='chunks_in_payload',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from api.models.chat import Question, Answer, ChatSession, FAQEntry
-from api.models.choices import SUPPORTED_FILETYPES, SupportedFiletypes
+from api.models.chat import Question, Answer, ChatSession, FAQEntry, CachedAnswer
+from api.models.choices import SUPPORTED_FILETYPES, SupportedFiletypes, HISTORY_MODES, \
+    HistoryModes
 from api.models.collection import Collection, Source, Chunk
 from api.models.model import LLM, PromptTemplate
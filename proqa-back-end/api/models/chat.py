@@ -19,6 +19,9 @@ class ChatSession(Rateable):
     hidden = models.BooleanField(default=False)
     pinned = models.BooleanField(default=False)
     color = models.CharField(max_length=16, default="rgb(1,103,177)")
+    # Decay-weighted average of the question embeddings and the sum of the weights
+    query_embedding = models.JSONField(null=True, blank=True)
+    query_weight = models.FloatField(default=0.0)
 
     def get_upvotes(self):
         """
@@ -45,9 +48,12 @@ class Question(models.Model):
     """
     question_id = models.UUIDField(
         default=uuid.uuid4, editable=False, unique=True)
-    summary = models.CharField(max_length=255, null=True, blank=True)
+    # Summary of the conversation of the session up to and including this question
+    summary = models.TextField(null=True, blank=True)
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE)
     content = models.TextField()
+    embedding = models.JSONField(null=True, blank=True)
+    token_size = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -61,11 +67,15 @@ class Answer(models.Model):
         default=uuid.uuid4, editable=False, unique=True)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE)
+    # Best matching chunk, shown as the source of the answer
     context = models.ForeignKey(Chunk, on_delete=models.SET_NULL, null=True)
+    # All chunks in the context of the prompt, including the best matching one
+    chunks = models.ManyToManyField(Chunk, related_name="referencing_answers", blank=True)
     model = models.ForeignKey(LLM, on_delete=models.SET_NULL, null=True)
     template = models.ForeignKey(
         PromptTemplate, on_delete=models.DO_NOTHING, null=True)
     content = models.TextField(null=True)
+    token_size = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     rating = models.IntegerField(default=0)
     is_flagged = models.BooleanField(default=False)
@@ -90,3 +100,23 @@ class FAQEntry(models.Model):
 
     class Meta:
         verbose_name_plural = "FAQ Entries"
+
+class CachedAnswer(models.Model):
+    """
+    Answer to a first question of a chat session, reused for similar questions asked with
+    the same model, prompt template and context.
+    """
+    question = models.TextField()
+    embedding = models.JSONField()
+    content = models.TextField(null=True)
+    answer = models.OneToOneField(Answer, on_delete=models.SET_NULL, null=True, blank=True)
+    model = models.ForeignKey(LLM, on_delete=models.CASCADE)
+    template = models.ForeignKey(PromptTemplate, on_delete=models.CASCADE)
+    chunks = models.ManyToManyField(Chunk)
+    context_key = models.CharField(max_length=64, db_index=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cached answer to {self.question}"
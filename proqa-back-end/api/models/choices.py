@@ -1,4 +1,9 @@
 SUPPORTED_FILETYPES = [("pdf", "PDF file"), ("docx", "Word file")]
+HISTORY_MODES = [
+    ("full", "Past turns with their contexts"),
+    ("distinct", "Past turns with only the contexts not used by a later turn"),
+    ("none", "Past turns without contexts"),
+]
 
 
 # pylint: disable-next=too-few-public-methods
@@ -9,3 +14,13 @@ class SupportedFiletypes:
     ALL = ['pdf', 'docx']
     PDF_EXTENSION = 'pdf'
     DOCX_EXTENSION = 'docx'
+
+
+# pylint: disable-next=too-few-public-methods
+class HistoryModes:
+    """
+    Class containing the ways past turns are included in a prompt
+    """
+    FULL = 'full'
+    DISTINCT_CONTEXTS = 'distinct'
+    NO_CONTEXTS = 'none'
@@ -18,6 +18,11 @@ class Collection(models.Model):
     chunk_size = models.PositiveIntegerField(default=1000)
     chunk_overlap = models.PositiveIntegerField(default=500)
     sources_last_updated_at = models.DateTimeField(null=True)
+    # k-means centroids of the chunk embeddings, to route questions to relevant collections
+    centroids = models.JSONField(null=True, blank=True)
+    # Store the chunks in the vector DB as well, so questions are answered from the search
+    # results without reading the chunks from the DB. Takes effect when sources are updated.
+    chunks_in_payload = models.BooleanField(default=False)
 
     def clean(self):
         if self.chunk_overlap >= self.chunk_size:
@@ -58,19 +63,20 @@ class Chunk(Rateable):
     chunk_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     source = models.ForeignKey(Source, on_delete=models.SET_NULL, null=True)
     content = models.TextField()
+    token_size = models.PositiveIntegerField(null=True, blank=True)
     times_referenced = models.IntegerField(default=0)
 
+    def get_answers(self):
+        """Get all answers using this chunk, as their best match or as additional context."""
+        return (self.answer_set.all() | self.referencing_answers.all()).distinct()
+
     def get_upvotes(self):
         """Get total number of upvotes from all answers using this chunk."""
-        if self.answer_set.exists():
-            return self.answer_set.filter(rating=1).count()
-        return 0
+        return self.get_answers().filter(rating=1).count()
 
     def get_downvotes(self):
         """Get total number of downvotes from all answers using this chunk."""
-        if self.answer_set.exists():
-            return self.answer_set.filter(rating=-1).count()
-        return 0
+        return self.get_answers().filter(rating=-1).count()
 
     def __str__(self):
         return f'{self.source}:{self.chunk_id}'
@@ -1,5 +1,7 @@
+from string import Formatter
 from django.db import models
 from django.core.exceptions import ValidationError
+from api.models.choices import HISTORY_MODES, HistoryModes
 
 class PromptTemplate(models.Model):
     """
@@ -11,6 +13,11 @@ class PromptTemplate(models.Model):
     question_format = models.TextField()
     answer_format = models.TextField()
     separator = models.CharField(max_length=16, default="", blank=True)
+    # How the contexts of past turns are included, only the current turn always has its context
+    history_mode = models.CharField(max_length=16, choices=HISTORY_MODES,
+                                    default=HistoryModes.FULL)
+    # Maximum number of tokens of the retrieved chunks, the best matching chunk is always used
+    context_tokens = models.PositiveIntegerField(default=512)
 
     def clean(self):
         """
@@ -26,6 +33,23 @@ class PromptTemplate(models.Model):
             raise ValidationError(r"Prompt template must contain a slot for the answer in the \
                                     form {answer}.")
 
+    def get_stop_sequences(self) -> list:
+        """
+        Gets the strings that mark the end of an answer: the text that starts a question turn
+        and the separator after answers.
+
+            Returns:
+                list: Stop sequences
+        """
+        stop_sequences = []
+        # The literal text before the first slot of the question format starts a new turn
+        turn_marker = next(Formatter().parse(self.question_format.strip()), ("",))[0].strip()
+        if turn_marker:
+            stop_sequences.append(turn_marker)
+        if self.separator.strip():
+            stop_sequences.append(self.separator.strip())
+        return stop_sequences
+
     class Meta:
         """
         Meta class for prompt template.
@@ -51,11 +75,27 @@ class LLM(models.Model):
     temperature = models.FloatField(default=0.8)
     gpu_layers = models.PositiveIntegerField(default=0)
     batch_size = models.PositiveIntegerField(default=1024)
+    max_tokens = models.PositiveIntegerField(default=256,
+                                             help_text="Maximum number of tokens in an answer.")
+    stop_sequences = models.TextField(
+        blank=True, default="",
+        help_text="Strings, one per line, that end an answer in addition to the turn markers of "
+                  "the active prompt template."
+    )
     active = models.BooleanField(default=False)
 
     def __str__(self):
         return f'{self.name}'
 
+    def get_stop_sequences(self) -> list:
+        """
+        Gets the stop sequences configured for this model.
+
+            Returns:
+                list: Stop sequences
+        """
+        return [line.strip() for line in self.stop_sequences.splitlines() if line.strip()]
+
     class Meta:
         """
         Meta class for large language model
@@ -1,6 +1,10 @@
+import uuid
 from celery import shared_task
 from api.models import Collection
+from api.utils.aiservice_text import TextGenerationBusyError
 from api.utils.context import reset_collection, toggle_collection
+from api.utils.references import flush_references
+from api.utils.summary import request_summary
 from api.utils.vectordb import VECTORDB_CLIENT
 
 @shared_task()
@@ -23,3 +27,23 @@ def update_collection(collection: str):
     coll = Collection.objects.get(name=collection)
     reset_collection(client=VECTORDB_CLIENT, collection_name=collection)
     toggle_collection(coll, False)
+
+@shared_task(bind=True, max_retries=3)
+def summarize_question(self, question_id: str):
+    """Summarise the conversation of a session up to an answered question using celery.
+    Retried later if the AI service is busy.
+
+        Args:
+            question_id (str): ID of the answered question.
+    """
+    try:
+        request_summary(uuid.UUID(question_id))
+    except TextGenerationBusyError as exception:
+        raise self.retry(exc=exception, countdown=int(exception.retry_after or 60))
+
+@shared_task()
+def flush_chunk_references():
+    """Apply the chunk references buffered in Redis to the DB using celery.
+    Scheduled periodically by celery beat.
+    """
+    flush_references()
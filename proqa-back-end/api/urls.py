@@ -4,6 +4,9 @@ from api import views
 urlpatterns = [
     path('question/', views.question),
     path('answer/', views.answer),
+    path('answer/cancellation/', views.cancellation),
+    path('answer/cache/', views.answer_cache_stats),
+    path('summary/', views.summary),
     path('sources/', views.sources),
     path('chat/creation/', views.creation),
     path('chat/deletion/', views.deletion),
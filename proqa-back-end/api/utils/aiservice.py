@@ -2,9 +2,9 @@
 Functions for making API calls to the AI service
 """
 from abc import ABC, abstractmethod
-from collections import deque
+import numpy as np
 from requests import Response
-from api.models import PromptTemplate
+from api.models import PromptTemplate, HistoryModes
 
 class AIServiceAdapter(ABC):
     """
@@ -34,6 +34,53 @@ class AIServiceAdapter(ABC):
         Abstract controler to make a request and return Python objects
         """
 
+# Estimate of the beginning of sequence token and the newlines between the parts of the prompt
+PROMPT_OVERHEAD_TOKENS = 7
+SUMMARY_FORMAT = "Summary of the conversation so far: {summary}"
+
+
+class TokenBudget:
+    """
+    Counts tokens for a prompt and the number of tokens the prompt may have.
+    """
+
+    def __init__(self, tokenizer: callable, max_tokens: int = 2048,
+                 batch_tokenizer: callable = None, answer_tokens: int = 0):
+        """
+        Args:
+            tokenizer (callable): Tokenizer that accepts str and returns the number of tokens
+            max_tokens (int): Size of the context window of the model
+            batch_tokenizer (callable): Optional tokenizer that accepts a list of str and returns
+            the number of tokens of each
+            answer_tokens (int): Number of tokens reserved in the context window for the answer
+        """
+        self.tokenizer = tokenizer
+        self.batch_tokenizer = batch_tokenizer
+        self.max_tokens = max_tokens
+        self.answer_tokens = answer_tokens
+
+    @property
+    def prompt_tokens(self) -> int:
+        """
+        Returns:
+            int: Maximum number of tokens of the prompt
+        """
+        return self.max_tokens - self.answer_tokens
+
+    def count(self, texts: list) -> list:
+        """
+        Counts the tokens of each text, in a single call if a batch tokenizer is available.
+
+            Args:
+                texts (list): Texts to count tokens of
+            Returns:
+                list: Number of tokens of each text
+        """
+        if self.batch_tokenizer is not None:
+            return self.batch_tokenizer(texts)
+        return [self.tokenizer(text) for text in texts]
+
+
 class PromptBuilder:
     """
     Builds prompts for the AI service.
@@ -41,7 +88,7 @@ class PromptBuilder:
 
     def __init__(
             self, prompt_template: PromptTemplate, tokenizer: callable,
-            max_tokens: int = 2048
+            max_tokens: int = 2048, batch_tokenizer: callable = None, answer_tokens: int = 0
     ):
         """
         Args:
@@ -49,18 +96,25 @@ class PromptBuilder:
             tokenizer (callable): Tokenizer for instruction that accepts str and returns list of 
             tokens.
             max_tokens (int): Maximum number of tokens in prompt.
+            batch_tokenizer (callable): Optional tokenizer that accepts a list of str and returns
+            the number of tokens of each, used to count all parts of the prompt in one call.
+            answer_tokens (int): Number of tokens reserved in the context window for the answer.
         """
         self.instruction = prompt_template.instruction.strip()
         self.question_format = prompt_template.question_format.strip()
         self.answer_format = prompt_template.answer_format.strip()
         self.separator = prompt_template.separator
+        self.history_mode = prompt_template.history_mode
 
-        self.tokenizer = tokenizer
-        self.max_tokens = max_tokens
+        self.budget = TokenBudget(tokenizer, max_tokens, batch_tokenizer, answer_tokens)
+        # Messages left out of the last built prompt because they did not fit
+        self.dropped_messages = []
 
     def get_prompt(self, messages: list, question: str, context: str) -> str:
         """
-        Fills prompt template in conversational format.
+        Fills prompt template in conversational format. The newest messages that fit in the
+        context window, after reserving room for the answer, are used as history, preceded by
+        the latest summary of the messages left out.
 
             Args:
                 messages (list): List of messages in the chat session as returned by
@@ -70,28 +124,176 @@ class PromptBuilder:
             Returns:
                 str: Prompt for AI service
         """
-        messages = self._parse_messages(messages)
+        messages = self._compact_messages(messages, context)
+        token_sizes = [self._get_token_size(message) for message in messages]
         question = self._get_question(question, context)
         answer = self._get_answer("", False)
 
-        num_tokens = self.tokenizer(
-            self.instruction) + self.tokenizer(answer) + self.tokenizer(question)
+        # Only messages without stored token counts are tokenized, together with the
+        # formats of an empty question and answer whose tokens are added to the stored counts
+        uncounted = [self._parse_message(message)
+                     for message, token_size in zip(messages, token_sizes) if token_size is None]
+        token_counts = self.budget.count(
+            [self.instruction, answer, question, self._get_question("", ""), self._get_answer("")]
+            + uncounted
+        )
+        message_token_counts = self._get_message_token_counts(
+            messages, token_sizes, token_counts[3], token_counts[4], token_counts[5:]
+        )
 
-        # try to use only 90% of the context window in case of precision errors
-        upperbound = self.max_tokens * 0.9
-        history = deque()
-        for message in reversed(messages):
-            token_count = self.tokenizer(message)
-            if num_tokens + token_count > upperbound:
-                break
-            history.appendleft(message)
-            num_tokens += token_count
-        history = "\n".join(history)
+        # Parts are counted separately, so the history budget is an estimate
+        history_budget = self.budget.prompt_tokens - sum(token_counts[:3]) \
+            - PROMPT_OVERHEAD_TOKENS
+        history_size = self._get_history_size(message_token_counts, history_budget)
+
+        # The latest summary of the dropped turns takes their place
+        summary = self._get_summary(messages[:len(messages) - history_size])
+        if summary is not None:
+            summary_tokens = self.budget.count([summary])[0] + 1
+            history_size = self._get_history_size(message_token_counts,
+                                                  history_budget - summary_tokens)
+        prompt = self._assemble_prompt(messages, history_size, question, answer)
 
-        prompt = f"\n{self.instruction}\n\n{history}\n{question}\n{answer}\n"
+        # Tokens can merge or split where the parts are joined, so the whole prompt is counted
+        # and the oldest turns are dropped until it fits
+        while history_size > 0 and \
+                self.budget.count([prompt])[0] > self.budget.prompt_tokens:
+            history_size -= 1
+            prompt = self._assemble_prompt(messages, history_size, question, answer)
+        self.dropped_messages = messages[:len(messages) - history_size]
 
         return prompt
 
+    def _assemble_prompt(self, messages: list, history_size: int, question: str,
+                         answer: str) -> str:
+        """
+        Assembles the prompt from the newest messages, preceded by the latest summary of the
+        messages left out.
+
+            Args:
+                messages (list): Messages as returned by `get_raw_messages()` in `chat_session.py`
+                history_size (int): Number of newest messages to use as history
+                question (str): Formatted question
+                answer (str): Formatted empty answer
+            Returns:
+                str: Prompt for AI service
+        """
+        history = self._parse_messages(messages[len(messages) - history_size:])
+        summary = self._get_summary(messages[:len(messages) - history_size])
+        if summary is not None:
+            history = [summary] + history
+        history = "\n".join(history)
+        return f"{self.get_prefix()}{history}\n{question}\n{answer}\n"
+
+    def get_prefix(self) -> str:
+        """
+        Gets the start of the prompt that is the same for every prompt of the template,
+        which allows the AI service to reuse its evaluation.
+
+            Returns:
+                str: Prompt prefix
+        """
+        return f"\n{self.instruction}\n\n"
+
+    def _get_history_size(self, token_counts: list, budget: int) -> int:
+        """
+        Finds the number of newest messages that fit in the budget.
+
+            Args:
+                token_counts (list): Number of tokens of each formatted message
+                budget (int): Number of tokens available for the messages
+            Returns:
+                int: Number of newest messages that fit
+        """
+        # Tokens of the newest messages first, each followed by a newline
+        cumulative_counts = np.cumsum(np.array(token_counts[::-1]) + 1)
+        return int(np.searchsorted(cumulative_counts, budget, side='right'))
+
+    def _get_summary(self, dropped_messages: list) -> str:
+        """
+        Gets the latest summary of the conversation among the messages left out of the prompt.
+
+            Args:
+                dropped_messages (list): Messages that do not fit in the prompt
+            Returns:
+                str: Formatted summary, None if the messages have no summary
+        """
+        for message in reversed(dropped_messages):
+            if not message['is_answer'] and message.get('summary'):
+                return SUMMARY_FORMAT.format(summary=message['summary'])
+        return None
+
+    def _compact_messages(self, messages: list, context: str) -> list:
+        """
+        Removes the contexts of past questions according to the history mode of the template.
+        In the distinct mode a context is only kept for the latest question using it, and not
+        at all if the current question uses it.
+
+            Args:
+                messages (list): List of messages in the chat session as returned by
+                                 `get_raw_messages()` in `chat_session.py`
+                context (str): Context of the current question
+            Returns:
+                list: Messages with the removed contexts empty
+        """
+        if self.history_mode == HistoryModes.FULL:
+            return messages
+
+        seen_contexts = {context}
+        compacted_messages = []
+        for message in reversed(messages):
+            if not message['is_answer']:
+                if self.history_mode == HistoryModes.NO_CONTEXTS or \
+                        message['context'] is None or message['context'] in seen_contexts:
+                    message = dict(message, context="", context_token_size=0)
+                else:
+                    seen_contexts.add(message['context'])
+            compacted_messages.append(message)
+        return compacted_messages[::-1]
+
+    def _get_token_size(self, message: dict) -> int:
+        """
+        Gets the stored number of tokens of the contents of a message.
+
+            Args:
+                message (dict): Message as returned by `get_raw_messages()` in `chat_session.py`
+            Returns:
+                int: Number of tokens of the answer or of the question and its context, None if
+                not stored
+        """
+        if message['is_answer']:
+            return message.get('token_size')
+        if message.get('token_size') is None or message.get('context_token_size') is None:
+            return None
+        return message['token_size'] + message['context_token_size']
+
+    def _get_message_token_counts(self, messages: list, token_sizes: list,
+                                  question_format_size: int, answer_format_size: int,
+                                  uncounted_sizes: list) -> list:
+        """
+        Combines the stored token counts of the message contents with the token counts of
+        the formats, and the token counts of the messages that had to be tokenized.
+
+            Args:
+                messages (list): Messages as returned by `get_raw_messages()` in `chat_session.py`
+                token_sizes (list): Stored number of tokens of each message, None if not stored
+                question_format_size (int): Number of tokens of the format of an empty question
+                answer_format_size (int): Number of tokens of the format of an empty answer
+                uncounted_sizes (list): Number of tokens of the messages without stored counts
+            Returns:
+                list: Number of tokens of each formatted message
+        """
+        uncounted_sizes = iter(uncounted_sizes)
+        token_counts = []
+        for message, token_size in zip(messages, token_sizes):
+            if token_size is None:
+                token_counts.append(next(uncounted_sizes))
+            elif message['is_answer']:
+                token_counts.append(token_size + answer_format_size)
+            else:
+                token_counts.append(token_size + question_format_size)
+        return token_counts
+
     def _get_question(self, question: str, context: str) -> str:
         """
         Formats question for prompt.
@@ -120,22 +322,27 @@ class PromptBuilder:
         """
         return self.answer_format.format(answer=answer) + (self.separator if separator else "")
 
+    def _parse_message(self, message: dict) -> str:
+        """
+        Formats a message for the prompt.
+
+            Args:
+                message (dict): Message as returned by `get_raw_messages()` in `chat_session.py`
+            Returns:
+                str: Formatted message
+        """
+        if message['is_answer']:
+            return self._get_answer(message['content'])
+        return self._get_question(message['content'], message['context'])
+
     def _parse_messages(self, messages: list) -> list:
         """
-        Parses the messages into a list of tuples of the form (message, num_tokens).
-        Also formats the messages for the prompt.
+        Formats the messages for the prompt.
 
             Args:
                 messages (list): List of messages in the chat session as returned by
+                                 `get_raw_messages()` in `chat_session.py`
             Returns:
-                list: List of tuples of the form (message, num_tokens).
+                list: Formatted messages
         """
-        parsed_messages = []
-        for message in messages:
-            if message['is_answer']:
-                text = self._get_answer(message['content'])
-            else:
-                text = self._get_question(message['content'], message['context'])
-
-            parsed_messages.append(text)
-        return parsed_messages
+        return [self._parse_message(message) for message in messages]
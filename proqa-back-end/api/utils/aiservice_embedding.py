@@ -28,6 +28,21 @@ class EmbeddingAdapter(AIServiceAdapter):
             timeout=30
         )
 
+    def _make_batch_request(self, texts: list) -> Response:
+        """
+        Makes a batch request to the embedding service
+
+            Args:
+                texts (list): Texts to make embeddings from
+            Returns:
+                Response: Response from the API
+        """
+        return requests.post(
+            settings.AI_SERVICE_URL + self._get_batch_endpoint(),
+            json={'texts': texts},
+            timeout=30
+        )
+
     def _convert_response(self, response: Response) -> Tuple[list, str]:
         """
         Converts an embedding Response to a Python vector and string
@@ -43,12 +58,33 @@ class EmbeddingAdapter(AIServiceAdapter):
         embedding = response_json['embedding']
         return text, embedding
 
+    def _convert_batch_response(self, response: Response) -> Tuple[list, list]:
+        """
+        Converts a batch embedding Response to Python vectors and strings
+
+            Args:
+                response (Response): API response to convert
+            Returns:
+                list: Original texts
+                list: Resulting embeddings in the order of the texts
+        """
+        response_json = response.json()
+        texts = response_json['texts']
+        embeddings = response_json['embeddings']
+        return texts, embeddings
+
     def _get_endpoint(self) -> str:
         """
         Getter for embedding endpoint
         """
         return 'embedding'
 
+    def _get_batch_endpoint(self) -> str:
+        """
+        Getter for batch embedding endpoint
+        """
+        return 'embedding/batch'
+
     def get(self, text: str) -> Tuple[list, str]:
         """
         Makes request to embedding API and converts to Python objects
@@ -62,6 +98,25 @@ class EmbeddingAdapter(AIServiceAdapter):
         response = self._make_request(text=text)
         return self._convert_response(response=response)
 
+    def get_batch(self, texts: list) -> Tuple[list, list]:
+        """
+        Makes requests to the batch embedding API, at most EMBEDDING_BATCH_SIZE texts
+        per request, and converts to Python objects
+
+            Args:
+                texts (list): Texts to make embeddings from
+            Returns:
+                list: Original texts
+                list: Resulting embeddings in the order of the texts
+        """
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            response = self._make_batch_request(texts=texts[start:start + batch_size])
+            _, batch_embeddings = self._convert_batch_response(response=response)
+            embeddings.extend(batch_embeddings)
+        return texts, embeddings
+
     def batch_get(self, messages: list, last_question: str) -> list:
         """
         Makes multiple requests to embedding API and converts to Python objects
@@ -69,24 +124,79 @@ class EmbeddingAdapter(AIServiceAdapter):
             Args:
                 messages (list): Messages to make embeddings from (only questions)
                 last_question (str): The question that was last asked
-                decay_scalar (float): The ratio by which each question is less relevant
-                compared to its successor
             Returns:
                 list: Resulting weighted embedding given the texts 
         """
-        decay_scalar = settings.DECAY_SCALAR
-
         # get list of all questions
         texts = [message['content'] for message in messages if not message['is_answer']]
         texts.append(last_question)
 
-        # get normalized weights for given decay_scalar
-        weights = np.array([pow(decay_scalar, i) for i in range(len(texts))][::-1])
-        weights *= 1.0 / np.linalg.norm(weights, ord=1)
+        _, embeddings = self.get_batch(texts=texts)
+        query_embedding, _ = decay_embeddings(embeddings)
+        return query_embedding
 
-        embeddings = []
-        for (text, weight) in zip(texts, weights):
-            response = self._make_request(text=text)
-            _, embedding = self._convert_response(response=response)
-            embeddings.append(np.array(embedding) * weight)
-        return np.sum(embeddings, axis=0).tolist()
+    def get_query(self, last_question: str, previous: list = None,
+                  previous_weight: float = 0.0) -> Tuple[list, list, float]:
+        """
+        Makes a single request to the embedding API for the question that was last asked and
+        adds it to the weighted embedding of the previous questions
+
+            Args:
+                last_question (str): The question that was last asked
+                previous (list): Weighted embedding of the previous questions, None if there are
+                none
+                previous_weight (float): Sum of the weights of the previous questions
+            Returns:
+                list: Embedding of the question
+                list: Resulting weighted embedding given the questions
+                float: Sum of the weights of the questions
+        """
+        _, embedding = self.get(text=last_question)
+        query_embedding, weight = update_decayed_embedding(embedding, previous, previous_weight)
+        return embedding, query_embedding, weight
+
+
+def decay_embeddings(embeddings: list) -> Tuple[list, float]:
+    """
+    Weighs embeddings of consecutive questions by DECAY_SCALAR, such that each question is
+    DECAY_SCALAR times less relevant than its successor, with weights summing to one
+
+        Args:
+            embeddings (list): Embeddings of the questions, oldest first
+        Returns:
+            list: Resulting weighted embedding
+            float: Sum of the weights before normalization, to continue with
+            update_decayed_embedding
+    """
+    decay_scalar = settings.DECAY_SCALAR
+
+    # get normalized weights for given decay_scalar
+    weights = np.array([pow(decay_scalar, i) for i in range(len(embeddings))][::-1])
+    weight = float(np.linalg.norm(weights, ord=1))
+    weights *= 1.0 / weight
+
+    return np.sum(np.array(embeddings) * weights[:, np.newaxis], axis=0).tolist(), weight
+
+
+def update_decayed_embedding(embedding: list, previous: list = None,
+                             previous_weight: float = 0.0) -> Tuple[list, float]:
+    """
+    Adds the embedding of a new question to the weighted embedding of the previous questions.
+    The previous sum is decayed and the new question gets weight one, so the result equals
+    decay_embeddings over all questions without embedding them again.
+
+        Args:
+            embedding (list): Embedding of the new question
+            previous (list): Weighted embedding of the previous questions, None if there are none
+            previous_weight (float): Sum of the weights of the previous questions
+        Returns:
+            list: Resulting weighted embedding
+            float: Sum of the weights before normalization
+    """
+    if previous is None:
+        return embedding, 1.0
+
+    decayed_weight = settings.DECAY_SCALAR * previous_weight
+    weight = decayed_weight + 1.0
+    query_embedding = (decayed_weight * np.array(previous) + np.array(embedding)) / weight
+    return query_embedding.tolist(), weight
@@ -7,6 +7,22 @@ from django.conf import settings
 from api.utils.aiservice import AIServiceAdapter
 from api.models import LLM
 
+
+class TextGenerationBusyError(Exception):
+    """
+    Raised when the AI service rejects a text generation request because it is overloaded.
+    """
+
+    def __init__(self, retry_after: str = None):
+        """
+        Args:
+            retry_after (str): Seconds after which the request can be retried, as reported by
+            the AI service.
+        """
+        super().__init__("AI service is busy, try again later.")
+        self.retry_after = retry_after
+
+
 class TextAdapter(AIServiceAdapter):
     """
     Functions for making API calls to the text generation service
@@ -15,39 +31,87 @@ class TextAdapter(AIServiceAdapter):
     def __init__(self):
         self.model = None
 
-    def _make_request(self, channel: str, prompt: str, session_id: str, message_id: str
-                      ) -> Response:
+    def _make_request(self, request: dict) -> Response:
         """
         Schedules the generation of text from the AI service.
 
             Args:
-                channel (str): Channel to stream text to
-                prompt (str): Prompt to generate from
-                session_id (str): ID of the session to stream to
-                message_id (str): ID of the answer
+                request (dict): Text generation request as built by `_get_request()`
             Returns:
                 Response: Response from the API
         """
         return requests.post(
             settings.AI_SERVICE_URL + self._get_endpoint(),
-            json={
-                "prompt": prompt,
-                "message_id": message_id,
-                "model_settings": {
-                    "model_name": self.model.name,
-                    "n_ctx": self.model.context_size,
-                    "temperature": self.model.temperature,
-                    "n_gpu_layers": self.model.gpu_layers,
-                    "n_batch": self.model.batch_size
-                },
-                "streaming_settings": {
-                    "channel": channel,
-                    "session_id": session_id
-                }
-            },
+            json=request,
             timeout=5
         )
 
+    def _get_request(self, prompt: str, session_id: str, message_id: str, channel: str,
+                     options: dict = None) -> dict:
+        """
+        Builds a text generation request.
+
+            Args:
+                prompt (str): Prompt to generate from
+                session_id (str): ID of the session the text is generated for
+                message_id (str): ID of the message the text is generated for
+                channel (str): Channel to stream text to
+                options (dict): Generation options, "stop" and "max_tokens" go into the model
+                                settings and the others, e.g. "prefix" or "priority", into
+                                the request
+            Returns:
+                dict: Text generation request
+        """
+        options = dict(options or {})
+        model_settings = self._get_model_settings(options.pop("stop", None),
+                                                  options.pop("max_tokens", None))
+        return {
+            "prompt": prompt,
+            "message_id": message_id,
+            "model_settings": model_settings,
+            "streaming_settings": {
+                "channel": channel,
+                "session_id": session_id
+            },
+            **options
+        }
+
+    def _send(self, request: dict) -> int:
+        """
+        Sends a text generation request.
+
+            Args:
+                request (dict): Text generation request as built by `_get_request()`
+            Returns:
+                int: Status code
+            Raises:
+                TextGenerationBusyError: If the AI service queue is full
+        """
+        response = self._make_request(request)
+        if response.status_code in (429, 503):
+            raise TextGenerationBusyError(response.headers.get("Retry-After"))
+        return self._convert_response(response=response)
+
+    def _get_model_settings(self, stop: list = None, max_tokens: int = None) -> dict:
+        """
+        Gets the settings of the model for a request.
+
+            Args:
+                stop (list): Strings that end the text, in addition to those of the model
+                max_tokens (int): Maximum number of generated tokens, that of the model if None
+            Returns:
+                dict: Model settings
+        """
+        return {
+            "model_name": self.model.name,
+            "n_ctx": self.model.context_size,
+            "temperature": self.model.temperature,
+            "n_gpu_layers": self.model.gpu_layers,
+            "n_batch": self.model.batch_size,
+            "max_tokens": max_tokens or self.model.max_tokens,
+            "stop": (stop or []) + self.model.get_stop_sequences()
+        }
+
     def _convert_response(self, response: Response) -> int:
         """
         Converts a text generation Response to a Python int
@@ -65,7 +129,8 @@ class TextAdapter(AIServiceAdapter):
         """
         return 'text'
 
-    def get(self, channel: str, prompt: str, session_id: str, message_id: str) -> int:
+    def get(self, channel: str, prompt: str, session_id: str, message_id: str,
+            options: dict = None) -> int:
         """
         Makes request to text generation API converts to Python objects
 
@@ -74,13 +139,50 @@ class TextAdapter(AIServiceAdapter):
                 prompt (str): Prompt to generate from
                 session_id (str): ID of the session to stream to
                 message_id (str): ID of the answer
+                options (dict): Generation options, "prefix" is the start of the prompt shared
+                                by all prompts of the template and "stop" the strings that end
+                                the answer, in addition to those of the model
+            Returns:
+                int: Status code
+            Raises:
+                TextGenerationBusyError: If the AI service queue is full
+        """
+        return self._send(self._get_request(prompt, session_id, message_id, channel, options))
+
+    def get_background(self, prompt: str, session_id: str, message_id: str,
+                       options: dict = None) -> int:
+        """
+        Schedules the generation of text that is not streamed, at a lower priority than
+        answers. The AI service posts the text to the callback endpoint once generated.
+
+            Args:
+                prompt (str): Prompt to generate from
+                session_id (str): ID of the session the text is generated for
+                message_id (str): ID of the message the text is generated for
+                options (dict): Generation options, "callback" is the endpoint to post the text
+                                to relative to /api/, "max_tokens" the maximum number of
+                                generated tokens and "stop" the strings that end the text
             Returns:
                 int: Status code
+            Raises:
+                TextGenerationBusyError: If the AI service queue is full
         """
-        response = self._make_request(channel=channel,
-                                      prompt=prompt,
-                                      session_id=session_id,
-                                      message_id=message_id)
+        options = {**(options or {}), "priority": 1, "stream": False}
+        return self._send(self._get_request(prompt, session_id, message_id, "", options))
+
+    def cancel(self, message_id: str) -> int:
+        """
+        Cancels the generation of an answer, whether it is queued or being generated.
+
+            Args:
+                message_id (str): ID of the answer
+            Returns:
+                int: Status code, 404 if the answer is not being generated
+        """
+        response = requests.delete(
+            settings.AI_SERVICE_URL + self._get_endpoint() + '/' + message_id,
+            timeout=5
+        )
         return self._convert_response(response=response)
 
     def update_model(self, model: LLM):
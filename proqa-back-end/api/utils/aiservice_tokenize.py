@@ -26,6 +26,21 @@ class TokenizeAdapter(AIServiceAdapter):
             timeout=5
         )
 
+    def _make_batch_request(self, texts: list) -> Response:
+        """
+        Makes a count-only batch request to the tokenize service
+
+            Args:
+                texts (list): Texts to tokenize
+            Returns:
+                Response: Response from the API
+        """
+        return requests.post(
+            settings.AI_SERVICE_URL + self._get_batch_endpoint(),
+            json={'texts': texts, 'count_only': True},
+            timeout=5
+        )
+
     def _convert_response(self, response: Response) -> int:
         """
         Converts a tokenization Response to a Python list and string
@@ -48,6 +63,15 @@ class TokenizeAdapter(AIServiceAdapter):
         """
         return "tokenize"
 
+    def _get_batch_endpoint(self) -> str:
+        """
+        Getter for batch tokenize endpoint
+
+            Returns:
+                str: Endpoint
+        """
+        return "tokenize/batch"
+
     def get(self, text: str) -> int:
         """
         Makes request to tokenize API converts to Python objects
@@ -59,3 +83,15 @@ class TokenizeAdapter(AIServiceAdapter):
         """
         response = self._make_request(text=text)
         return self._convert_response(response=response)
+
+    def get_batch(self, texts: list) -> list:
+        """
+        Makes a single request to the batch tokenize API converts to Python objects
+
+            Args:
+                texts (list): Texts to tokenize
+            Returns:
+                list: Resulting number of tokens of each text
+        """
+        response = self._make_batch_request(texts=texts)
+        return self._convert_response(response=response)
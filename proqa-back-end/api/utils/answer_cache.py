@@ -0,0 +1,161 @@
+"""
+Semantic cache of answers to first questions of chat sessions
+"""
+import hashlib
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from api.models import Answer, CachedAnswer, Collection, LLM, PromptTemplate
+
+HIT_COUNT_KEY = "answer_cache_hits"
+MISS_COUNT_KEY = "answer_cache_misses"
+
+
+def get_context_key(chunks: list) -> str:
+    """
+    Gets the key of a set of chunks, which changes when one of their collections is rebuilt.
+
+        Args:
+            chunks (list): Chunks used as context
+        Returns:
+            str: Key of the context
+    """
+    chunk_ids = sorted(str(chunk.chunk_id) for chunk in chunks)
+    collection_ids = {chunk.source.collection_id for chunk in chunks if chunk.source is not None}
+    versions = sorted(
+        f"{collection.pk}:{collection.sources_last_updated_at}"
+        for collection in Collection.objects.filter(pk__in=collection_ids)
+    )
+    return hashlib.sha256("|".join(chunk_ids + versions).encode("utf-8")).hexdigest()
+
+
+def lookup(embedding: list, model: LLM, template: PromptTemplate,
+           chunks: list) -> CachedAnswer | None:
+    """
+    Finds the cached answer to the most similar question asked with the same model, template
+    and context, if it is similar enough.
+
+        Args:
+            embedding (list): Embedding of the question
+            model (LLM): Active model
+            template (PromptTemplate): Active prompt template
+            chunks (list): Chunks used as context
+        Returns:
+            CachedAnswer | None: Cached answer, None if there is no similar question
+    """
+    if settings.ANSWER_CACHE_SIZE <= 0:
+        return None
+
+    candidates = list(CachedAnswer.objects.filter(
+        model=model, template=template, context_key=get_context_key(chunks),
+        content__isnull=False
+    ))
+    best = None
+    if candidates:
+        similarities = _cosine_similarities(embedding, [c.embedding for c in candidates])
+        index = int(np.argmax(similarities))
+        if similarities[index] >= settings.ANSWER_CACHE_THRESHOLD:
+            best = candidates[index]
+
+    if best is None:
+        _increment(MISS_COUNT_KEY)
+        return None
+    _increment(HIT_COUNT_KEY)
+    CachedAnswer.objects.filter(pk=best.pk).update(hits=F("hits") + 1,
+                                                   last_used_at=timezone.now())
+    return best
+
+
+def add(answer: Answer, question: str, embedding: list, chunks: list):
+    """
+    Adds an answer that is being generated to the cache, it can be used once it is complete.
+    Evicts the least recently used answers when the cache is full.
+
+        Args:
+            answer (Answer): Answer being generated, with the model and prompt template used
+            question (str): Question that is answered
+            embedding (list): Embedding of the question
+            chunks (list): Chunks used as context
+    """
+    if settings.ANSWER_CACHE_SIZE <= 0:
+        return
+
+    cached_answer = CachedAnswer.objects.create(
+        question=question, embedding=np.asarray(embedding).tolist(), answer=answer,
+        model=answer.model, template=answer.template, context_key=get_context_key(chunks)
+    )
+    cached_answer.chunks.set(chunks)
+
+    evicted = CachedAnswer.objects.order_by("-last_used_at", "-pk") \
+        .values_list("pk", flat=True)[settings.ANSWER_CACHE_SIZE:]
+    CachedAnswer.objects.filter(pk__in=list(evicted)).delete()
+
+
+def complete(answer: Answer):
+    """
+    Stores the content of a generated answer in its cache entry, if it has one.
+
+        Args:
+            answer (Answer): Generated answer
+    """
+    CachedAnswer.objects.filter(answer=answer).update(content=answer.content)
+
+
+def invalidate_collection(collection: Collection):
+    """
+    Removes the cached answers that use chunks of a collection.
+
+        Args:
+            collection (Collection): Collection that is rebuilt
+    """
+    CachedAnswer.objects.filter(chunks__source__collection=collection).delete()
+
+
+def get_stats() -> dict:
+    """
+    Gets the size and hit rate of the cache.
+
+        Returns:
+            dict: Cache statistics
+    """
+    hits = cache.get(HIT_COUNT_KEY, 0)
+    misses = cache.get(MISS_COUNT_KEY, 0)
+    return {
+        "size": CachedAnswer.objects.filter(content__isnull=False).count(),
+        "max_size": settings.ANSWER_CACHE_SIZE,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+def _cosine_similarities(embedding: list, embeddings: list) -> np.ndarray:
+    """
+    Computes the cosine similarity of an embedding to each of a list of embeddings.
+
+        Args:
+            embedding (list): Embedding to compare
+            embeddings (list): Embeddings to compare to
+        Returns:
+            np.ndarray: Similarity to each embedding
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    return matrix @ vector / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def _increment(key: str):
+    """
+    Increments a counter in the Django cache.
+
+        Args:
+            key (str): Key of the counter
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
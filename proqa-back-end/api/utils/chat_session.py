@@ -1,9 +1,15 @@
 """
 Helper functions for making API calls to Django backend.
 """
+import logging
 import uuid
+import requests
 from django.contrib.auth.models import User
 from api.models import ChatSession, Question, Answer
+from api.utils.aiservice_text import TextAdapter
+from api.utils.references import remove_session_references
+
+logger = logging.getLogger(__name__)
 
 # Create chat session
 def create_chat_session(user: User, title: str, color: str) -> uuid.uuid4:
@@ -28,19 +34,19 @@ def create_chat_session(user: User, title: str, color: str) -> uuid.uuid4:
     # Return ID of created chat session
     return chat_session.session_id
 
-def __decrement_chunk_references(chat_session: ChatSession):
+def cancel_pending_answers(chat_session: ChatSession):
     """
-    Decrements times_referenced for each chunk in chat_session
+    Cancels the generation of the answers in chat_session that are not complete yet
 
         Args:
-            chat_session (ChatSession): Chat session to decrement in 
+            chat_session (ChatSession): Chat session to cancel answers in
     """
-    answers_in_session = chat_session.answer_set.all()
-    for answer in answers_in_session:
-        if answer.context is not None:
-            used_chunk = answer.context
-            used_chunk.times_referenced -= 1
-            used_chunk.save()
+    text_adapter = TextAdapter()
+    for answer in chat_session.answer_set.filter(content__isnull=True):
+        try:
+            text_adapter.cancel(str(answer.answer_id))
+        except requests.RequestException:
+            logger.warning("Could not cancel answer %s", answer.answer_id)
 
 # Delete chat session
 def delete_chat_session(user: User, chat_session_id: uuid) -> bool:
@@ -60,8 +66,11 @@ def delete_chat_session(user: User, chat_session_id: uuid) -> bool:
     if chat_session.author != user:
         return False
 
+    # Stop generating answers nobody will read
+    cancel_pending_answers(chat_session)
+
     # Decrement references to chunks
-    __decrement_chunk_references(chat_session)
+    remove_session_references(chat_session)
 
     # Delete chat session
     chat_session.delete()
@@ -247,8 +256,9 @@ def get_raw_messages(chat_session_id: uuid) -> list:
     """
     chat_session = ChatSession.objects.get(session_id=chat_session_id)
 
-    # Get all answers and questions of chat session
-    answers = list(chat_session.answer_set.all())
+    # Get all answers and questions of chat session. Answers that were cancelled or are
+    # still being generated have no content, so their turns are left out.
+    answers = list(chat_session.answer_set.filter(content__isnull=False))
 
     messages = []
     for answer in answers:
@@ -258,22 +268,31 @@ def get_raw_messages(chat_session_id: uuid) -> list:
         if answer.context is not None:
             messages.append({
                 "is_answer": False,
+                "question_id": question.question_id,
                 "content": question.content,
                 "context": answer.context.content,
-                "created_at": question.created_at
+                "summary": question.summary,
+                "created_at": question.created_at,
+                "token_size": question.token_size,
+                "context_token_size": answer.context.token_size
             })
         else:
             messages.append({
                 "is_answer": False,
+                "question_id": question.question_id,
                 "content": question.content,
                 "context": None,
-                "created_at": question.created_at
+                "summary": question.summary,
+                "created_at": question.created_at,
+                "token_size": question.token_size,
+                "context_token_size": None
             })
 
         messages.append({
             "is_answer": True,
             "content": answer.content,
-            "created_at": answer.created_at
+            "created_at": answer.created_at,
+            "token_size": answer.token_size
         })
 
     # Sort messages by created_at
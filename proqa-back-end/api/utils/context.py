@@ -2,11 +2,13 @@
 Helper functions for making API calls to vector DB
 """
 import sys
+import heapq
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from os import listdir
 from os.path import isfile, join
 from random import randrange
-from uuid import uuid4
+from uuid import UUID, uuid4
 from typing import Tuple
 import filetype
 from django.conf import settings
@@ -17,9 +19,19 @@ from langchain.document_loaders import PyPDFLoader, Docx2txtLoader
 from langchain.document_loaders.base import BaseLoader
 from langchain.text_splitter import CharacterTextSplitter
 from api.utils.aiservice_embedding import EmbeddingAdapter
+from api.utils.answer_cache import invalidate_collection
+from api.utils.references import flush_references
+from api.utils.routing import compute_centroids, get_collection_vectors, route_collections
+from api.utils.tokenizer import count_tokens, count_tokens_batch
 from api.models import Collection, Source, Chunk, SupportedFiletypes
 from api.exceptions import UnsupportedFileTypeException
 
+# Minimum number of characters shared by chunks to count as overlap
+MIN_OVERLAP = 16
+
+# Threads searching the collections of a question concurrently
+SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=settings.VECTORDB_SEARCH_THREADS)
+
 
 def vector_db_query(client: QdrantClient, embedding: list) -> ScoredPoint:
     """
@@ -31,24 +43,44 @@ def vector_db_query(client: QdrantClient, embedding: list) -> ScoredPoint:
         Returns:
             ScoredPoint: Top Qdrant search result
     """
-    collections = Collection.objects.filter(active=True)
-    if not collections.exists():
+    return vector_db_query_top_k(client, embedding, 1)[0]
+
+
+def vector_db_query_top_k(client: QdrantClient, embedding: list, limit: int) -> list:
+    """
+    Gets the top search results across all active collections from vector DB based on
+    embedding
+
+        Args:
+            client (QdrantClient): Connection to vector DB
+            embedding (list): Embedding that is being queried
+            limit (int): Maximum number of results
+        Returns:
+            list: Qdrant search results ordered by descending score
+    """
+    collections = list(Collection.objects.filter(active=True).values_list('name', 'centroids'))
+    if not collections:
         raise Collection.DoesNotExist('No active collections in database.')
+    collection_names = route_collections(collections, embedding, settings.COLLECTION_FAN_OUT,
+                                         settings.COLLECTION_ROUTING_MARGIN)
 
-    max_score_hit = None
-    for collection in collections:
-        curr_collection_hit = client.search(
-            collection_name=collection.name,
+    def search(collection_name: str) -> list:
+        """
+        Searches a single collection
+        """
+        return client.search(
+            collection_name=collection_name,
             query_vector=embedding,
-            limit=1
-        )[0]
-        if max_score_hit:  # Not equal to None
-            if curr_collection_hit.score > max_score_hit.score:
-                max_score_hit = curr_collection_hit
-        else:
-            max_score_hit = curr_collection_hit
+            limit=limit
+        )
 
-    return max_score_hit
+    # Search the collections concurrently, so latency does not grow with their number
+    if len(collection_names) == 1:
+        results = [search(collection_names[0])]
+    else:
+        results = SEARCH_EXECUTOR.map(search, collection_names)
+    hits = [hit for result in results for hit in result]
+    return heapq.nlargest(limit, hits, key=lambda hit: hit.score)
 
 
 def get_context_uuid(client: QdrantClient, embedding: list) -> uuid4:
@@ -64,6 +96,128 @@ def get_context_uuid(client: QdrantClient, embedding: list) -> uuid4:
     return vector_db_query(client, embedding).payload['uuid']
 
 
+def get_context_chunks(client: QdrantClient, embedding: list, limit: int) -> list[Chunk]:
+    """
+    Gets the best matching chunks across all active collections. Chunks of collections with
+    chunks_in_payload are built from the search results without reading the DB, they are not
+    saved and can be passed to resolve_chunks to get the stored chunks.
+
+        Args:
+            client (QdrantClient): Connection to vector DB
+            embedding (list): Embedding that is being queried
+            limit (int): Maximum number of chunks
+        Returns:
+            list: Chunks ordered by descending score
+    """
+    hits = vector_db_query_top_k(client, embedding, limit)
+    stored_ids = [UUID(str(hit.payload['uuid'])) for hit in hits if 'content' not in hit.payload]
+    stored = Chunk.objects.select_related('source__collection') \
+        .in_bulk(stored_ids, field_name='chunk_id') if stored_ids else {}
+
+    chunks = []
+    for hit in hits:
+        chunk_id = UUID(str(hit.payload['uuid']))
+        if 'content' in hit.payload:
+            chunks.append(_chunk_from_payload(chunk_id, hit.payload))
+        elif chunk_id in stored:
+            chunks.append(stored[chunk_id])
+    return chunks
+
+
+def resolve_chunks(chunks: list[Chunk]) -> list[Chunk]:
+    """
+    Gets the stored chunks of chunks built from search results, with a single query.
+
+        Args:
+            chunks (list): Chunks returned by get_context_chunks
+        Returns:
+            list: Stored chunks in the same order, without chunks that were deleted since
+    """
+    if all(chunk.pk is not None for chunk in chunks):
+        return chunks
+    stored = Chunk.objects.in_bulk([chunk.chunk_id for chunk in chunks], field_name='chunk_id')
+    return [stored[chunk.chunk_id] for chunk in chunks if chunk.chunk_id in stored]
+
+
+def _chunk_from_payload(chunk_id: UUID, payload: dict) -> Chunk:
+    """
+    Builds an unsaved chunk from the payload of a search result.
+
+        Args:
+            chunk_id (UUID): UUID of the chunk
+            payload (dict): Payload stored by parse_chunks
+        Returns:
+            Chunk: Chunk with its source and collection, without primary keys of its own
+    """
+    collection = Collection(pk=payload['collection_id'], chunk_overlap=payload['chunk_overlap'])
+    source = Source(pk=payload['source_id'], collection=collection,
+                    file_name=payload['file_name'])
+    return Chunk(chunk_id=chunk_id, source=source, content=payload['content'],
+                 token_size=payload['token_size'])
+
+
+def pack_context(chunks: list[Chunk], max_tokens: int) -> Tuple[str, list[Chunk]]:
+    """
+    Combines chunks into the context of a prompt, in order, as long as they fit in
+    max_tokens. The first chunk is always used. Text that overlaps with a used chunk of the
+    same source is left out, and chunks contained in a used chunk are skipped.
+
+        Args:
+            chunks (list): Chunks ordered by descending score
+            max_tokens (int): Maximum number of tokens of the context
+        Returns:
+            str: Context for the prompt
+            list: Chunks used in the context
+    """
+    used_chunks = []
+    texts = []
+    num_tokens = 0
+    for chunk in chunks:
+        text = chunk.content
+        for used_chunk in used_chunks:
+            if used_chunk.source_id is not None and used_chunk.source_id == chunk.source_id:
+                text = _remove_overlap(text, used_chunk.content,
+                                       chunk.source.collection.chunk_overlap)
+        if not text:
+            continue
+
+        token_size = chunk.token_size if text == chunk.content and chunk.token_size is not None \
+            else count_tokens(text)
+        if used_chunks and num_tokens + token_size > max_tokens:
+            continue
+        used_chunks.append(chunk)
+        texts.append(text)
+        num_tokens += token_size
+
+    return "\n\n".join(texts), used_chunks
+
+
+def _remove_overlap(text: str, other: str, max_overlap: int) -> str:
+    """
+    Removes the start of a text that ends the other text and the end of the text that starts
+    the other text, as produced by splitting a source with overlap.
+
+        Args:
+            text (str): Text to remove overlap from
+            other (str): Text that may overlap with it
+            max_overlap (int): Maximum number of overlapping characters
+        Returns:
+            str: Text without the overlap, empty if it is contained in the other text
+    """
+    if text in other:
+        return ""
+    remaining = text
+    for size in range(min(max_overlap, len(remaining), len(other)), MIN_OVERLAP - 1, -1):
+        if other.endswith(remaining[:size]):
+            remaining = remaining[size:]
+            break
+    for size in range(min(max_overlap, len(remaining), len(other)), MIN_OVERLAP - 1, -1):
+        if other.startswith(remaining[-size:]):
+            remaining = remaining[:-size]
+            break
+    return remaining.strip() if remaining != text else text
+
+
 def handle_inactive_collection(client: QdrantClient, collection: Collection):
     """
     Deletes inactive collection from local DB and vector DB
@@ -87,7 +241,10 @@ def reset_collection(client: QdrantClient, collection_name: str):
         handle_inactive_collection(client=client, collection=collection)
         return
 
-    # Delete chunks that are not used by any answer
+    # Answers based on the old chunks are outdated
+    invalidate_collection(collection)
+    # Delete chunks that are not used by any answer, including buffered references
+    flush_references()
     Chunk.objects.filter(times_referenced=0).delete()
     # Delete all sources
     collection.source_set.all().delete()
@@ -104,9 +261,13 @@ def reset_collection(client: QdrantClient, collection_name: str):
         source.save()
         chunks = parse_chunks(client, source_text, source, collection)
         _ = [chunk.save() for chunk in chunks]
+    # Summarize the chunks for routing questions to the collection
+    collection.centroids = compute_centroids(
+        get_collection_vectors(client, collection_name), settings.COLLECTION_CENTROIDS
+    )
     # Update sources last updated timestamp
     collection.sources_last_updated_at = datetime.datetime.now()
-    collection.save(update_fields=["sources_last_updated_at"])
+    collection.save(update_fields=["centroids", "sources_last_updated_at"])
 
 
 def parse_source(file_path: str, file_name: str, collection: Collection) -> Tuple[str, Source]:
@@ -171,28 +332,61 @@ def parse_chunks(client: QdrantClient, source_text: str, source: Source,
         chunk_overlap=collection.chunk_overlap,
         separator='\n'
     )
-    chunks = []
-    points = []
-    chunks_texts = splitter.split_text(source_text)
-    for chunk_text in chunks_texts:
-        # Create chunk representation in local DB
-        chunk = Chunk(
-            source=source,
-            content=chunk_text.replace('\x00', ' ')
-        )
-        chunks.append(chunk)
-        # Store embedding in vector DB
-        _, vector = EmbeddingAdapter().get(text=chunk_text)
-        point = PointStruct(
-                    # Irrelevant but required by API
-                    id=randrange(sys.maxsize),
-                    vector=vector,
-                    payload={"uuid": chunk.chunk_id}
-                )
-        points.append(point)
-    client.upsert(collection_name=collection.name, points=points)
+    chunks = _create_chunks(splitter.split_text(source_text), source)
+    client.upsert(collection_name=collection.name, points=_embed_chunks(chunks, collection))
     return chunks
 
+
+def _create_chunks(chunks_texts: list, source: Source) -> list[Chunk]:
+    """
+    Creates the chunks of a source with their token counts, counted in a single batch so
+    prompts using the chunks do not have to count them.
+
+        Args:
+            chunks_texts (list): Texts of the chunks
+            source (Source): Django model representation of source
+        Returns:
+            list: Unsaved chunks
+    """
+    contents = [text.replace('\x00', ' ') for text in chunks_texts]
+    return [
+        Chunk(source=source, content=content, token_size=token_size)
+        for content, token_size in zip(contents, count_tokens_batch(contents))
+    ]
+
+
+def _embed_chunks(chunks: list, collection: Collection) -> list[PointStruct]:
+    """
+    Embeds chunks in batches and builds their vector DB points. The content of the chunks is
+    stored in the payload if the collection has chunks_in_payload.
+
+        Args:
+            chunks (list): Chunks of a source
+            collection (Collection): Collection that the source belongs to
+        Returns:
+            list: Points to store in the vector DB
+    """
+    _, vectors = EmbeddingAdapter().get_batch(texts=[chunk.content for chunk in chunks])
+    points = []
+    for chunk, vector in zip(chunks, vectors):
+        payload = {"uuid": chunk.chunk_id}
+        if collection.chunks_in_payload:
+            payload.update({
+                "content": chunk.content,
+                "token_size": chunk.token_size,
+                "file_name": chunk.source.file_name,
+                "source_id": chunk.source.pk,
+                "collection_id": collection.pk,
+                "chunk_overlap": collection.chunk_overlap
+            })
+        points.append(PointStruct(
+            # Irrelevant but required by API
+            id=randrange(sys.maxsize),
+            vector=vector,
+            payload=payload
+        ))
+    return points
+
 def toggle_collection(collection: Collection, state: bool):
     """Toggle the updating state of a collection
 
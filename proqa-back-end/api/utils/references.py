@@ -0,0 +1,135 @@
+"""
+Reference counts of chunks, buffered in Redis and flushed to the DB in batches
+"""
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from redis import Redis
+from redis.exceptions import RedisError, ResponseError
+from api.models import Answer, ChatSession, Chunk
+
+# Hash of chunk primary keys to the number of references added since the last flush
+PENDING_KEY = "chunk_references"
+# Counts taken out of the pending hash by a flush that has not completed yet
+FLUSHING_KEY = "chunk_references_flushing"
+LOCK_KEY = "chunk_references_lock"
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _connect(url: str) -> Redis:
+    """
+    Connects to Redis. The connection pool is created once per worker and reused afterwards.
+
+        Args:
+            url (str): Redis URL
+        Returns:
+            Redis: Redis client
+    """
+    return Redis.from_url(url)
+
+
+def get_client() -> Redis:
+    """
+    Gets the Redis client buffering the reference counts if REFERENCE_BUFFER_URL is set.
+
+        Returns:
+            Redis: Redis client, None if references are written to the DB directly
+    """
+    if settings.REFERENCE_BUFFER_URL is None:
+        return None
+    return _connect(settings.REFERENCE_BUFFER_URL)
+
+
+def add_references(chunks: list, count: int = 1):
+    """
+    Adds references to chunks with an atomic increment, buffered until the next flush if
+    possible and applied to the DB otherwise, also when Redis cannot be reached.
+
+        Args:
+            chunks (list): Stored chunks that are referenced
+            count (int): Number of references to add to each chunk
+    """
+    chunk_pks = [chunk.pk for chunk in chunks]
+    if not chunk_pks:
+        return
+    client = get_client()
+    if client is not None:
+        try:
+            pipeline = client.pipeline()
+            for chunk_pk in chunk_pks:
+                pipeline.hincrby(PENDING_KEY, chunk_pk, count)
+            pipeline.execute()
+            return
+        except RedisError:
+            logger.warning("Could not buffer chunk references, writing them to the DB")
+    Chunk.objects.filter(pk__in=chunk_pks) \
+        .update(times_referenced=F('times_referenced') + count)
+
+
+def flush_references() -> int:
+    """
+    Applies the buffered references to the DB, with one UPDATE per distinct count. The
+    buffer is swapped out atomically, so references added during the flush are kept for the
+    next one, and counts of a failed flush are applied by the next one.
+
+        Returns:
+            int: Number of chunks updated
+    """
+    client = get_client()
+    if client is None:
+        return 0
+    lock = client.lock(LOCK_KEY, timeout=settings.REFERENCE_FLUSH_TIMEOUT)
+    # Another worker is flushing already
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        if not client.exists(FLUSHING_KEY):
+            try:
+                client.rename(PENDING_KEY, FLUSHING_KEY)
+            except ResponseError:
+                # Nothing was referenced since the last flush
+                return 0
+        counts = {int(chunk_pk): int(count)
+                  for chunk_pk, count in client.hgetall(FLUSHING_KEY).items()}
+        _apply_counts(counts)
+        client.delete(FLUSHING_KEY)
+        return len(counts)
+    finally:
+        lock.release()
+
+
+def _apply_counts(counts: dict):
+    """
+    Adds reference counts to chunks in a single transaction, grouping the chunks by count.
+
+        Args:
+            counts (dict): Number of references to add to each chunk primary key
+    """
+    chunks_per_count = defaultdict(list)
+    for chunk_pk, count in counts.items():
+        if count != 0:
+            chunks_per_count[count].append(chunk_pk)
+    with transaction.atomic():
+        for count, chunk_pks in chunks_per_count.items():
+            Chunk.objects.filter(pk__in=chunk_pks) \
+                .update(times_referenced=F('times_referenced') + count)
+
+
+def remove_session_references(chat_session: ChatSession):
+    """
+    Removes the references of the answers of a chat session with a single UPDATE, which
+    decrements each chunk by the number of answers using it.
+
+        Args:
+            chat_session (ChatSession): Chat session whose answers are deleted
+    """
+    answers = Answer.objects.filter(session=chat_session)
+    references = answers.filter(Q(context=OuterRef('pk')) | Q(chunks=OuterRef('pk'))) \
+        .values('session').annotate(count=Count('pk', distinct=True)).values('count')
+    Chunk.objects.filter(Q(answer__in=answers) | Q(referencing_answers__in=answers)) \
+        .update(times_referenced=F('times_referenced') - Subquery(references))
@@ -0,0 +1,116 @@
+"""
+Functions for routing questions to the collections whose chunks are most similar, using
+k-means centroids of the chunk embeddings of each collection
+"""
+import numpy as np
+from qdrant_client import QdrantClient
+
+KMEANS_ITERATIONS = 20
+SCROLL_BATCH_SIZE = 1000
+
+
+def get_collection_vectors(client: QdrantClient, collection_name: str) -> list:
+    """
+    Gets the embeddings of all chunks of a collection from vector DB
+
+        Args:
+            client (QdrantClient): Connection to vector DB
+            collection_name (str): Name of the collection
+        Returns:
+            list: Embeddings of the chunks
+    """
+    vectors = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+            with_payload=False,
+            with_vectors=True
+        )
+        vectors += [point.vector for point in points]
+        if offset is None:
+            return vectors
+
+
+def compute_centroids(vectors: list, num_centroids: int, seed: int = 0) -> list:
+    """
+    Clusters normalized embeddings with spherical k-means, so the centroids summarize the
+    topics of a collection for cosine similarity
+
+        Args:
+            vectors (list): Embeddings to cluster
+            num_centroids (int): Maximum number of centroids
+            seed (int): Seed of the initialization
+        Returns:
+            list: Normalized centroids, empty if there are no embeddings
+    """
+    if not vectors or num_centroids <= 0:
+        return []
+    points = _normalize(np.array(vectors, dtype=float))
+    num_centroids = min(num_centroids, len(points))
+
+    # k-means++ initialization, each next centroid is likely far from the chosen ones
+    rng = np.random.default_rng(seed)
+    centroids = [points[rng.integers(len(points))]]
+    for _ in range(1, num_centroids):
+        distances = np.clip(1 - np.max(points @ np.array(centroids).T, axis=1), 0, None)
+        if distances.sum() == 0:
+            break
+        centroids.append(points[rng.choice(len(points), p=distances / distances.sum())])
+    centroids = np.array(centroids)
+
+    for _ in range(KMEANS_ITERATIONS):
+        labels = np.argmax(points @ centroids.T, axis=1)
+        updated = np.array([
+            points[labels == index].sum(axis=0) if np.any(labels == index) else centroid
+            for index, centroid in enumerate(centroids)
+        ])
+        updated = _normalize(updated)
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids.tolist()
+
+
+def route_collections(collections: list, embedding: list, fan_out: int,
+                      margin: float) -> list:
+    """
+    Selects the collections to search for an embedding: the fan_out collections with the
+    closest centroid. All collections are searched if routing is disabled, a collection has no
+    centroids, or the best left out collection is within margin of the last selected one.
+
+        Args:
+            collections (list): Tuples of the form (name, centroids)
+            embedding (list): Embedding that is being queried
+            fan_out (int): Number of collections to search, all if 0
+            margin (float): Minimum difference in similarity between the last selected and the
+            best left out collection
+        Returns:
+            list: Names of the collections to search
+    """
+    names = [name for name, _ in collections]
+    if fan_out <= 0 or len(collections) <= fan_out \
+            or any(not centroids for _, centroids in collections):
+        return names
+
+    query = _normalize(np.array(embedding, dtype=float))
+    scores = [float(np.max(np.array(centroids) @ query)) for _, centroids in collections]
+    order = np.argsort(scores)[::-1]
+    if scores[order[fan_out - 1]] - scores[order[fan_out]] < margin:
+        return names
+    return [names[index] for index in order[:fan_out]]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales vectors to unit length, leaving zero vectors as they are
+
+        Args:
+            vectors (np.ndarray): Vector or matrix with a vector per row
+        Returns:
+            np.ndarray: Normalized vectors
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,122 @@
+"""
+Functions for summarising the conversation of a chat session, so the summary can take the place
+of turns that no longer fit in the prompt
+"""
+import uuid
+from django.conf import settings
+from api.models import Question, LLM
+from api.utils.aiservice_text import TextAdapter
+
+SUMMARY_INSTRUCTION = ("Summarize the conversation below in at most three sentences. "
+                       "Keep the facts needed to answer follow-up questions.")
+QUESTION_MARKER = "User:"
+ANSWER_MARKER = "Assistant:"
+
+text_adapter = TextAdapter()
+
+
+def get_summary_prompt(previous_summary: str, turns: list) -> str:
+    """
+    Builds the prompt to extend the summary of a conversation with its latest turns.
+
+        Args:
+            previous_summary (str): Summary of the turns before, None if there is none
+            turns (list): Tuples of the form (question, answer), oldest first
+        Returns:
+            str: Prompt for AI service
+    """
+    lines = [f"\n{SUMMARY_INSTRUCTION}\n"]
+    if previous_summary:
+        lines.append(f"Summary so far: {previous_summary}")
+    for question, answer in turns:
+        lines.append(f"{QUESTION_MARKER} {question}")
+        lines.append(f"{ANSWER_MARKER} {answer}")
+    lines.append("Summary:")
+    return "\n".join(lines)
+
+
+def get_question_to_summarize(dropped_messages: list) -> uuid.UUID:
+    """
+    Decides whether the conversation has to be summarised, given the messages left out of a
+    prompt. Turns that fit in the prompt need no summary, so the newest left out question is
+    summarised if no summary covers the left out turns yet, or if SUMMARY_INTERVAL questions
+    were left out since the latest summary.
+
+        Args:
+            dropped_messages (list): Messages left out of the prompt, as returned by
+                                     `get_raw_messages()` in `chat_session.py`
+        Returns:
+            uuid: ID of the question to summarise up to, None if no summary is needed
+    """
+    unsummarized_questions = []
+    for message in reversed(dropped_messages):
+        if message['is_answer']:
+            continue
+        if message.get('summary'):
+            break
+        unsummarized_questions.append(message['question_id'])
+    else:
+        # No summary covers the left out turns
+        return unsummarized_questions[0] if unsummarized_questions else None
+    if len(unsummarized_questions) >= settings.SUMMARY_INTERVAL:
+        return unsummarized_questions[0]
+    return None
+
+
+def request_summary(question_id: uuid.UUID) -> bool:
+    """
+    Asks the AI service to summarise the conversation up to and including an answered
+    question. The previous summary of the session is extended with the turns after it, at
+    most SUMMARY_MAX_TURNS. The AI service posts the summary back to the summary endpoint.
+
+        Args:
+            question_id (uuid): ID of the question
+        Returns:
+            bool: True if the summary was requested, False if there is nothing to summarise
+        Raises:
+            TextGenerationBusyError: If the AI service queue is full
+    """
+    question = Question.objects.filter(question_id=question_id).first()
+    if question is None:
+        return False
+
+    session_questions = Question.objects.filter(session=question.session,
+                                                created_at__lte=question.created_at)
+    previous = session_questions.filter(created_at__lt=question.created_at,
+                                        summary__isnull=False).order_by('-created_at').first()
+    if previous is not None:
+        session_questions = session_questions.filter(created_at__gt=previous.created_at)
+
+    turns = []
+    for turn_question in session_questions.order_by('-created_at')[:settings.SUMMARY_MAX_TURNS]:
+        answer = turn_question.answer_set.first()
+        if answer is not None and answer.content is not None:
+            turns.append((turn_question.content, answer.content))
+    if not turns:
+        return False
+
+    model = LLM.objects.get(name=settings.SUMMARY_MODEL) if settings.SUMMARY_MODEL \
+        else LLM.objects.get(active=True)
+    text_adapter.update_model(model=model)
+    status_code = text_adapter.get_background(
+        prompt=get_summary_prompt(previous.summary if previous else None, turns[::-1]),
+        session_id=str(question.session.session_id),
+        message_id=str(question.question_id),
+        options={
+            "callback": "summary",
+            "max_tokens": settings.SUMMARY_MAX_TOKENS,
+            "stop": [QUESTION_MARKER]
+        }
+    )
+    return status_code == 200
+
+
+def save_summary(question_id: uuid.UUID, summary: str):
+    """
+    Stores the summary of the conversation up to and including a question.
+
+        Args:
+            question_id (uuid): ID of the question
+            summary (str): Generated summary
+    """
+    Question.objects.filter(question_id=question_id).update(summary=summary.strip() or None)
@@ -0,0 +1,81 @@
+"""
+Functions for counting tokens with the SentencePiece model of the LLM
+"""
+import logging
+import os
+from functools import lru_cache
+from django.conf import settings
+from api.utils.aiservice_tokenize import TokenizeAdapter
+
+try:
+    from sentencepiece import SentencePieceProcessor
+except ImportError:
+    # Tokens are counted by the AI service instead
+    SentencePieceProcessor = None
+
+logger = logging.getLogger(__name__)
+
+tokenize_adapter = TokenizeAdapter()
+
+
+@lru_cache(maxsize=None)
+def _load_tokenizer(model_file: str) -> SentencePieceProcessor:
+    """
+    Loads the tokenizer model. The model is loaded once per worker and reused afterwards.
+
+        Args:
+            model_file (str): SentencePiece model file
+        Returns:
+            SentencePieceProcessor: Tokenizer model, None if the file does not exist
+    """
+    if not os.path.isfile(model_file):
+        logger.warning("Tokenizer model %s not found, counting tokens with the AI service",
+                       model_file)
+        return None
+    return SentencePieceProcessor(model_file=model_file)
+
+
+def get_tokenizer() -> SentencePieceProcessor:
+    """
+    Gets the local tokenizer model if TOKENIZER_MODEL_PATH is set and sentencepiece is
+    installed.
+
+        Returns:
+            SentencePieceProcessor: Tokenizer model, None if tokens are counted by the AI service
+    """
+    if settings.TOKENIZER_MODEL_PATH is None or SentencePieceProcessor is None:
+        return None
+    return _load_tokenizer(settings.TOKENIZER_MODEL_PATH)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text, locally if possible and by the AI service otherwise.
+
+        Args:
+            text (str): Text to count tokens of
+        Returns:
+            int: Number of tokens
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return tokenize_adapter.get(text)
+    return len(tokenizer.encode(text))
+
+
+def count_tokens_batch(texts: list) -> list:
+    """
+    Counts the tokens of each text, locally if possible and with a single request to the AI
+    service otherwise.
+
+        Args:
+            texts (list): Texts to count tokens of
+        Returns:
+            list: Number of tokens of each text
+    """
+    if not texts:
+        return []
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return tokenize_adapter.get_batch(texts)
+    return [len(tokens) for tokens in tokenizer.encode(texts)]
@@ -1,4 +1,4 @@
-from api.views.aiservice import question, answer
+from api.views.aiservice import question, answer, cancellation, answer_cache_stats, summary
 from api.views.context import sources
 from api.views.chat_session import (
     creation,
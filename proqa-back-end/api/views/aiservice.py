@@ -2,20 +2,25 @@
 Endpoints that are used to communicate with the LLM.
 """
 import uuid
-from rest_framework.decorators import api_view
+from django.conf import settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from api.models import ChatSession, Question, Answer, Chunk, LLM, PromptTemplate
+from api.models import ChatSession, Question, Answer, LLM, PromptTemplate
+from api.utils import answer_cache
 from api.utils.aiservice import PromptBuilder
-from api.utils.aiservice_text import TextAdapter
-from api.utils.aiservice_embedding import EmbeddingAdapter
-from api.utils.aiservice_tokenize import TokenizeAdapter
+from api.utils.aiservice_text import TextAdapter, TextGenerationBusyError
+from api.utils.aiservice_embedding import EmbeddingAdapter, decay_embeddings
 from api.utils.chat_session import get_raw_messages
-from api.utils.context import get_context_uuid
+from api.utils.context import get_context_chunks, pack_context, resolve_chunks
+from api.utils.references import add_references
+from api.utils.summary import get_question_to_summarize, save_summary
+from api.utils.tokenizer import count_tokens, count_tokens_batch
+from api.tasks import summarize_question
 from api.utils.vectordb import VECTORDB_CLIENT
 
 embedding_adapter = EmbeddingAdapter()
 text_adapter = TextAdapter()
-tokenize_adapter = TokenizeAdapter()
 
 @api_view(['POST'])
 def question(request) -> Response:
@@ -25,62 +30,253 @@ def question(request) -> Response:
         Args:
             request (Request): API request
         Returns:
-            Response: JSON of format {"context", "source", "answer_id"} if AI service is available
+            Response: JSON of format {"context", "source", "answer_id"} if AI service is available,
+            with null context and source if no context was found and with the "answer" if it
+            was cached, 503 with a Retry-After header if it is busy
     """
     question_text = request.data['question']
-    chat_session_id = uuid.UUID(request.data['session'])
-    session = ChatSession.objects.get(session_id=chat_session_id)
-    messages = get_raw_messages(chat_session_id)
+    session = ChatSession.objects.get(session_id=uuid.UUID(request.data['session']))
+    messages = get_raw_messages(session.session_id)
 
     # save question to DB
-    question_obj = Question(summary="summary",
-                            session=session,
-                            content=question_text)
+    question_obj = Question(session=session,
+                            content=question_text,
+                            token_size=count_tokens(question_text))
     question_obj.save()
 
-    # Get embedding of question
-    question_embedding = embedding_adapter.batch_get(messages=messages, last_question=question_text)
-
-    # Query vector DB with embedding of question
-    chunk_id = get_context_uuid(VECTORDB_CLIENT, question_embedding)
-    chunk = Chunk.objects.get(chunk_id=chunk_id)
-    # Increment number of chunk references
-    chunk.times_referenced += 1
-    chunk.save()
+    question_embedding, query_weight = _embed_question(question_obj, messages)
 
     # get the active model
     model = LLM.objects.get(active=True)
     text_adapter.update_model(model=model)
 
-    # Update the active prompt in the prompt builder and build prompt.
     prompt_template = PromptTemplate.objects.get(active=True)
-    prompt_builder = PromptBuilder(prompt_template, tokenize_adapter.get, model.context_size)
 
-    prompt = prompt_builder.get_prompt(
-        messages, question_text, chunk.content
+    # Query vector DB with embedding of question and use the best chunks that fit
+    # No chunks are found when the matching chunks were deleted or the collections are empty,
+    # the question is then answered without context
+    context, chunks = pack_context(
+        get_context_chunks(VECTORDB_CLIENT, question_embedding, settings.CONTEXT_TOP_K),
+        prompt_template.context_tokens
     )
 
+    # A first question does not depend on history, so a similar question may be answered already
+    if not messages:
+        answer_obj = _get_cached_answer(question_obj, question_embedding, model,
+                                        prompt_template, chunks)
+        if answer_obj is not None:
+            _save_context(answer_obj, chunks)
+            _save_query_embedding(session, question_embedding, query_weight)
+            # The answer is complete, so it is returned instead of streamed
+            response = _question_response(question_obj, answer_obj, chunks)
+            response.data["answer"] = answer_obj.content
+            return response
+
     # save temporary answer object
     answer_obj = Answer(question=question_obj,
-                        session=session, context=chunk, model=model)
+                        session=session, model=model, template=prompt_template)
     answer_obj.save()
 
     # Send prompt to AI service and get answer
-    status_code = text_adapter.get(channel=request.user.username,
+    try:
+        prompt_builder = _send_prompt(request.user.username, answer_obj, messages,
+                                      question_text, context)
+    except TextGenerationBusyError as exception:
+        # The question will be asked again, so do not keep it in the session
+        answer_obj.delete()
+        question_obj.delete()
+        return _busy_response(exception)
+
+    response = _question_response(question_obj, answer_obj, chunks)
+
+    # Link the answer to its chunks once the prompt is sent, so generation does not wait for it
+    chunks = _save_context(answer_obj, chunks)
+    _save_query_embedding(session, question_embedding, query_weight)
+    _summarize(prompt_builder.dropped_messages)
+
+    if not messages:
+        answer_cache.add(answer_obj, question_text, question_embedding, chunks)
+
+    return response
+
+
+def _embed_question(question_obj: Question, messages: list) -> tuple:
+    """
+    Embeds a saved question and adds it to the decayed embedding of the questions of its
+    session.
+
+        Args:
+            question_obj (Question): Saved question
+            messages (list): Messages in the session before the question, as returned by
+                             `get_raw_messages()`
+        Returns:
+            tuple: Embedding of the questions of the session weighted towards the question,
+            and the sum of the weights of the questions
+    """
+    session = question_obj.session
+
+    # Sessions started before question embeddings were stored embed their history once
+    if session.query_embedding is None and \
+            any(not message['is_answer'] for message in messages):
+        texts = [message['content'] for message in messages if not message['is_answer']]
+        _, embeddings = embedding_adapter.get_batch(texts=texts)
+        session.query_embedding, session.query_weight = decay_embeddings(embeddings)
+
+    # Get embedding of question and add it to the decayed embedding of the session
+    embedding, question_embedding, query_weight = embedding_adapter.get_query(
+        question_obj.content, session.query_embedding, session.query_weight)
+    question_obj.embedding = embedding
+    question_obj.save(update_fields=["embedding"])
+    return question_embedding, query_weight
+
+
+def _get_cached_answer(question_obj: Question, question_embedding: list, model: LLM,
+                       prompt_template: PromptTemplate, chunks: list) -> Answer:
+    """
+    Answers a question with the cached answer of a similar question, if there is one.
+
+        Args:
+            question_obj (Question): Saved question
+            question_embedding (list): Embedding the context was retrieved with
+            model (LLM): Active model
+            prompt_template (PromptTemplate): Active prompt template
+            chunks (list): Chunks used in the context
+        Returns:
+            Answer: Saved answer, None if no similar question was answered
+    """
+    cached_answer = answer_cache.lookup(question_embedding, model, prompt_template, chunks)
+    if cached_answer is None:
+        return None
+    answer_obj = Answer(question=question_obj, session=question_obj.session,
+                        model=model, template=prompt_template,
+                        content=cached_answer.content,
+                        token_size=count_tokens(cached_answer.content))
+    answer_obj.save()
+    return answer_obj
+
+
+def _send_prompt(channel: str, answer_obj: Answer, messages: list, question_text: str,
+                 context: str) -> PromptBuilder:
+    """
+    Builds the prompt for a question and sends it to the AI service, which streams the
+    answer to the channel.
+
+        Args:
+            channel (str): Channel to stream the answer to
+            answer_obj (Answer): Saved answer with the model and template to answer with
+            messages (list): Messages in the session before the question, as returned by
+                             `get_raw_messages()`
+            question_text (str): Question to ask
+            context (str): Context with which to answer the question
+        Returns:
+            PromptBuilder: Prompt builder the prompt was built with
+        Raises:
+            TextGenerationBusyError: If the AI service queue is full
+            ConnectionError: If the AI service is not available
+    """
+    prompt_builder = PromptBuilder(answer_obj.template, count_tokens, answer_obj.model.context_size,
+                                   batch_tokenizer=count_tokens_batch,
+                                   answer_tokens=answer_obj.model.max_tokens)
+    prompt = prompt_builder.get_prompt(messages, question_text, context)
+
+    status_code = text_adapter.get(channel=channel,
                                    prompt=prompt,
-                                   session_id=str(chat_session_id),
-                                   message_id=str(answer_obj.answer_id))
+                                   session_id=str(answer_obj.session.session_id),
+                                   message_id=str(answer_obj.answer_id),
+                                   options={
+                                       "prefix": prompt_builder.get_prefix(),
+                                       "stop": answer_obj.template.get_stop_sequences()
+                                   })
 
     # Raise exception in case the AI service is not available
     if status_code != 200:
         raise ConnectionError("AI service not available.")
+    return prompt_builder
+
+
+def _busy_response(exception: TextGenerationBusyError) -> Response:
+    """
+    Builds the response to a question the AI service has no room for.
+
+        Args:
+            exception (TextGenerationBusyError): Error raised by the text adapter
+        Returns:
+            Response: 503 with a Retry-After header if the AI service gave a delay
+    """
+    headers = {"Retry-After": exception.retry_after} if exception.retry_after else None
+    return Response({"detail": str(exception)}, status=503, headers=headers)
+
 
-    return Response({"context": chunk.content,
-                     "source": chunk.source.file_name,
+def _question_response(question_obj: Question, answer_obj: Answer, chunks: list) -> Response:
+    """
+    Builds the response to a question that is being answered.
+
+        Args:
+            question_obj (Question): Saved question
+            answer_obj (Answer): Saved answer
+            chunks (list): Chunks used in the context, possibly built from search results
+        Returns:
+            Response: JSON of format {"context", "source", "question_id", "answer_id"}, with
+            the best chunk as context and source, both null if there is no context
+    """
+    chunk = chunks[0] if chunks else None
+    return Response({"context": chunk.content if chunk else None,
+                     "source": chunk.source.file_name if chunk else None,
                      "question_id": question_obj.question_id,
                      "answer_id": answer_obj.answer_id})
 
 
+def _save_context(answer_obj: Answer, chunks: list) -> list:
+    """
+    Links an answer to the chunks used as its context and increments their number of
+    references.
+
+        Args:
+            answer_obj (Answer): Saved answer
+            chunks (list): Chunks used in the context, possibly built from search results
+        Returns:
+            list: Stored chunks used in the context
+    """
+    chunks = resolve_chunks(chunks)
+    if not chunks:
+        return chunks
+    answer_obj.context = chunks[0]
+    answer_obj.save(update_fields=["context"])
+    answer_obj.chunks.set(chunks)
+    add_references(chunks)
+    return chunks
+
+
+def _save_query_embedding(session: ChatSession, query_embedding: list, query_weight: float):
+    """
+    Stores the decayed embedding of the questions of a session once its last question is
+    answered, so the next question only needs its own embedding.
+
+        Args:
+            session (ChatSession): Session the question was asked in
+            query_embedding (list): Weighted embedding of the questions of the session
+            query_weight (float): Sum of the weights of the questions
+    """
+    session.query_embedding = query_embedding
+    session.query_weight = query_weight
+    session.save(update_fields=["query_embedding", "query_weight"])
+
+
+def _summarize(dropped_messages: list):
+    """
+    Schedules the summary of the conversation when turns no longer fit in the prompt, so
+    later prompts can include it in their place.
+
+        Args:
+            dropped_messages (list): Messages left out of the prompt
+    """
+    if not settings.SUMMARIZE_HISTORY:
+        return
+    question_id = get_question_to_summarize(dropped_messages)
+    if question_id is not None:
+        summarize_question.delay(str(question_id))
+
+
 @api_view(['POST'])
 def answer(request) -> Response:
     """
@@ -88,15 +284,72 @@ def answer(request) -> Response:
     Strictly used for saving the answer to the DB.
 
         Args:
-            request (Request): API request
+            request (Request): API request with the answer and the answer id
         Returns:
-            Response: Empty response
+            Response: Empty response, 404 if the answer was deleted meanwhile
     """
-    session_id = uuid.UUID(request.data["session_id"])
     answer_text = request.data["answer"]
-    answer_obj = ChatSession.objects.get(
-        session_id=session_id).answer_set.last()
+    # Answers of a session can complete in any order, so the answer is found by its id
+    answer_obj = Answer.objects.filter(answer_id=uuid.UUID(request.data["message_id"])).first()
+    if answer_obj is None:
+        return Response(status=404)
     answer_obj.content = answer_text
-    answer_obj.save()
+    answer_obj.token_size = count_tokens(answer_text)
+    # The context may be saved concurrently by the question endpoint
+    answer_obj.save(update_fields=["content", "token_size"])
+    answer_cache.complete(answer_obj)
 
     return Response()
+
+
+@api_view(['POST'])
+def summary(request) -> Response:
+    """
+    Endpoint for receiving the summary of a conversation from the AI service.
+    Strictly used for saving the summary to the DB.
+
+        Args:
+            request (Request): API request with the summary and the question id
+        Returns:
+            Response: Empty response
+    """
+    save_summary(uuid.UUID(request.data["message_id"]), request.data["answer"])
+
+    return Response()
+
+
+@api_view(['POST'])
+def cancellation(request) -> Response:
+    """
+    Endpoint for cancelling the generation of an answer, e.g. when the client closes its
+    text stream.
+
+        Args:
+            request (Request): API request with answer id
+        Returns:
+            Response: "cancelled" if the generation was cancelled, "not cancelled" otherwise
+    """
+    answer_uuid = uuid.UUID(request.data["answer_id"])
+    answer_obj = Answer.objects.get(answer_id=answer_uuid)
+
+    # Only the author can cancel and complete answers are not generated anymore
+    if answer_obj.session.author != request.user or answer_obj.content is not None:
+        return Response({"status": "not cancelled"})
+
+    status_code = text_adapter.cancel(str(answer_uuid))
+    return Response({"status": "cancelled"}) if status_code == 200 \
+        else Response({"status": "not cancelled"})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def answer_cache_stats(request) -> Response:
+    """
+    Endpoint for the size and hit rate of the answer cache.
+
+        Args:
+            request (Request): API request
+        Returns:
+            Response: JSON of format {"size", "max_size", "hits", "misses", "hit_rate"}
+    """
+    return Response(answer_cache.get_stats())
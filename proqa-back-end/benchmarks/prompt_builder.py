@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of prompt construction for long chat sessions.
+
+Run from the proqa-back-end directory with the backend environment variables set:
+    python benchmarks/prompt_builder.py
+"""
+import os
+import sys
+import timeit
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "proqa_back_end.settings")
+django.setup()
+
+# pylint: disable=wrong-import-position
+from api.models import PromptTemplate
+from api.utils.aiservice import PromptBuilder
+
+TURNS = 100
+REPEATS = 200
+CONTEXT = "The firmware of the printer can be updated from the maintenance menu. " * 20
+
+
+def count_words(text: str) -> int:
+    """
+    Stand-in tokenizer counting words, so only the prompt builder is measured.
+    """
+    return len(text.split())
+
+
+def count_words_batch(texts: list) -> list:
+    """
+    Stand-in batch tokenizer counting words.
+    """
+    return [count_words(text) for text in texts]
+
+
+def get_messages(stored_counts: bool) -> list:
+    """
+    Creates the messages of a session with TURNS questions and answers.
+    """
+    messages = []
+    for turn in range(TURNS):
+        question = {"is_answer": False, "content": f"How do I update firmware {turn}?",
+                    "context": CONTEXT}
+        answer = {"is_answer": True, "content": f"Open the maintenance menu {turn}. " * 10}
+        if stored_counts:
+            question["token_size"] = count_words(question["content"])
+            question["context_token_size"] = count_words(CONTEXT)
+            answer["token_size"] = count_words(answer["content"])
+        messages += [question, answer]
+    return messages
+
+
+def main():
+    """
+    Times building a prompt for a session with and without stored token counts.
+    """
+    template = PromptTemplate(
+        name="benchmark",
+        instruction="Answer the question using the context.",
+        question_format="### Question: {question}\n### Context: {context}",
+        answer_format="### Answer: {answer}"
+    )
+    prompt_builder = PromptBuilder(template, count_words, 2048,
+                                   batch_tokenizer=count_words_batch, answer_tokens=256)
+    for stored_counts in (False, True):
+        messages = get_messages(stored_counts)
+        seconds = timeit.timeit(
+            lambda messages=messages: prompt_builder.get_prompt(
+                messages, "How do I reset the printer?", CONTEXT),
+            number=REPEATS
+        )
+        label = "stored token counts" if stored_counts else "tokenized messages"
+        print(f"{TURNS} turns, {label}: {seconds / REPEATS * 1000:.3f} ms per prompt")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,9 @@ if [[ -z "${CELERY+x}" ]]; then
   echo "Not Celery, continuing"
 else
   if [[ -z "${DEV}" ]]; then
-    celery -A proqa_back_end worker -l INFO
+    celery -A proqa_back_end worker -B -l INFO
   else
-    watchfiles --filter python 'celery -A proqa_back_end worker -l INFO' api proqa_back_end
+    watchfiles --filter python 'celery -A proqa_back_end worker -B -l INFO' api proqa_back_end
   fi
   exit 0
 fi
@@ -181,6 +181,40 @@ AI_SERVICE_URL = env("AI_SERVICE_URL")
 EMBEDDING_SIZE = env("EMBEDDING_SIZE")
 QDRANT_URL = env("QDRANT_URL")
 DECAY_SCALAR = env.float("DECAY_SCALAR")
+EMBEDDING_BATCH_SIZE = env.int("EMBEDDING_BATCH_SIZE", default=64)
+# Number of best matching chunks considered for the context of a question
+CONTEXT_TOP_K = env.int("CONTEXT_TOP_K", default=4)
+# Number of collections searched concurrently
+VECTORDB_SEARCH_THREADS = env.int("VECTORDB_SEARCH_THREADS", default=16)
+# Routing of questions to the collections with the closest centroids. Questions are sent to
+# COLLECTION_FAN_OUT collections, or all if 0, unless the best left out collection is within
+# COLLECTION_ROUTING_MARGIN similarity of the last one.
+COLLECTION_CENTROIDS = env.int("COLLECTION_CENTROIDS", default=8)
+COLLECTION_FAN_OUT = env.int("COLLECTION_FAN_OUT", default=3)
+COLLECTION_ROUTING_MARGIN = env.float("COLLECTION_ROUTING_MARGIN", default=0.05)
+# SentencePiece model of the LLM to count tokens locally, the AI service counts them if unset
+TOKENIZER_MODEL_PATH = env("TOKENIZER_MODEL_PATH", default=None)
+
+# Conversation summary settings, SUMMARY_MODEL is the name of the LLM to summarise with, the
+# active LLM if unset
+SUMMARIZE_HISTORY = env.bool("SUMMARIZE_HISTORY", default=True)
+SUMMARY_MODEL = env("SUMMARY_MODEL", default=None)
+SUMMARY_MAX_TOKENS = env.int("SUMMARY_MAX_TOKENS", default=128)
+SUMMARY_MAX_TURNS = env.int("SUMMARY_MAX_TURNS", default=4)
+# Once turns no longer fit in the prompt, the conversation is summarised again after every
+# SUMMARY_INTERVAL turns that are left out
+SUMMARY_INTERVAL = env.int("SUMMARY_INTERVAL", default=SUMMARY_MAX_TURNS)
+
+# Answer cache settings, a size of 0 disables the cache
+ANSWER_CACHE_SIZE = env.int("ANSWER_CACHE_SIZE", default=1000)
+ANSWER_CACHE_THRESHOLD = env.float("ANSWER_CACHE_THRESHOLD", default=0.95)
+
+# Chunk reference counts are buffered in this Redis DB and flushed periodically,
+# without it they are written to the DB directly
+REFERENCE_BUFFER_URL = env("REFERENCE_BUFFER_URL", default=None)
+REFERENCE_FLUSH_INTERVAL = env.float("REFERENCE_FLUSH_INTERVAL", default=10.0)
+# Time after which the lock of a flush that did not complete expires
+REFERENCE_FLUSH_TIMEOUT = env.int("REFERENCE_FLUSH_TIMEOUT", default=60)
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
@@ -189,3 +223,10 @@ CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_CACHE_BACKEND = 'django-cache'
+# Flush the buffered chunk references periodically, the worker runs celery beat
+CELERY_BEAT_SCHEDULE = {
+    "flush-chunk-references": {
+        "task": "api.tasks.flush_chunk_references",
+        "schedule": REFERENCE_FLUSH_INTERVAL,
+    },
+}
@@ -1,7 +1,17 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 from django.db.utils import IntegrityError
 from django.core.exceptions import ValidationError
-from api.models import Collection, PromptTemplate, LLM
+from api.models import (
+    Answer,
+    ChatSession,
+    Chunk,
+    Collection,
+    LLM,
+    PromptTemplate,
+    Question,
+    Source
+)
 
 
 class ExampleTest(TestCase):
@@ -95,6 +105,16 @@ class TestPromptTemplate(TestCase):
         with self.assertRaises(IntegrityError):
             prompt2.save()
 
+    def test_stop_sequences(self):
+        """Test that the turn marker of the question format and the separator stop answers."""
+        prompt_template = PromptTemplate(name="test",
+                                         instruction="test_instruction",
+                                         question_format="\n### Human: {context} {question}",
+                                         answer_format=r"### Assistant: {answer}",
+                                         separator=" </s>")
+        self.assertEqual(prompt_template.get_stop_sequences(), ["### Human:", "</s>"])
+        self.assertEqual(self.prompt_template.get_stop_sequences(), [])
+
 
 class TestLLM(TestCase):
     """Test LLM model class."""
@@ -116,3 +136,32 @@ class TestLLM(TestCase):
 
         with self.assertRaises(IntegrityError):
             model2.save()
+
+    def test_stop_sequences(self):
+        """Test that the stop sequences of a model are read one per line."""
+        model = LLM(name="model", stop_sequences="### Human:\n\n  </s> \n")
+        self.assertEqual(model.get_stop_sequences(), ["### Human:", "</s>"])
+
+
+class TestChunkModel(TestCase):
+    """Test chunk model class."""
+
+    def setUp(self):
+        collection = Collection.objects.create(name="test", file_path="path/path")
+        source = Source.objects.create(collection=collection, file_name="file", file_type="pdf")
+        self.chunk = Chunk.objects.create(source=source, content="content")
+        self.session = ChatSession.objects.create(
+            author=User.objects.create_user(username="user"))
+        self.question = Question.objects.create(session=self.session, content="question")
+
+    def test_votes_of_additional_context(self):
+        """Test that answers using the chunk as additional context count towards its votes."""
+        best_match = Answer.objects.create(question=self.question, session=self.session,
+                                           context=self.chunk, rating=1)
+        best_match.chunks.add(self.chunk)
+        additional = Answer.objects.create(question=self.question, session=self.session,
+                                           rating=-1)
+        additional.chunks.add(self.chunk)
+
+        self.assertEqual(self.chunk.upvotes, 1)
+        self.assertEqual(self.chunk.downvotes, 1)
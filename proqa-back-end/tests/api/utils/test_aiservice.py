@@ -1,11 +1,13 @@
 """
 Test cases for api/utils/aiservice.py
 """
-from django.test import TestCase
-from api.utils.aiservice_text import TextAdapter
-from api.utils.aiservice_embedding import EmbeddingAdapter
-from api.utils.aiservice import PromptBuilder
-from api.models import PromptTemplate
+from unittest.mock import MagicMock, patch
+from django.test import TestCase, override_settings
+from api.utils.aiservice_text import TextAdapter, TextGenerationBusyError
+from api.utils.aiservice_embedding import EmbeddingAdapter, decay_embeddings, \
+    update_decayed_embedding
+from api.utils.aiservice import PromptBuilder, SUMMARY_FORMAT
+from api.models import LLM, PromptTemplate, HistoryModes
 from tests.api.resources import constants as c
 
 
@@ -17,6 +19,7 @@ class TestAIServiceUtils(TestCase):
     def setUp(self):
         self.embedding_adapter = EmbeddingAdapter()
         self.text_adapter = TextAdapter()
+        self.text_adapter.update_model(LLM(name="model"))
         # Pass in a mock tokenizer.
         self.prompt_template = PromptTemplate(
             name="test",
@@ -37,6 +40,85 @@ class TestAIServiceUtils(TestCase):
         self.assertEqual(text, response.json()['text'])
         self.assertEqual(embedding, response.json()['embedding'])
 
+    @override_settings(EMBEDDING_BATCH_SIZE=2)
+    def test_embedding_get_batch(self):
+        """
+        Tests get_batch from EmbeddingAdapter splits texts into batch requests
+        """
+        def make_batch_request(texts):
+            response = MagicMock()
+            response.json.return_value = {
+                'texts': texts, 'embeddings': [[len(text)] for text in texts]
+            }
+            return response
+
+        texts = ["a", "bb", "ccc"]
+        with patch.object(self.embedding_adapter, '_make_batch_request',
+                          side_effect=make_batch_request) as mock_request:
+            result_texts, embeddings = self.embedding_adapter.get_batch(texts)
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(result_texts, texts)
+        self.assertEqual(embeddings, [[1], [2], [3]])
+
+    @override_settings(DECAY_SCALAR=0.5)
+    def test_update_decayed_embedding(self):
+        """
+        Tests adding questions one by one gives the same weighted embedding as weighing
+        all questions at once
+        """
+        embeddings = [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]
+        query_embedding, weight = None, 0.0
+        for embedding in embeddings:
+            query_embedding, weight = update_decayed_embedding(embedding, query_embedding, weight)
+
+        expected_embedding, expected_weight = decay_embeddings(embeddings)
+        self.assertEqual(weight, expected_weight)
+        for value, expected_value in zip(query_embedding, expected_embedding):
+            self.assertAlmostEqual(value, expected_value)
+
+    @override_settings(DECAY_SCALAR=0.5)
+    def test_embedding_get_query(self):
+        """
+        Tests get_query from EmbeddingAdapter embeds only the last question
+        """
+        response = MagicMock()
+        response.json.return_value = {'text': "question", 'embedding': [0.0, 1.0]}
+        with patch.object(self.embedding_adapter, '_make_request',
+                          return_value=response) as mock_request:
+            embedding, query_embedding, weight = self.embedding_adapter.get_query(
+                "question", [1.0, 0.0], 1.0)
+        mock_request.assert_called_once_with(text="question")
+        self.assertEqual(embedding, [0.0, 1.0])
+        self.assertEqual(weight, 1.5)
+        self.assertAlmostEqual(query_embedding[0], 1 / 3)
+        self.assertAlmostEqual(query_embedding[1], 2 / 3)
+
+    def test_text_get_busy(self):
+        """
+        Tests get from TextAdapter raises with the retry delay when the AI service is busy
+        """
+        response = MagicMock(status_code=503, headers={"Retry-After": "30"})
+        with patch.object(self.text_adapter, '_make_request', return_value=response):
+            with self.assertRaises(TextGenerationBusyError) as context:
+                self.text_adapter.get("channel", "prompt", "session", "message")
+        self.assertEqual(context.exception.retry_after, "30")
+
+    def test_text_get_background(self):
+        """
+        Tests get_background from TextAdapter sends a low priority request without streaming
+        """
+        response = MagicMock(status_code=200)
+        with patch.object(self.text_adapter, '_make_request',
+                          return_value=response) as mock_make_request:
+            self.text_adapter.get_background("prompt", "session", "message",
+                                             {"callback": "summary", "max_tokens": 64})
+        request = mock_make_request.call_args.args[0]
+        self.assertEqual(request["priority"], 1)
+        self.assertFalse(request["stream"])
+        self.assertEqual(request["callback"], "summary")
+        self.assertEqual(request["model_settings"]["max_tokens"], 64)
+        self.assertEqual(request["streaming_settings"], {"channel": "", "session_id": "session"})
+
     def test_prompt_builder(self):
         """
         Tests PromptBuilder
@@ -46,3 +128,145 @@ class TestAIServiceUtils(TestCase):
             c.TEST_CONTEXT
         )
         self.assertEqual(prompt, c.TEST_PROMPT)
+
+    def test_prompt_builder_batch_tokenizer(self):
+        """
+        Tests PromptBuilder counts all parts of the prompt with a single batch tokenizer call,
+        followed by a call for the whole prompt
+        """
+        batch_tokenizer = MagicMock(side_effect=lambda texts: [len(t.split()) for t in texts])
+        prompt_builder = PromptBuilder(self.prompt_template, lambda text: len(text.split()),
+                                       batch_tokenizer=batch_tokenizer)
+        prompt = prompt_builder.get_prompt(
+            c.TEST_MESSAGES, c.TEST_QUESTION,
+            c.TEST_CONTEXT
+        )
+        self.assertEqual(prompt, c.TEST_PROMPT)
+        self.assertEqual(batch_tokenizer.call_count, 2)
+        batch_tokenizer.assert_called_with([prompt])
+
+    def test_prompt_builder_stored_token_sizes(self):
+        """
+        Tests PromptBuilder does not tokenize messages with stored token counts
+        """
+        batch_tokenizer = MagicMock(side_effect=lambda texts: [len(t.split()) for t in texts])
+        prompt_builder = PromptBuilder(self.prompt_template, lambda text: len(text.split()),
+                                       batch_tokenizer=batch_tokenizer)
+        messages = [
+            dict(c.TEST_MESSAGES[0], token_size=1, context_token_size=1),
+            dict(c.TEST_MESSAGES[1], token_size=1),
+        ]
+        prompt = prompt_builder.get_prompt(
+            messages, c.TEST_QUESTION,
+            c.TEST_CONTEXT
+        )
+        self.assertEqual(prompt, c.TEST_PROMPT)
+        tokenized_texts = batch_tokenizer.call_args_list[0].args[0]
+        self.assertEqual(len(tokenized_texts), 5)
+        self.assertNotIn("test-answer-1.", " ".join(tokenized_texts))
+
+    def test_prompt_builder_budget(self):
+        """
+        Tests PromptBuilder uses the newest messages that fit in the context window after
+        reserving the answer tokens
+        """
+        # instruction (5), empty answer (3), question (19) and overhead (7) take 34 tokens,
+        # the last answer message with its newline takes 5
+        prompt_builder = PromptBuilder(self.prompt_template, lambda text: len(text.split()), 40,
+                                       answer_tokens=1)
+        prompt = prompt_builder.get_prompt(c.TEST_MESSAGES, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertIn("The answer is test-answer-1.", prompt)
+        self.assertNotIn("test-question-1?", prompt)
+
+        prompt_builder.budget.answer_tokens = 2
+        prompt = prompt_builder.get_prompt(c.TEST_MESSAGES, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertNotIn("test-answer-1.", prompt)
+
+    def test_prompt_builder_whole_prompt_fits(self):
+        """
+        Tests PromptBuilder drops more turns when the whole prompt has more tokens than its
+        parts counted separately
+        """
+        # Every newline takes two tokens, one more than estimated for joining the parts
+        def tokenizer(text):
+            return len(text.split()) + 2 * text.count("\n")
+
+        messages = []
+        for turn in range(10):
+            messages.append({"is_answer": False, "content": f"q{turn}", "context": "c"})
+            messages.append({"is_answer": True, "content": f"a{turn}"})
+        prompt_builder = PromptBuilder(self.prompt_template, tokenizer, 100, answer_tokens=20)
+        prompt = prompt_builder.get_prompt(messages, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertLessEqual(tokenizer(prompt), 100 - 20)
+        self.assertIn("The answer is a9", prompt)
+        self.assertNotIn("q0", prompt)
+        dropped_size = len(prompt_builder.dropped_messages)
+        self.assertNotIn(messages[dropped_size - 1]["content"], prompt)
+        self.assertIn(messages[dropped_size]["content"], prompt)
+
+    def test_prompt_builder_no_contexts(self):
+        """
+        Tests PromptBuilder leaves out the contexts of past questions
+        """
+        self.prompt_template.history_mode = HistoryModes.NO_CONTEXTS
+        prompt_builder = PromptBuilder(self.prompt_template, lambda text: len(text.split()))
+        prompt = prompt_builder.get_prompt(c.TEST_MESSAGES, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertNotIn("context-1.", prompt)
+        self.assertIn("The question is test-question-1? and the context is", prompt)
+        self.assertIn(c.TEST_CONTEXT, prompt)
+
+    def test_prompt_builder_distinct_contexts(self):
+        """
+        Tests PromptBuilder only keeps the context of the latest question using it
+        """
+        self.prompt_template.history_mode = HistoryModes.DISTINCT_CONTEXTS
+        prompt_builder = PromptBuilder(self.prompt_template, lambda text: len(text.split()))
+        messages = [
+            {"is_answer": False, "content": "q1", "context": "context-1."},
+            {"is_answer": True, "content": "a1"},
+            {"is_answer": False, "content": "q2", "context": "context-2."},
+            {"is_answer": True, "content": "a2"},
+            {"is_answer": False, "content": "q3", "context": "context-1."},
+            {"is_answer": True, "content": "a3"},
+            {"is_answer": False, "content": "q4", "context": c.TEST_CONTEXT},
+            {"is_answer": True, "content": "a4"},
+        ]
+        prompt = prompt_builder.get_prompt(messages, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertEqual(prompt.count("context-1."), 1)
+        self.assertIn("q3 and the context is context-1.", prompt)
+        self.assertIn("q2 and the context is context-2.", prompt)
+        self.assertEqual(prompt.count(c.TEST_CONTEXT), 1)
+
+    def test_prompt_builder_summary(self):
+        """
+        Tests PromptBuilder puts the summary of the dropped turns in their place
+        """
+        messages = [
+            {"is_answer": False, "content": "q1", "context": "c1", "summary": "s1"},
+            {"is_answer": True, "content": "a1"},
+            {"is_answer": False, "content": "q2", "context": "c2", "summary": "s2"},
+            {"is_answer": True, "content": "a2"},
+        ]
+        # instruction (5), empty answer (3), question (19) and overhead (7) take 34 tokens,
+        # the summary with its newline takes 8 and the last answer with its newline 5
+        prompt_builder = PromptBuilder(self.prompt_template, lambda text: len(text.split()), 47)
+        prompt = prompt_builder.get_prompt(messages, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertIn(SUMMARY_FORMAT.format(summary="s2") + "\nThe answer is a2", prompt)
+        self.assertNotIn("q2", prompt)
+        self.assertNotIn("s1", prompt)
+        self.assertEqual(prompt_builder.dropped_messages, messages[:3])
+
+        prompt_builder.budget.max_tokens = 2048
+        prompt = prompt_builder.get_prompt(messages, c.TEST_QUESTION, c.TEST_CONTEXT)
+        self.assertNotIn("Summary", prompt)
+        self.assertEqual(prompt_builder.dropped_messages, [])
+
+    def test_prompt_builder_prefix(self):
+        """
+        Tests the prompt built by PromptBuilder starts with its prefix
+        """
+        prompt = self.prompt_builder.get_prompt(
+            c.TEST_MESSAGES, c.TEST_QUESTION,
+            c.TEST_CONTEXT
+        )
+        self.assertTrue(prompt.startswith(self.prompt_builder.get_prefix()))
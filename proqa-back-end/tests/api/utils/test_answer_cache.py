@@ -0,0 +1,102 @@
+"""
+Test cases for api/utils/answer_cache.py
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from api.models import (
+    Answer,
+    CachedAnswer,
+    ChatSession,
+    Chunk,
+    Collection,
+    LLM,
+    PromptTemplate,
+    Question,
+    Source
+)
+from api.utils import answer_cache
+from tests.api.resources import constants as c
+
+
+@override_settings(ANSWER_CACHE_SIZE=10, ANSWER_CACHE_THRESHOLD=0.9)
+class TestAnswerCache(TestCase):
+    """
+    Test cases for api/utils/answer_cache.py
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.collection = Collection.objects.create(name=c.TEST_COLLECTION_NAME,
+                                                    file_path=c.TEST_FILE_PATH)
+        source = Source.objects.create(collection=self.collection,
+                                       file_name=c.TEST_SOURCE_FILENAME_A, file_type="pdf")
+        self.chunk = Chunk.objects.create(source=source, content=c.TEST_CONTEXT)
+        self.model = LLM.objects.create(name="model")
+        self.template = PromptTemplate.objects.create(
+            name="template", instruction=c.TEST_INSTRUCTION,
+            question_format=c.TEST_QUESTION_FORMAT, answer_format=c.TEST_ANSWER_FORMAT
+        )
+        session = ChatSession.objects.create(author=User.objects.create_user(username="user"))
+        question = Question.objects.create(session=session, content=c.TEST_QUESTION)
+        self.answer = Answer.objects.create(question=question, session=session,
+                                            model=self.model, template=self.template,
+                                            content="answer")
+
+    def _add(self, embedding: list) -> CachedAnswer:
+        answer_cache.add(self.answer, c.TEST_QUESTION, embedding, [self.chunk])
+        answer_cache.complete(self.answer)
+        return CachedAnswer.objects.get(answer=self.answer)
+
+    def test_lookup_given_similar_question_then_hit(self):
+        """
+        Tests a similar question with the same model, template and context is a hit
+        """
+        self._add([1.0, 0.0])
+        cached_answer = answer_cache.lookup([0.99, 0.1], self.model, self.template, [self.chunk])
+        self.assertEqual(cached_answer.content, "answer")
+        self.assertEqual(CachedAnswer.objects.get().hits, 1)
+
+    def test_lookup_given_different_question_or_template_then_miss(self):
+        """
+        Tests a dissimilar question or another template is a miss
+        """
+        self._add([1.0, 0.0])
+        other_template = PromptTemplate.objects.create(
+            name="other", instruction=c.TEST_INSTRUCTION,
+            question_format=c.TEST_QUESTION_FORMAT, answer_format=c.TEST_ANSWER_FORMAT
+        )
+        self.assertIsNone(answer_cache.lookup([0.0, 1.0], self.model, self.template,
+                                              [self.chunk]))
+        self.assertIsNone(answer_cache.lookup([1.0, 0.0], self.model, other_template,
+                                              [self.chunk]))
+        self.assertEqual(answer_cache.get_stats()["misses"], 2)
+
+    def test_lookup_given_pending_answer_then_miss(self):
+        """
+        Tests an answer that is still being generated is not used
+        """
+        answer_cache.add(self.answer, c.TEST_QUESTION, [1.0, 0.0], [self.chunk])
+        self.assertIsNone(answer_cache.lookup([1.0, 0.0], self.model, self.template,
+                                              [self.chunk]))
+
+    def test_lookup_given_rebuilt_collection_then_miss(self):
+        """
+        Tests cached answers are invalidated when their collection is rebuilt
+        """
+        self._add([1.0, 0.0])
+        answer_cache.invalidate_collection(self.collection)
+        self.assertFalse(CachedAnswer.objects.exists())
+
+    @override_settings(ANSWER_CACHE_SIZE=1)
+    def test_add_given_full_cache_then_evict(self):
+        """
+        Tests the least recently used answer is evicted when the cache is full
+        """
+        old_answer = self._add([1.0, 0.0])
+        self.answer = Answer.objects.create(question=self.answer.question,
+                                            session=self.answer.session, model=self.model,
+                                            template=self.template, content="new")
+        new_answer = self._add([0.0, 1.0])
+        self.assertFalse(CachedAnswer.objects.filter(pk=old_answer.pk).exists())
+        self.assertTrue(CachedAnswer.objects.filter(pk=new_answer.pk).exists())
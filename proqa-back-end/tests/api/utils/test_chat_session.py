@@ -130,6 +130,12 @@ class TestChatSessionTool(TestCase):
         messages = get_raw_messages(self.session_id)
         self.assertEqual(len(messages), 2)
 
+        # Cancelled answers are left out with their question
+        cancelled_question = Question.objects.create(session=self.session, content="Cancelled")
+        Answer.objects.create(question=cancelled_question, session=self.session,
+                              context=self.chunk)
+        self.assertEqual(len(get_raw_messages(self.session_id)), 2)
+
         new_question = Question.objects.create(summary="summary2",
                                                 session=self.session,
                                                 content="Bill Gates")
@@ -2,6 +2,7 @@
 Test cases for api/utils/context.py
 """
 from os.path import join
+from unittest.mock import patch
 from django.test import TestCase
 from langchain.document_loaders import PyPDFLoader, Docx2txtLoader
 from qdrant_client import QdrantClient
@@ -9,8 +10,13 @@ from qdrant_client.models import Distance, VectorParams, PointStruct
 from api.models import Collection, Source, Chunk
 from api.utils.context import (
     vector_db_query,
+    vector_db_query_top_k,
     get_context_uuid,
+    get_context_chunks,
+    pack_context,
+    parse_chunks,
     parse_source,
+    resolve_chunks,
     get_loader_by_file
 )
 from api.exceptions import UnsupportedFileTypeException
@@ -91,6 +97,100 @@ class TestContextUtils(TestCase):
         uuid = get_context_uuid(client=self.test_client, embedding=c.TEST_VECTOR_A)
         self.assertEqual(uuid, self.test_chunk_a.chunk_id)
 
+    def test_get_context_chunks(self):
+        """
+        Tests get_context_chunks returns the chunks ordered by score.
+        """
+        hits = vector_db_query_top_k(client=self.test_client, embedding=c.TEST_VECTOR_B,
+                                     limit=2)
+        self.assertGreaterEqual(hits[0].score, hits[1].score)
+        chunks = get_context_chunks(client=self.test_client, embedding=c.TEST_VECTOR_B, limit=2)
+        self.assertEqual(chunks, [self.test_chunk_b, self.test_chunk_a])
+
+    def test_get_context_chunks_payload(self):
+        """
+        Tests get_context_chunks builds chunks stored in the payload without reading them
+        from the DB, and resolve_chunks gets the stored chunks.
+        """
+        self.test_collection.chunks_in_payload = True
+        self.test_client.recreate_collection(
+            collection_name=self.test_collection_name,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+        )
+        with patch('api.utils.context.EmbeddingAdapter.get_batch',
+                   return_value=([c.TEST_TEXT_A], [c.TEST_VECTOR_A])), \
+                patch('api.utils.context.count_tokens_batch', return_value=[2]):
+            chunks = parse_chunks(self.test_client, c.TEST_TEXT_A, self.test_source,
+                                  self.test_collection)
+        chunks[0].save()
+
+        # Only the active collections are read from the DB
+        with self.assertNumQueries(1):
+            context_chunks = get_context_chunks(client=self.test_client,
+                                                embedding=c.TEST_VECTOR_A, limit=1)
+        self.assertIsNone(context_chunks[0].pk)
+        self.assertEqual(context_chunks[0].content, c.TEST_TEXT_A)
+        self.assertEqual(context_chunks[0].token_size, 2)
+        self.assertEqual(context_chunks[0].source.file_name, c.TEST_SOURCE_FILENAME_A)
+        self.assertEqual(context_chunks[0].source.collection_id, self.test_collection.pk)
+        self.assertEqual(resolve_chunks(context_chunks), chunks)
+
+    def test_pack_context_removes_overlap(self):
+        """
+        Tests pack_context leaves out text a used chunk of the same source already contains.
+        """
+        first = Chunk(source=self.test_source, content="first part\nshared sentence of both",
+                      token_size=6)
+        second = Chunk(source=self.test_source, content="shared sentence of both\nsecond part",
+                       token_size=6)
+        contained = Chunk(source=self.test_source, content="shared sentence", token_size=2)
+        with patch('api.utils.context.count_tokens', side_effect=lambda text: len(text.split())):
+            context, chunks = pack_context([first, contained, second], 100)
+        self.assertEqual(context, "first part\nshared sentence of both\n\nsecond part")
+        self.assertEqual(chunks, [first, second])
+
+    def test_pack_context_budget(self):
+        """
+        Tests pack_context always uses the best chunk and adds the others that fit.
+        """
+        self.test_chunk_a.token_size = 10
+        self.test_chunk_b.token_size = 3
+        context, chunks = pack_context([self.test_chunk_a, self.test_chunk_b], 5)
+        self.assertEqual(context, c.TEST_TEXT_A)
+        self.assertEqual(chunks, [self.test_chunk_a])
+
+        context, chunks = pack_context([self.test_chunk_b, self.test_chunk_a], 5)
+        self.assertEqual(chunks, [self.test_chunk_b])
+
+        context, chunks = pack_context([self.test_chunk_b, self.test_chunk_a], 13)
+        self.assertEqual(context, f"{c.TEST_TEXT_B}\n\n{c.TEST_TEXT_A}")
+
+    def test_vector_db_query_top_k_collections(self):
+        """
+        Tests vector_db_query_top_k merges the results of all active collections by score.
+        """
+        other_collection = Collection.objects.create(name="other", file_path=c.TEST_FILE_PATH)
+        self.test_client.recreate_collection(
+            collection_name=other_collection.name,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+        )
+        self.test_client.upsert(
+            collection_name=other_collection.name,
+            points=[PointStruct(id=0, vector=c.TEST_VECTOR_B, payload={"uuid": "other"})]
+        )
+
+        hits = vector_db_query_top_k(client=self.test_client, embedding=c.TEST_VECTOR_B,
+                                     limit=2)
+        self.assertEqual(len(hits), 2)
+        self.assertEqual({hit.payload['uuid'] for hit in hits},
+                         {"other", self.test_chunk_b.chunk_id})
+
+        other_collection.active = False
+        other_collection.save()
+        hits = vector_db_query_top_k(client=self.test_client, embedding=c.TEST_VECTOR_B,
+                                     limit=2)
+        self.assertNotIn("other", [hit.payload['uuid'] for hit in hits])
+
     def test_vector_db_query_no_col(self):
         """
         Tests vector_db_query with empty collections.
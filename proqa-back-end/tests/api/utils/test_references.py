@@ -0,0 +1,116 @@
+"""
+Test cases for api/utils/references.py
+"""
+from unittest.mock import MagicMock, patch
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from redis.exceptions import ConnectionError as RedisConnectionError
+from api.models import Answer, ChatSession, Chunk, Question
+from api.utils import references
+
+
+@override_settings(REFERENCE_BUFFER_URL=None)
+class TestReferences(TestCase):
+    """
+    Test cases for api/utils/references.py
+    """
+
+    def setUp(self):
+        self.session = ChatSession.objects.create(
+            author=User.objects.create_user(username="user"))
+        self.chunk_a = Chunk.objects.create(content="a", times_referenced=5)
+        self.chunk_b = Chunk.objects.create(content="b", times_referenced=5)
+        self.chunk_c = Chunk.objects.create(content="c", times_referenced=5)
+
+    def test_add_references(self):
+        """
+        Tests add_references increments the chunks in the DB without a buffer
+        """
+        references.add_references([self.chunk_a, self.chunk_b], 2)
+        self.chunk_a.refresh_from_db()
+        self.chunk_c.refresh_from_db()
+        self.assertEqual(self.chunk_a.times_referenced, 7)
+        self.assertEqual(self.chunk_c.times_referenced, 5)
+
+    def test_add_references_buffered(self):
+        """
+        Tests add_references increments the counts in Redis with a single round trip
+        """
+        client = MagicMock()
+        with patch('api.utils.references.get_client', return_value=client):
+            references.add_references([self.chunk_a, self.chunk_b])
+        pipeline = client.pipeline.return_value
+        pipeline.hincrby.assert_any_call(references.PENDING_KEY, self.chunk_a.pk, 1)
+        pipeline.hincrby.assert_any_call(references.PENDING_KEY, self.chunk_b.pk, 1)
+        pipeline.execute.assert_called_once()
+        self.chunk_a.refresh_from_db()
+        self.assertEqual(self.chunk_a.times_referenced, 5)
+
+    def test_add_references_redis_error(self):
+        """
+        Tests add_references increments the chunks in the DB when Redis fails
+        """
+        client = MagicMock()
+        client.pipeline.return_value.execute.side_effect = RedisConnectionError("down")
+        with patch('api.utils.references.get_client', return_value=client), \
+                self.assertLogs('api.utils.references', level='WARNING'):
+            references.add_references([self.chunk_a])
+        self.chunk_a.refresh_from_db()
+        self.assertEqual(self.chunk_a.times_referenced, 6)
+
+    def test_flush_references(self):
+        """
+        Tests flush_references applies the buffered counts and clears the buffer
+        """
+        client = MagicMock()
+        client.exists.return_value = False
+        client.hgetall.return_value = {
+            str(self.chunk_a.pk).encode(): b"2",
+            str(self.chunk_b.pk).encode(): b"2",
+            str(self.chunk_c.pk).encode(): b"-1",
+        }
+        with patch('api.utils.references.get_client', return_value=client), \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(references.flush_references(), 3)
+        # One update per distinct count
+        updates = [query for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        client.rename.assert_called_once_with(references.PENDING_KEY, references.FLUSHING_KEY)
+        client.delete.assert_called_once_with(references.FLUSHING_KEY)
+        client.lock.return_value.release.assert_called_once()
+        self.assertEqual(
+            list(Chunk.objects.order_by('pk').values_list('times_referenced', flat=True)),
+            [7, 7, 4]
+        )
+
+    def test_flush_references_locked(self):
+        """
+        Tests flush_references does nothing while another flush is running
+        """
+        client = MagicMock()
+        client.lock.return_value.acquire.return_value = False
+        with patch('api.utils.references.get_client', return_value=client):
+            self.assertEqual(references.flush_references(), 0)
+        client.hgetall.assert_not_called()
+
+    def test_remove_session_references(self):
+        """
+        Tests remove_session_references decrements each chunk once per answer using it
+        """
+        for chunks in [[self.chunk_a, self.chunk_b], [self.chunk_a]]:
+            question = Question.objects.create(session=self.session, content="q")
+            answer = Answer.objects.create(question=question, session=self.session,
+                                           context=chunks[0])
+            answer.chunks.set(chunks)
+        # Answers from before the chunks were stored only have a context
+        question = Question.objects.create(session=self.session, content="q")
+        Answer.objects.create(question=question, session=self.session, context=self.chunk_c)
+
+        with self.assertNumQueries(1):
+            references.remove_session_references(self.session)
+        self.assertEqual(
+            list(Chunk.objects.order_by('pk').values_list('times_referenced', flat=True)),
+            [3, 4, 4]
+        )
@@ -0,0 +1,67 @@
+"""
+Test cases for api/utils/routing.py
+"""
+from django.test import TestCase
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct
+from api.utils.routing import compute_centroids, get_collection_vectors, route_collections
+
+
+class TestRoutingUtils(TestCase):
+    """
+    Test cases for api/utils/routing.py
+    """
+
+    def test_compute_centroids(self):
+        """
+        Tests compute_centroids finds a centroid per cluster of embeddings
+        """
+        vectors = [[1.0, 0.1, 0.0], [1.0, -0.1, 0.0], [0.0, 0.1, 1.0], [0.0, -0.1, 1.0]]
+        centroids = compute_centroids(vectors, 2)
+        self.assertEqual(len(centroids), 2)
+        self.assertEqual(sorted(round(max(centroid)) for centroid in centroids), [1, 1])
+        self.assertEqual({max(range(3), key=centroid.__getitem__) for centroid in centroids},
+                         {0, 2})
+
+    def test_compute_centroids_few_vectors(self):
+        """
+        Tests compute_centroids returns at most one centroid per embedding
+        """
+        self.assertEqual(compute_centroids([], 8), [])
+        self.assertEqual(len(compute_centroids([[0.0, 2.0]], 8)), 1)
+        self.assertEqual(compute_centroids([[0.0, 2.0]], 8), [[0.0, 1.0]])
+
+    def test_route_collections(self):
+        """
+        Tests route_collections selects the collections with the closest centroids
+        """
+        collections = [("a", [[1.0, 0.0, 0.0]]), ("b", [[0.0, 1.0, 0.0]]),
+                       ("c", [[0.0, 0.0, 1.0], [0.8, 0.6, 0.0]])]
+        self.assertEqual(route_collections(collections, [1.0, 0.0, 0.0], 2, 0.05), ["a", "c"])
+        # Disabled routing searches all collections
+        self.assertEqual(route_collections(collections, [1.0, 0.0, 0.0], 0, 0.05),
+                         ["a", "b", "c"])
+
+    def test_route_collections_ambiguous(self):
+        """
+        Tests route_collections searches all collections when the scores are close or a
+        collection has no centroids
+        """
+        collections = [("a", [[1.0, 0.0]]), ("b", [[0.0, 1.0]])]
+        self.assertEqual(route_collections(collections, [1.0, 0.9], 1, 0.1), ["a", "b"])
+        self.assertEqual(route_collections(collections, [1.0, 0.1], 1, 0.1), ["a"])
+        self.assertEqual(route_collections(collections + [("c", None)], [1.0, 0.1], 1, 0.1),
+                         ["a", "b", "c"])
+
+    def test_get_collection_vectors(self):
+        """
+        Tests get_collection_vectors gets all embeddings of a collection
+        """
+        client = QdrantClient(":memory:")
+        client.recreate_collection(collection_name="test",
+                                   vectors_config=VectorParams(size=2, distance=Distance.DOT))
+        client.upsert(collection_name="test", points=[
+            PointStruct(id=index, vector=[float(index), 1.0]) for index in range(3)
+        ])
+        vectors = get_collection_vectors(client, "test")
+        self.assertEqual(sorted(vectors), [[0.0, 1.0], [1.0, 1.0], [2.0, 1.0]])
@@ -0,0 +1,79 @@
+"""
+Test cases for api/utils/summary.py
+"""
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from api.models import Answer, ChatSession, LLM, Question
+from api.utils import summary
+
+
+@override_settings(SUMMARY_MODEL=None, SUMMARY_MAX_TOKENS=64, SUMMARY_MAX_TURNS=4,
+                   SUMMARY_INTERVAL=2)
+class TestSummary(TestCase):
+    """
+    Test cases for api/utils/summary.py
+    """
+
+    def setUp(self):
+        LLM.objects.create(name="model", active=True)
+        self.session = ChatSession.objects.create(
+            author=User.objects.create_user(username="user"))
+        self.questions = []
+        for turn in range(3):
+            question = Question.objects.create(session=self.session, content=f"q{turn}")
+            Answer.objects.create(question=question, session=self.session, content=f"a{turn}")
+            self.questions.append(question)
+
+    def test_request_summary_extends_previous_summary(self):
+        """
+        Tests the summary prompt contains the previous summary and only the turns after it
+        """
+        Question.objects.filter(pk=self.questions[0].pk).update(summary="s0")
+        with patch.object(summary.text_adapter, 'get_background',
+                          return_value=200) as mock_get_background:
+            self.assertTrue(summary.request_summary(self.questions[2].question_id))
+
+        kwargs = mock_get_background.call_args.kwargs
+        self.assertEqual(kwargs['prompt'], summary.get_summary_prompt("s0", [("q1", "a1"),
+                                                                            ("q2", "a2")]))
+        self.assertEqual(kwargs['message_id'], str(self.questions[2].question_id))
+        self.assertEqual(kwargs['options']['callback'], "summary")
+        self.assertEqual(kwargs['options']['max_tokens'], 64)
+
+    def test_request_summary_given_unanswered_question_then_skip(self):
+        """
+        Tests nothing is summarised when the question has no answer yet
+        """
+        Question.objects.filter(pk=self.questions[1].pk).update(summary="s1")
+        Answer.objects.filter(question=self.questions[2]).update(content=None)
+        with patch.object(summary.text_adapter, 'get_background') as mock_get_background:
+            self.assertFalse(summary.request_summary(self.questions[2].question_id))
+        mock_get_background.assert_not_called()
+
+    def test_save_summary(self):
+        """
+        Tests the generated summary is stored on the question
+        """
+        summary.save_summary(self.questions[0].question_id, " The user asked about q0. ")
+        self.assertEqual(Question.objects.get(pk=self.questions[0].pk).summary,
+                         "The user asked about q0.")
+
+    def test_get_question_to_summarize(self):
+        """
+        Tests a summary is only needed once turns are left out of the prompt, and then again
+        every SUMMARY_INTERVAL left out questions
+        """
+        def dropped(summaries):
+            messages = []
+            for turn, question_summary in enumerate(summaries):
+                messages.append({"is_answer": False, "question_id": turn,
+                                 "summary": question_summary})
+                messages.append({"is_answer": True})
+            return messages
+
+        self.assertIsNone(summary.get_question_to_summarize([]))
+        self.assertEqual(summary.get_question_to_summarize(dropped([None])), 0)
+        self.assertIsNone(summary.get_question_to_summarize(dropped(["s0"])))
+        self.assertIsNone(summary.get_question_to_summarize(dropped(["s0", None])))
+        self.assertEqual(summary.get_question_to_summarize(dropped(["s0", None, None])), 2)
@@ -0,0 +1,56 @@
+"""
+Test cases for api/utils/tokenizer.py
+"""
+from unittest.mock import MagicMock, patch
+from django.test import TestCase, override_settings
+from api.utils import tokenizer
+
+
+class TestTokenizerUtils(TestCase):
+    """
+    Test cases for api/utils/tokenizer.py
+    """
+
+    @override_settings(TOKENIZER_MODEL_PATH=None)
+    def test_count_tokens_ai_service(self):
+        """
+        Tests tokens are counted by the AI service without a local tokenizer model
+        """
+        self.assertIsNone(tokenizer.get_tokenizer())
+        with patch.object(tokenizer.tokenize_adapter, 'get', return_value=3) as mock_get, \
+                patch.object(tokenizer.tokenize_adapter, 'get_batch',
+                             return_value=[1, 2]) as mock_get_batch:
+            self.assertEqual(tokenizer.count_tokens("a b c"), 3)
+            self.assertEqual(tokenizer.count_tokens_batch(["a", "b c"]), [1, 2])
+        mock_get.assert_called_once_with("a b c")
+        mock_get_batch.assert_called_once_with(["a", "b c"])
+
+    def test_count_tokens_local(self):
+        """
+        Tests tokens are counted locally with a tokenizer model
+        """
+        model = MagicMock()
+        model.encode.side_effect = lambda text: [[0] * len(t.split()) for t in text] \
+            if isinstance(text, list) else [0] * len(text.split())
+        with patch.object(tokenizer, 'get_tokenizer', return_value=model), \
+                patch.object(tokenizer.tokenize_adapter, 'get') as mock_get:
+            self.assertEqual(tokenizer.count_tokens("a b c"), 3)
+            self.assertEqual(tokenizer.count_tokens_batch(["a", "b c"]), [1, 2])
+        mock_get.assert_not_called()
+
+    @override_settings(TOKENIZER_MODEL_PATH="missing/llama.model")
+    def test_get_tokenizer_missing_model(self):
+        """
+        Tests tokens are counted by the AI service if the tokenizer model file does not exist
+        """
+        with patch.object(tokenizer, 'SentencePieceProcessor') as mock_processor:
+            self.assertIsNone(tokenizer.get_tokenizer())
+        mock_processor.assert_not_called()
+
+    def test_count_tokens_batch_empty(self):
+        """
+        Tests counting no texts does not tokenize anything
+        """
+        with patch.object(tokenizer, 'get_tokenizer') as mock_get_tokenizer:
+            self.assertEqual(tokenizer.count_tokens_batch([]), [])
+        mock_get_tokenizer.assert_not_called()
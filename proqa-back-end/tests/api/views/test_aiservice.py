@@ -0,0 +1,102 @@
+"""
+Test cases for api/views/aiservice.py
+"""
+from unittest.mock import MagicMock, patch
+from django.contrib.auth.models import User
+from django.test import TestCase, RequestFactory, override_settings
+from api.models import ChatSession, LLM, PromptTemplate, Question, Answer
+from api.views import aiservice
+from tests.api.resources import constants as c
+
+
+@override_settings(SUMMARIZE_HISTORY=False)
+class TestAIServiceViews(TestCase):
+    """
+    Test cases for api/views/aiservice.py
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser")
+        self.chat_session = ChatSession.objects.create(author=self.user)
+        LLM.objects.create(name="model", active=True)
+        PromptTemplate.objects.create(
+            name="test",
+            active=True,
+            instruction=c.TEST_INSTRUCTION,
+            question_format=c.TEST_QUESTION_FORMAT,
+            answer_format=c.TEST_ANSWER_FORMAT
+        )
+
+    def __get_test_response(self, method: callable, data: dict):
+        """
+        Gets response from specified endpoint
+        """
+        request = RequestFactory().post(path='/', data=data, content_type='application/json')
+        request.user = self.user
+        return method(request)
+
+    @patch('api.views.aiservice.count_tokens_batch', lambda texts: [1] * len(texts))
+    @patch('api.views.aiservice.count_tokens', return_value=1)
+    @patch('api.views.aiservice.get_context_chunks', return_value=[])
+    @patch('api.views.aiservice.embedding_adapter.get_query', return_value=([0.0], [0.0], 1.0))
+    def test_question_without_context(self, *_):
+        """
+        Tests the question endpoint answers without context when no chunks are found
+        """
+        with patch.object(aiservice.text_adapter, 'get', return_value=200) as mock_get, \
+                patch.object(aiservice.answer_cache, 'lookup', return_value=None):
+            response = self.__get_test_response(
+                aiservice.question,
+                {"question": c.TEST_QUESTION, "session": str(self.chat_session.session_id)}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data["context"])
+        self.assertIsNone(response.data["source"])
+        mock_get.assert_called_once()
+        answer = Answer.objects.get(answer_id=response.data["answer_id"])
+        self.assertIsNone(answer.context)
+        self.assertEqual(answer.question, Question.objects.get())
+
+    @patch('api.views.aiservice.count_tokens', return_value=1)
+    @patch('api.views.aiservice.get_context_chunks', return_value=[])
+    @patch('api.views.aiservice.embedding_adapter.get_query', return_value=([0.0], [0.0], 1.0))
+    def test_question_cached_answer(self, *_):
+        """
+        Tests the question endpoint returns a cached answer instead of generating it
+        """
+        with patch.object(aiservice.text_adapter, 'get') as mock_get, \
+                patch.object(aiservice.answer_cache, 'lookup',
+                             return_value=MagicMock(content="cached")):
+            response = self.__get_test_response(
+                aiservice.question,
+                {"question": c.TEST_QUESTION, "session": str(self.chat_session.session_id)}
+            )
+
+        self.assertEqual(response.data["answer"], "cached")
+        self.assertEqual(Answer.objects.get(answer_id=response.data["answer_id"]).content,
+                         "cached")
+        mock_get.assert_not_called()
+
+    @patch('api.views.aiservice.count_tokens', return_value=3)
+    def test_answer(self, _):
+        """
+        Tests the answer endpoint saves the answer with the posted id, not the latest answer
+        """
+        answers = []
+        for _ in range(2):
+            question = Question.objects.create(session=self.chat_session, content="q")
+            answers.append(Answer.objects.create(question=question, session=self.chat_session))
+
+        response = self.__get_test_response(aiservice.answer, {
+            "answer": "a",
+            "session_id": str(self.chat_session.session_id),
+            "message_id": str(answers[0].answer_id)
+        })
+
+        self.assertEqual(response.status_code, 200)
+        answers[0].refresh_from_db()
+        answers[1].refresh_from_db()
+        self.assertEqual(answers[0].content, "a")
+        self.assertEqual(answers[0].token_size, 3)
+        self.assertIsNone(answers[1].content)
@@ -1,4 +1,5 @@
 import uuid
+from unittest.mock import patch
 from django.test import TestCase, RequestFactory
 from django.contrib.auth.models import User
 from api.views.chat_session import (
@@ -81,14 +82,16 @@ class TestAIServiceViews(TestCase):
 
     def test_deletion(self):
         """
-        Tests the chat/deletion endpoint
+        Tests the chat/deletion endpoint cancels the pending answers
         """
-        response = self.__get_test_response(
-            path='/chat/deletion/',
-            method=deletion,
-            data={'chat_session_id': self.chat_session.session_id}
-        )
+        with patch('api.utils.chat_session.TextAdapter.cancel') as mock_cancel:
+            response = self.__get_test_response(
+                path='/chat/deletion/',
+                method=deletion,
+                data={'chat_session_id': self.chat_session.session_id}
+            )
         self.assertEqual(response.data, {"status": "deleted"})
+        mock_cancel.assert_called_once_with(str(self.answer.answer_id))
 
     def test_hiding(self):
         """
@@ -568,6 +568,32 @@ export async function rateAnswer(answerID: string, rating: RatingState): Promise
     });
 }
 
+/**
+ * Cancels the generation of all answers that are still streaming, e.g. when the page is closed.
+ * Uses a keepalive request, so it completes after the page is gone.
+ * @returns nothing
+ */
+export function cancelStreamingAnswers(): void {
+  const url = env.PUBLIC_API_URL + '/api/answer/cancellation/';
+  const headers = {
+    'Content-Type': 'application/json'
+  };
+
+  Object.values(get(chatSessions)).forEach((messages) => {
+    messages
+      .filter((msg) => msg.type === MessageType.Answer && msg.streaming)
+      .forEach((msg) => {
+        fetch(url, {
+          method: 'POST',
+          headers,
+          body: JSON.stringify({ answer_id: msg.messageID }),
+          credentials: 'include',
+          keepalive: true
+        });
+      });
+  });
+}
+
 /**
  * Finds a session by its ID in known sessions.
  * @param sessionID to look up
@@ -620,17 +646,20 @@ export function generateID(): string {
 
 /**
  * Sends question to back end and adds it to internal message store.
+ * If the back end is busy, the question is removed again and the user is asked to retry later.
+ * A cached answer is returned complete by the back end instead of being streamed.
  * @param messageID ID of the chat message
  * @param sessionID ID of the chat session
  * @param question text of the question
  * @param callback what function to execute after the question is sent
+ * @returns whether the answer is being streamed
  */
 export async function addQuestion(
   messageID: string,
   sessionID: string,
   question: string,
   callback: (sessionID: string, message: Message) => void
-) {
+): Promise<boolean> {
   const message: Message = {
     messageID: messageID,
     type: MessageType.Question,
@@ -655,37 +684,68 @@ export async function addQuestion(
     'Content-Type': 'application/json' // Set the appropriate Content-Type for your API
   };
   const body = JSON.stringify({ question: question, session: sessionID }); // Replace with your request payload
-  await fetch(url, {
+  return fetch(url, {
     method: 'POST',
     headers,
     body,
     credentials: 'include'
   })
-    .then((response) => response.json())
-    .then(
-      (response: { context: string; source: string; question_id: string; answer_id: string }) => {
-        message.messageID = response.question_id;
-
-        const source: Source = {
-          name: response.source,
-          link: response.source,
-          context: response.context
-        };
+    .then(async (response) => {
+      if (response.status === 503) {
+        // The back end did not keep the question, so it is removed from the session as well
+        chatSessions.update((rec) => {
+          rec[sessionID] = rec[sessionID].filter((msg) => msg !== message);
+          return rec;
+        });
 
-        const answer: Message = {
-          messageID: response.answer_id,
-          type: MessageType.Answer,
-          content: '',
-          sources: [source],
-          rating: RatingState.Neutral,
-          streaming: true
-        };
+        const retryAfter = response.headers.get('Retry-After');
+        setErrorMessage(
+          retryAfter
+            ? 'The assistant is busy, please try again in ' + retryAfter + ' seconds'
+            : 'The assistant is busy, please try again later',
+          null
+        );
+        return false;
+      }
 
-        callback(sessionID, answer);
+      if (!response.ok) {
+        throw new Error('Request failed with status ' + response.status);
       }
-    )
+
+      const data: {
+        context: string | null;
+        source: string | null;
+        question_id: string;
+        answer_id: string;
+        answer?: string;
+      } = await response.json();
+      message.messageID = data.question_id;
+
+      // Questions are answered without a source when no context was found
+      const sources: Source[] = [];
+      if (data.source != null) {
+        sources.push({
+          name: data.source,
+          link: data.source,
+          context: data.context ?? ''
+        });
+      }
+
+      const answer: Message = {
+        messageID: data.answer_id,
+        type: MessageType.Answer,
+        content: data.answer ?? '',
+        sources: sources,
+        rating: RatingState.Neutral,
+        streaming: data.answer === undefined
+      };
+
+      callback(sessionID, answer);
+      return answer.streaming;
+    })
     .catch((error) => {
       setErrorMessage('Could not send question', error);
+      return false;
     });
 }
 
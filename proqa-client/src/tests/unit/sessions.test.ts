@@ -665,6 +665,60 @@ describe('test addQuestion', () => {
     expect(get(errorMessage)).toBeTruthy();
   });
 
+  it('removes the question and asks to retry when the server is busy', async () => {
+    server.use(
+      rest.post('http://localhost:8080/api/question/', async (req, res, ctx) => {
+        return res.once(
+          ctx.status(503),
+          ctx.set('Retry-After', '30'),
+          ctx.json({ detail: 'busy' })
+        );
+      })
+    );
+
+    const session = await createActiveChatSession();
+    const before = get(chatSessions)[session.sessionID]?.length ?? 0;
+
+    const callback = vi.fn();
+    const sent = await addQuestion('busy-id', session.sessionID, 'some question', callback);
+
+    expect(sent).toBe(false);
+    expect(callback).not.toBeCalled();
+    expect(get(chatSessions)[session.sessionID].length).toBe(before);
+    expect(get(errorMessage)).toContain('30');
+  });
+
+  it('adds a cached answer without streaming it', async () => {
+    server.use(
+      rest.post('http://localhost:8080/api/question/', async (req, res, ctx) => {
+        return res.once(
+          ctx.json({
+            context: 'context',
+            source: 'source',
+            question_id: 'question-id',
+            answer_id: 'answer-id',
+            answer: 'cached answer'
+          })
+        );
+      })
+    );
+
+    const session = await createActiveChatSession();
+
+    let answer: Message | null = null;
+    const streaming = await addQuestion(
+      'some-id',
+      session.sessionID,
+      'some question',
+      (sessionID: string, message: Message) => {
+        answer = message;
+      }
+    );
+
+    expect(streaming).toBe(false);
+    expect(answer).toMatchObject({ content: 'cached answer', streaming: false });
+  });
+
   it('executes the callback on success', async () => {
     const session = await createActiveChatSession();
 